@@ -0,0 +1,601 @@
+"""
+AI workout plan generation.
+Building the prompt, calling OpenAI and saving the WorkoutPlan happen in
+a background worker pool: POST /ai/workout-plan only records a PlanJob
+row and returns its id, so a 10-30 s LLM call never holds a gunicorn
+request thread. Job rows live in the database, so any worker can answer
+status polls. Plans for inputs seen before are copied from a template
+cache in milliseconds instead. The worker streams the model's reply and
+saves each finished day on the job, and the job's event stream forwards
+those days to the browser as they land, so the first day shows in about a
+second without generation ever running on a request thread. Each event
+stream connection is capped at a few seconds and resumed with
+Last-Event-ID, so open streams don't pin request threads either.
+Configure with:
+- PLAN_JOB_WORKERS: concurrent plan generations per process (default 4)
+- PLAN_JOB_TIMEOUT: seconds before an unfinished job is reported failed (default 180)
+- PLAN_EVENTS_POLL: seconds between job checks in the event stream (default 0.5)
+- PLAN_EVENTS_WINDOW: seconds an event stream connection stays open before the client reconnects (default 5)
+- PLAN_CACHE_VARIANTS: cached plans kept per input combination, 0 disables (default 3)
+- PLAN_CACHE_MAX_AGE_DAYS / PLAN_CACHE_MAX_ENTRIES: cache eviction limits (default 30 / 5000)
+- PLAN_CACHE_REFRESH_AHEAD: generate extra/replacement variants in the background on hits
+"""
+import os
+import json
+import time
+import uuid
+import hashlib
+import threading
+from types import SimpleNamespace
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+
+from models import db, WorkoutPlan, PlanJob, PlanTemplate
+
+PLAN_MODEL = "gpt-4.1-mini"
+PLAN_JOB_WORKERS = int(os.getenv("PLAN_JOB_WORKERS", "4"))
+PLAN_JOB_TIMEOUT = int(os.getenv("PLAN_JOB_TIMEOUT", "180"))
+PLAN_EVENTS_POLL = float(os.getenv("PLAN_EVENTS_POLL", "0.5"))
+PLAN_EVENTS_WINDOW = float(os.getenv("PLAN_EVENTS_WINDOW", "5"))
+PLAN_EVENTS_RETRY_MS = 1000
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+plan_executor = ThreadPoolExecutor(max_workers=PLAN_JOB_WORKERS, thread_name_prefix="plan-job")
+
+# OpenAI client, created on first use; tests can assign a fake
+plan_client = None
+_client_lock = threading.Lock()
+
+
+def get_plan_client():
+    global plan_client
+    if plan_client is None:
+        with _client_lock:
+            if plan_client is None:
+                from openai import OpenAI
+                plan_client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+    return plan_client
+
+
+# ---------------------------------------------------------
+# PLAN GENERATION
+# ---------------------------------------------------------
+def parse_plan_request(data):
+    """Return (params, error) for a plan request body."""
+    params = {
+        "goal": data.get("goal"),
+        "experience": data.get("experience"),
+        "days_per_week": data.get("days_per_week"),
+        "equipment": data.get("equipment", "None"),
+        "injuries": data.get("injuries", "None"),
+    }
+    if not all([params["goal"], params["experience"], params["days_per_week"]]):
+        return None, "goal, experience, and days_per_week are required"
+    return params, None
+
+
+def build_plan_prompt(params):
+    return f"""
+    You are a professional fitness coach. Create a weekly workout plan in structured JSON.
+
+    User details:
+    - Goal: {params["goal"]}
+    - Experience: {params["experience"]}
+    - Days per week: {params["days_per_week"]}
+    - Equipment: {params["equipment"]}
+    - Injuries: {params["injuries"]}
+
+    Format strictly as JSON:
+    {{
+      "weekly_plan": [
+        {{
+          "day": "Monday",
+          "focus": "Push (Chest/Shoulders/Triceps)",
+          "exercises": [
+            {{"name": "Push-ups", "sets": 3, "reps": "8–12"}},
+            {{"name": "Dumbbell Shoulder Press", "sets": 3, "reps": "8–10"}}
+          ],
+          "warmup": "5 min brisk walk or dynamic mobility",
+          "cooldown": "3 min stretching"
+        }}
+      ]
+    }}
+    """
+
+
+def plan_messages(params):
+    return [
+        {"role": "system", "content": "You are a precise and safe personal trainer."},
+        {"role": "user", "content": build_plan_prompt(params)},
+    ]
+
+
+def parse_plan_content(raw_content):
+    """Parse the model's reply, tolerating markdown code fences."""
+    try:
+        return json.loads(raw_content)
+    except json.JSONDecodeError:
+        cleaned = raw_content.strip().replace("```json", "").replace("```", "")
+        return json.loads(cleaned)
+
+
+def generate_plan_json(params):
+    """Run the LLM call and return the parsed plan dict."""
+    response = get_plan_client().chat.completions.create(
+        model=PLAN_MODEL,
+        messages=plan_messages(params),
+        temperature=0.7,
+    )
+    return parse_plan_content(response.choices[0].message.content)
+
+
+def stream_plan_text(params):
+    """Run the LLM call with streaming on; yields reply text fragments as they arrive."""
+    stream = get_plan_client().chat.completions.create(
+        model=PLAN_MODEL,
+        messages=plan_messages(params),
+        temperature=0.7,
+        stream=True,
+    )
+    for chunk in stream:
+        if not chunk.choices:
+            continue
+        text = chunk.choices[0].delta.content
+        if text:
+            yield text
+
+
+class PlanDayParser:
+    """Incremental parser that pulls finished days out of a streamed plan.
+
+    feed() takes the next text fragment and returns the weekly_plan day
+    objects that were completed by it, so each day can be sent as soon as
+    its closing brace arrives instead of after the whole reply.
+    """
+
+    def __init__(self):
+        self.text = ""
+        self.days = []
+        self._pos = 0          # next unscanned character
+        self._in_array = False
+        self._depth = 0        # brace depth inside the weekly_plan array
+        self._start = None     # offset where the current day object began
+        self._in_string = False
+        self._escaped = False
+
+    def feed(self, fragment):
+        self.text += fragment
+        completed = []
+        if not self._in_array:
+            key = self.text.find('"weekly_plan"')
+            bracket = self.text.find("[", key) if key != -1 else -1
+            if bracket == -1:
+                return completed
+            self._in_array = True
+            self._pos = bracket + 1
+
+        text = self.text
+        while self._pos < len(text):
+            ch = text[self._pos]
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif ch == "\\":
+                    self._escaped = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif ch == "{":
+                if self._depth == 0:
+                    self._start = self._pos
+                self._depth += 1
+            elif ch == "}" and self._depth:
+                self._depth -= 1
+                if self._depth == 0:
+                    try:
+                        day = json.loads(text[self._start:self._pos + 1])
+                    except json.JSONDecodeError:
+                        day = None
+                    if isinstance(day, dict):
+                        self.days.append(day)
+                        completed.append(day)
+            self._pos += 1
+        return completed
+
+    def result(self):
+        """Return the full plan, or one rebuilt from the parsed days if the reply doesn't parse."""
+        try:
+            plan_json = parse_plan_content(self.text)
+            if isinstance(plan_json, dict) and plan_json.get("weekly_plan"):
+                return plan_json
+        except json.JSONDecodeError:
+            pass
+        return {"weekly_plan": list(self.days)}
+
+
+def save_plan(user_id, params, plan_json):
+    plan = WorkoutPlan(
+        user_id=user_id,
+        goal=params["goal"],
+        experience=params["experience"],
+        days_per_week=params["days_per_week"],
+        equipment=params["equipment"],
+        injuries=params["injuries"],
+        plan_json=plan_json,
+    )
+    db.session.add(plan)
+    db.session.commit()
+    return plan
+
+
+def plan_to_dict(plan):
+    return {
+        "id": plan.id,
+        "goal": plan.goal,
+        "experience": plan.experience,
+        "days_per_week": plan.days_per_week,
+        "plan": plan.plan_json,
+    }
+
+
+# ---------------------------------------------------------
+# PLAN TEMPLATE CACHE
+# ---------------------------------------------------------
+def canonical_plan_params(params):
+    """Normalize plan inputs so equivalent requests share a cache key."""
+    def text(value):
+        value = " ".join(str(value or "").lower().split())
+        return "none" if value in ("", "none", "no", "n/a", "nothing") else value
+
+    def items(value):
+        parts = sorted({text(part) for part in str(value or "").split(",")} - {"none"})
+        return ", ".join(parts) or "none"
+
+    try:
+        days = int(params.get("days_per_week"))
+    except (TypeError, ValueError):
+        days = text(params.get("days_per_week"))
+    return {
+        "goal": text(params.get("goal")),
+        "experience": text(params.get("experience")),
+        "days_per_week": days,
+        "equipment": items(params.get("equipment")),
+        "injuries": items(params.get("injuries")),
+    }
+
+
+def plan_params_key(params):
+    canonical = json.dumps(canonical_plan_params(params), sort_keys=True)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class PlanTemplateCache:
+    """Stored plans keyed by a hash of the canonical request inputs.
+
+    Up to `variants` plans are kept per key and served least-recently-used
+    first, so repeat requests still rotate between different plans.
+    Eviction: the LRU variant once a key is full, anything older than
+    `max_age_days`, and the LRU rows beyond `max_entries` overall. With
+    refresh_ahead, a hit on a key that is short of variants (or whose
+    oldest variant is past `refresh_after` of its lifetime) generates a
+    new variant in the background.
+    """
+
+    def __init__(self, variants=3, max_age_days=30, max_entries=5000, refresh_ahead=False, refresh_after=0.8):
+        self.variants = variants
+        self.max_age_days = max_age_days
+        self.max_entries = max_entries
+        self.refresh_ahead = refresh_ahead
+        self.refresh_after = refresh_after
+        self._refreshing = set()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            variants=int(os.getenv("PLAN_CACHE_VARIANTS", "3")),
+            max_age_days=int(os.getenv("PLAN_CACHE_MAX_AGE_DAYS", "30")),
+            max_entries=int(os.getenv("PLAN_CACHE_MAX_ENTRIES", "5000")),
+            refresh_ahead=os.getenv("PLAN_CACHE_REFRESH_AHEAD", "").lower() in ("1", "true", "yes"),
+        )
+
+    @property
+    def enabled(self):
+        return self.variants > 0
+
+    def _cutoff(self):
+        return datetime.utcnow() - timedelta(days=self.max_age_days)
+
+    def lookup(self, params, app=None):
+        """Return a copy of a cached plan_json for these inputs, or None."""
+        if not self.enabled:
+            return None
+        key = plan_params_key(params)
+        rows = (
+            PlanTemplate.query.filter_by(params_key=key)
+            .filter(PlanTemplate.created_at >= self._cutoff())
+            .order_by(PlanTemplate.last_used_at.asc())
+            .all()
+        )
+        if not rows:
+            return None
+
+        template = rows[0]
+        template.hits = (template.hits or 0) + 1
+        template.last_used_at = datetime.utcnow()
+        db.session.commit()
+
+        if self.refresh_ahead and app is not None and self._needs_refresh(rows):
+            self._schedule_refresh(app, key, params)
+        return json.loads(json.dumps(template.plan_json))
+
+    def _needs_refresh(self, rows):
+        if len(rows) < self.variants:
+            return True
+        oldest = min(row.created_at for row in rows)
+        return oldest < datetime.utcnow() - timedelta(days=self.max_age_days * self.refresh_after)
+
+    def _schedule_refresh(self, app, key, params):
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+        plan_executor.submit(self._refresh, app, key, dict(params))
+
+    def _refresh(self, app, key, params):
+        try:
+            with app.app_context():
+                self.store(params, generate_plan_json(params))
+        except Exception as e:
+            print(f"Plan cache refresh failed: {e}")
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def store(self, params, plan_json):
+        """Add a generated plan as a variant for its inputs, evicting as needed."""
+        if not self.enabled or not plan_json:
+            return
+        key = plan_params_key(params)
+        try:
+            db.session.add(PlanTemplate(
+                params_key=key,
+                params=canonical_plan_params(params),
+                plan_json=plan_json,
+                hits=0,
+            ))
+            db.session.flush()
+            self._evict(key)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            print(f"Plan cache store error: {e}")
+
+    def _evict(self, key):
+        PlanTemplate.query.filter(PlanTemplate.created_at < self._cutoff()).delete(synchronize_session=False)
+
+        variants = (
+            PlanTemplate.query.filter_by(params_key=key)
+            .order_by(PlanTemplate.last_used_at.desc(), PlanTemplate.id.desc())
+            .offset(self.variants)
+            .all()
+        )
+        for row in variants:
+            db.session.delete(row)
+
+        overflow = PlanTemplate.query.count() - self.max_entries
+        if overflow > 0:
+            stale = PlanTemplate.query.order_by(PlanTemplate.last_used_at.asc()).limit(overflow).all()
+            for row in stale:
+                db.session.delete(row)
+
+
+plan_cache = PlanTemplateCache.from_env()
+
+
+def wants_fresh(data, args):
+    """True if the request asked to skip the plan cache (fresh=true in body or query)."""
+    value = args.get("fresh", data.get("fresh", ""))
+    return str(value).lower() in ("1", "true", "yes")
+
+
+def wants_wait(args):
+    """True if the client asked for the pre-job behaviour: block until the plan is saved (?wait=1)."""
+    return str(args.get("wait", "")).lower() in ("1", "true", "yes")
+
+
+def cached_plan_json(params, fresh=False, app=None):
+    """Return a cached plan for these inputs unless fresh is requested."""
+    if fresh:
+        return None
+    try:
+        return plan_cache.lookup(params, app=app)
+    except Exception as e:
+        db.session.rollback()
+        print(f"Plan cache lookup error: {e}")
+        return None
+
+
+# ---------------------------------------------------------
+# BACKGROUND JOBS
+# ---------------------------------------------------------
+def submit_plan_job(app, user_id, params, fresh=False):
+    """Record a job and hand it to the worker pool; returns the PlanJob.
+
+    A plan-cache hit is saved straight away and the job is returned already done.
+    """
+    job = PlanJob(id=uuid.uuid4().hex, user_id=user_id, status=QUEUED, params=params)
+    plan_json = cached_plan_json(params, fresh=fresh, app=app)
+    if plan_json is not None:
+        plan = save_plan(user_id, params, plan_json)
+        job.plan_id = plan.id
+        job.status = DONE
+        job.finished_at = datetime.utcnow()
+    db.session.add(job)
+    db.session.commit()
+    if job.status == QUEUED:
+        plan_executor.submit(run_plan_job, app, job.id)
+    return job
+
+
+def run_plan_job(app, job_id):
+    """Worker body: stream the plan (saving days as they finish), save it and record the outcome."""
+    with app.app_context():
+        job = db.session.get(PlanJob, job_id)
+        if job is None or job.status != QUEUED:
+            return
+        job.status = RUNNING
+        job.started_at = datetime.utcnow()
+        db.session.commit()
+
+        try:
+            parser = PlanDayParser()
+            for fragment in stream_plan_text(job.params):
+                if parser.feed(fragment):
+                    job.days = list(parser.days)
+                    db.session.commit()
+            plan_json = parser.result()
+            if not plan_json.get("weekly_plan"):
+                raise ValueError("Could not parse the generated plan")
+            plan = save_plan(job.user_id, job.params, plan_json)
+            plan_cache.store(job.params, plan_json)
+            job.plan_id = plan.id
+            job.status = DONE
+        except Exception as e:
+            db.session.rollback()
+            print(f"Plan job {job_id} failed: {e}")
+            job = db.session.get(PlanJob, job_id)
+            job.status = FAILED
+            job.error = str(e)
+        job.finished_at = datetime.utcnow()
+        db.session.commit()
+
+
+def get_plan_job(job_id, user_id):
+    """Return the user's job, failing it first if a worker died mid-way."""
+    job = PlanJob.query.filter_by(id=job_id, user_id=user_id).first()
+    if job is None:
+        return None
+    if job.status in (QUEUED, RUNNING) and job.created_at < datetime.utcnow() - timedelta(seconds=PLAN_JOB_TIMEOUT):
+        job.status = FAILED
+        job.error = "Plan generation timed out"
+        job.finished_at = datetime.utcnow()
+        db.session.commit()
+    return job
+
+
+def wait_for_job(job_id, user_id, timeout=PLAN_JOB_TIMEOUT, poll=PLAN_EVENTS_POLL):
+    """Poll a job until it is done or failed (or timeout passes); returns the job row.
+
+    Holds the request thread for the whole generation, so it is only used for
+    ?wait=1 clients; the scoped session is released between polls.
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        job = get_plan_job(job_id, user_id)
+        if job is None or job.status in (DONE, FAILED) or time.monotonic() >= deadline:
+            return job
+        db.session.remove()
+        time.sleep(poll)
+
+
+def job_to_dict(job):
+    result = {
+        "job_id": job.id,
+        "status": job.status,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+    }
+    if job.status == DONE and job.plan_id:
+        plan = db.session.get(WorkoutPlan, job.plan_id)
+        if plan is not None:
+            result["result"] = plan_to_dict(plan)
+    if job.status == FAILED:
+        result["error"] = job.error
+    return result
+
+
+def sse(event, data, event_id=None):
+    head = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{head}event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def parse_event_id(value):
+    """Days the client already has, from a Last-Event-ID header (0 if missing or invalid)."""
+    try:
+        return max(0, int(value))
+    except (TypeError, ValueError):
+        return 0
+
+
+def job_events(job_id, user_id, last_event_id=None, poll=None, window=None):
+    """Server-sent events for a job: `status` on each change, `day` per finished day, then `done` or `error`.
+
+    Only reads the job row, so the generation itself stays in the worker pool.
+    A connection lasts at most PLAN_EVENTS_WINDOW seconds, so open streams can't
+    tie up the request threads; the client reconnects with Last-Event-ID (the
+    id of a `day` is the number of days sent so far) and resumes after it. The
+    scoped session is released between polls.
+    """
+    poll = PLAN_EVENTS_POLL if poll is None else poll
+    deadline = time.monotonic() + (PLAN_EVENTS_WINDOW if window is None else window)
+    sent = parse_event_id(last_event_id)
+    last_status = None
+    yield f"retry: {PLAN_EVENTS_RETRY_MS}\n\n"
+    while True:
+        job = get_plan_job(job_id, user_id)
+        if job is None:
+            yield sse("error", {"error": "Job not found"})
+            return
+        data = job_to_dict(job)
+        if job.status != last_status:
+            last_status = job.status
+            yield sse("status", data)
+        days = job.days or []
+        if "result" in data:
+            # Cache hits never stream, and the parsed plan can differ from the streamed days
+            days = data["result"]["plan"].get("weekly_plan") or days
+        for number, day in enumerate(days[sent:], start=sent + 1):
+            yield sse("day", day, number)
+        sent = max(sent, len(days))
+        if job.status == DONE:
+            yield sse("done", data.get("result") or {}, sent)
+            return
+        if job.status == FAILED:
+            yield sse("error", {"error": job.error or "Plan generation failed"}, sent)
+            return
+        if time.monotonic() >= deadline:
+            return
+        db.session.remove()
+        time.sleep(poll)
+
+
+# ---------------------------------------------------------
+# OFFLINE CLIENT
+# ---------------------------------------------------------
+class FakePlanClient:
+    """Stand-in for openai.OpenAI() in tests and offline development.
+
+    chat.completions.create() returns `content` in one message, or with
+    stream=True as a series of delta chunks of `chunk_size` characters.
+    """
+
+    def __init__(self, content, chunk_size=16):
+        self.content = content
+        self.chunk_size = chunk_size
+        self.calls = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def _create(self, stream=False, **kwargs):
+        self.calls += 1
+        if not stream:
+            return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=self.content))])
+        return (
+            SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=self.content[i:i + self.chunk_size]))])
+            for i in range(0, len(self.content), self.chunk_size)
+        )
@@ -1,15 +1,27 @@
 import os
 import json
 import logging
-from flask import Flask, jsonify, request, render_template, redirect, url_for
+import threading
+from flask import Flask, Response, jsonify, request, render_template, redirect, url_for, stream_with_context
 from dotenv import load_dotenv
 from flask_jwt_extended import JWTManager, get_jwt_identity, jwt_required
-from openai import OpenAI
 from models import db, User, WorkoutPlan
 from auth import auth_bp
-from workout import workout_bp
+from workout import workout_bp, fetch_exercises
+from exercise_catalog import catalog as exercise_catalog
+from exercise_media import proxy_url
 from profile import profile_bp
 from fatsecret import fatsecret_bp
+from media import media_bp
+from food_log import food_log_bp
+from dashboard import dashboard_bp
+from migrations import check_schema
+from pagination import wants_page, parse_limit, keyset_page
+from fieldsets import parse_fields, load_only_for, serialize
+from ai_plans import (
+    parse_plan_request, submit_plan_job, get_plan_job, job_to_dict, job_events, wants_fresh, wants_wait,
+    wait_for_job, plan_to_dict, DONE, FAILED,
+)
 
 
 # ---------------------------------------------------------
@@ -27,14 +39,14 @@ app.config["JWT_SECRET_KEY"] = os.getenv("JWT_SECRET_KEY")
 db.init_app(app)
 jwt = JWTManager(app)
 
-# OpenAI client
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-
 # Register blueprints
 app.register_blueprint(auth_bp)
 app.register_blueprint(workout_bp)
 app.register_blueprint(profile_bp)
 app.register_blueprint(fatsecret_bp)
+app.register_blueprint(media_bp)
+app.register_blueprint(food_log_bp)
+app.register_blueprint(dashboard_bp)
 
 
 # ---------------------------------------------------------
@@ -138,46 +150,44 @@ def complete_session_redirect():
 
 
 # ---------------------------------------------------------
-# EXERCISE SEARCH API (External ExerciseDB)
+# EXERCISE SEARCH API (local ExerciseDB mirror)
 # ---------------------------------------------------------
 @app.route("/api/exercises/search", methods=["GET"])
 @jwt_required()
 def api_exercise_search():
-    """Search exercises from ExerciseDB API."""
-    import requests as req
-    
+    """Search exercises by name and/or ?bodyPart=, ?target=, ?equipment= (ranked, local mirror)."""
     query = request.args.get("q", "")
     body_part = request.args.get("bodyPart", "")
+    target = request.args.get("target", "")
+    equipment = request.args.get("equipment", "")
     
-    if not query and not body_part:
-        return jsonify({"error": "Please provide a search query or body part"}), 400
-    
-    # ExerciseDB API
-    EXERCISE_API_URL = "https://www.exercisedb.dev/api/v1/exercises"
+    if not (query or body_part or target or equipment):
+        return jsonify({"error": "Please provide a search query, body part, target or equipment"}), 400
     
     try:
-        if query:
-            url = f"{EXERCISE_API_URL}/search?q={query}"
-        elif body_part:
-            url = f"{EXERCISE_API_URL}/bodyPart/{body_part}"
-        else:
-            url = f"{EXERCISE_API_URL}?limit=20"
-        
-        response = req.get(url, timeout=10)
-        
-        if response.status_code != 200:
-            return jsonify({"error": "Failed to fetch exercises from API"}), 500
-        
-        data = response.json()
-        exercises = data.get("data", []) if isinstance(data, dict) else data
+        exercises = exercise_catalog.search(query, limit=20, body_part=body_part, target=target, equipment=equipment)
+        if exercises is None:
+            # Not synced yet: ask ExerciseDB directly
+            if query:
+                status_code, data = fetch_exercises("/search", {"q": query})
+            elif body_part:
+                status_code, data = fetch_exercises(f"/bodyPart/{body_part}")
+            else:
+                return jsonify({"error": "Exercise catalogue is not available yet"}), 503
+            
+            if status_code != 200:
+                return jsonify({"error": "Failed to fetch exercises from API"}), 500
+            
+            exercises = data.get("data", []) if isinstance(data, dict) else data
         
         # Clean and format the response
         cleaned = [{
             "name": ex.get("name", "Unknown"),
-            "bodyPart": ex.get("bodyPart", ex.get("targetMuscles", [""])[0] if ex.get("targetMuscles") else ""),
+            "bodyPart": ex.get("bodyPart") or ", ".join(ex.get("bodyParts") or ex.get("targetMuscles", [])[:1]),
             "target": ex.get("target", ", ".join(ex.get("targetMuscles", []))),
             "equipment": ex.get("equipment", ", ".join(ex.get("equipments", []))),
-            "gifUrl": ex.get("gifUrl", ""),
+            "gifUrl": proxy_url(ex.get("gifUrl", "")),
+            "posterUrl": proxy_url(ex.get("gifUrl", ""), poster=True),
         } for ex in exercises[:20]]  # Limit to 20 results
         
         return jsonify(cleaned), 200
@@ -193,83 +203,62 @@ def api_exercise_search():
 @app.route("/ai/workout-plan", methods=["POST"])
 @jwt_required()
 def generate_workout_plan():
-    """Generate an AI-powered workout plan and save to DB."""
+    """Queue AI workout plan generation; poll the returned job for the saved plan.
+
+    Inputs seen before are served from the plan cache (job is done at once) unless fresh=true.
+    ?wait=1 keeps the old contract for existing clients: 201 with the saved plan once the job
+    is done (500 if it failed, the 202 job body if it is still running after PLAN_JOB_TIMEOUT).
+    """
     user_id = get_jwt_identity()
     data = request.get_json() or {}
 
-    goal = data.get("goal")
-    experience = data.get("experience")
-    days_per_week = data.get("days_per_week")
-    equipment = data.get("equipment", "None")
-    injuries = data.get("injuries", "None")
-
-    if not all([goal, experience, days_per_week]):
-        return jsonify({"error": "goal, experience, and days_per_week are required"}), 400
-
-    prompt = f"""
-    You are a professional fitness coach. Create a weekly workout plan in structured JSON.
-
-    User details:
-    - Goal: {goal}
-    - Experience: {experience}
-    - Days per week: {days_per_week}
-    - Equipment: {equipment}
-    - Injuries: {injuries}
-
-    Format strictly as JSON:
-    {{
-      "weekly_plan": [
-        {{
-          "day": "Monday",
-          "focus": "Push (Chest/Shoulders/Triceps)",
-          "exercises": [
-            {{"name": "Push-ups", "sets": 3, "reps": "8–12"}},
-            {{"name": "Dumbbell Shoulder Press", "sets": 3, "reps": "8–10"}}
-          ],
-          "warmup": "5 min brisk walk or dynamic mobility",
-          "cooldown": "3 min stretching"
-        }}
-      ]
-    }}
-    """
+    params, error = parse_plan_request(data)
+    if error:
+        return jsonify({"error": error}), 400
+
+    job = submit_plan_job(app, user_id, params, fresh=wants_fresh(data, request.args))
+    if wants_wait(request.args):
+        job = wait_for_job(job.id, user_id)
+        if job.status == DONE:
+            return jsonify(plan_to_dict(db.session.get(WorkoutPlan, job.plan_id))), 201
+        if job.status == FAILED:
+            return jsonify({"error": job.error}), 500
+    return jsonify({
+        "job_id": job.id,
+        "status": job.status,
+        "status_url": url_for("get_workout_plan_job", job_id=job.id),
+    }), 202
 
-    try:
-        response = client.chat.completions.create(
-            model="gpt-4.1-mini",
-            messages=[
-                {"role": "system", "content": "You are a precise and safe personal trainer."},
-                {"role": "user", "content": prompt},
-            ],
-            temperature=0.7,
-        )
-        raw_content = response.choices[0].message.content
-        try:
-            plan_json = json.loads(raw_content)
-        except json.JSONDecodeError:
-            cleaned = raw_content.strip().replace("```json", "").replace("```", "")
-            plan_json = json.loads(cleaned)
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
 
-    plan = WorkoutPlan(
-        user_id=user_id,
-        goal=goal,
-        experience=experience,
-        days_per_week=days_per_week,
-        equipment=equipment,
-        injuries=injuries,
-        plan_json=plan_json,
+def event_stream(events):
+    return Response(
+        stream_with_context(events),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
-    db.session.add(plan)
-    db.session.commit()
 
-    return jsonify({
-        "id": plan.id,
-        "goal": plan.goal,
-        "experience": plan.experience,
-        "days_per_week": plan.days_per_week,
-        "plan": plan.plan_json,
-    }), 201
+
+@app.route("/ai/workout-plan/jobs/<job_id>", methods=["GET"])
+@jwt_required()
+def get_workout_plan_job(job_id):
+    """Poll a plan generation job; includes the plan once it is done."""
+    job = get_plan_job(job_id, get_jwt_identity())
+    if not job:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job_to_dict(job))
+
+
+@app.route("/ai/workout-plan/jobs/<job_id>/events", methods=["GET"])
+@jwt_required()
+def stream_workout_plan_job(job_id):
+    """Stream a job as server-sent events: status changes, each finished day, then `done` or `error`.
+
+    Each connection is short; reconnect with Last-Event-ID to resume after the days already received.
+    """
+    user_id = get_jwt_identity()
+    if not get_plan_job(job_id, user_id):
+        return jsonify({"error": "Job not found"}), 404
+    return event_stream(job_events(job_id, user_id, request.headers.get("Last-Event-ID")))
 
 
 @app.route("/ai/workout-plan/save", methods=["POST"])
@@ -383,29 +372,56 @@ def save_ai_workout_as_routine():
 
 
 
+# Response fields -> (columns they need, getter); see fieldsets.py
+PLAN_FIELDS = {
+    "id": ([WorkoutPlan.id], lambda p: p.id),
+    "goal": ([WorkoutPlan.goal], lambda p: p.goal),
+    "experience": ([WorkoutPlan.experience], lambda p: p.experience),
+    "days_per_week": ([WorkoutPlan.days_per_week], lambda p: p.days_per_week),
+    "equipment": ([WorkoutPlan.equipment], lambda p: p.equipment),
+    "injuries": ([WorkoutPlan.injuries], lambda p: p.injuries),
+    "plan": ([WorkoutPlan.plan_json], lambda p: p.plan_json),
+    "created_at": ([WorkoutPlan.created_at], lambda p: p.created_at.isoformat()),
+}
+
+
 @app.route("/workout-plans", methods=["GET"])
 @jwt_required()
 def list_workout_plans():
-    """List all saved AI workout plans for the logged-in user."""
+    """List saved AI workout plans for the logged-in user, newest first.
+
+    With ?limit= and/or ?after=<cursor> returns one page as {"items", "next_cursor"}.
+    ?fields=a,b,c returns (and loads) only those fields.
+    """
     user_id = get_jwt_identity()
-    plans = (
-        WorkoutPlan.query.filter_by(user_id=user_id)
-        .order_by(WorkoutPlan.created_at.desc())
-        .all()
-    )
-    return jsonify([
-        {
-            "id": p.id,
-            "goal": p.goal,
-            "experience": p.experience,
-            "days_per_week": p.days_per_week,
-            "equipment": p.equipment,
-            "injuries": p.injuries,
-            "plan": p.plan_json,
-            "created_at": p.created_at.isoformat(),
-        }
-        for p in plans
-    ])
+    sort_columns = [WorkoutPlan.created_at, WorkoutPlan.id]
+    try:
+        fields = parse_fields(request.args, PLAN_FIELDS)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    query = WorkoutPlan.query.filter_by(user_id=user_id)
+    if fields:
+        query = query.options(load_only_for(PLAN_FIELDS, fields, *sort_columns))
+
+    if wants_page(request.args):
+        try:
+            plans, next_cursor = keyset_page(
+                query, sort_columns, parse_limit(request.args), request.args.get("after")
+            )
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        return jsonify({
+            "items": [plan_summary(p, fields) for p in plans],
+            "next_cursor": next_cursor,
+        })
+
+    plans = query.order_by(WorkoutPlan.created_at.desc()).all()
+    return jsonify([plan_summary(p, fields) for p in plans])
+
+
+def plan_summary(p, fields=None):
+    return serialize(p, PLAN_FIELDS, fields)
 
 
 @app.route("/workout-plans/<int:plan_id>", methods=["GET", "PATCH"])
@@ -440,76 +456,35 @@ def get_or_update_plan(plan_id):
 # ---------------------------------------------------------
 # DATABASE INITIALIZATION
 # ---------------------------------------------------------
-with app.app_context():
-    from sqlalchemy import inspect
-    inspector = inspect(db.engine)
-    existing_tables = inspector.get_table_names()
-    
-    # Only create tables if they don't exist
-    if not existing_tables:
-        db.create_all()
-        print("Database tables created.")
-    else:
-        # Tables exist, just ensure our models' columns exist
-        print(f"Database already has {len(existing_tables)} tables, skipping create_all()")
-        
-        # --- AUTO MIGRATION FOR MISSING COLUMNS ---
+# One SELECT MAX(version) when the schema is current; see migrations.py.
+# With LAZY_INIT=1 the check runs on the first non-static request instead of
+# at import, so a scaled-to-zero worker starts without waiting on the database.
+LAZY_INIT = os.getenv("LAZY_INIT", "0") == "1"
+_schema_checked = threading.Event()
+_schema_lock = threading.Lock()
+
+
+def ensure_schema():
+    if _schema_checked.is_set():
+        return
+    with _schema_lock:
+        if _schema_checked.is_set():
+            return
         try:
-            from sqlalchemy import text
-            
-            # Check user_profiles columns
-            # This works for both SQLite and PostgreSQL
-            # We try to add columns, catch error if they exist (simplest cross-db approach without Alembic)
-            
-            with db.engine.connect() as conn:
-                transaction = conn.begin()
-                try:
-                    # SQLite syntax is different for ALTER TABLE, but adding columns is standard
-                    # However, SQLite handles ADD COLUMN IF NOT EXISTS differently or not at all depending on version
-                    # So we use a try-except block for each column
-                    
-                    columns_to_ensure = [
-                        ("gender", "VARCHAR(20) DEFAULT 'male'"),
-                        ("goal_type", "VARCHAR(20) DEFAULT 'maintain'"),
-                        ("target_weight_kg", "FLOAT"),
-                        ("goal_timeline_weeks", "INTEGER"),
-                        ("activity_level", "VARCHAR(20) DEFAULT 'moderate'"),
-                        ("daily_calorie_target", "INTEGER"),
-                        ("goal_set_at", "TIMESTAMP")
-                    ]
-                    
-                    for col_name, col_def in columns_to_ensure:
-                        try:
-                            # Try to add the column. If it fails, we assume it exists.
-                            conn.execute(text(f"ALTER TABLE user_profiles ADD COLUMN {col_name} {col_def}"))
-                            print(f"Migrated: Added {col_name} to user_profiles")
-                        except Exception as e:
-                            # If column exists, DB throws error. We ignore it.
-                            pass
-                    
-                    # Check saved_workout_history columns
-                    history_columns = [
-                        ("total_volume", "INTEGER DEFAULT 0"),
-                        ("total_sets", "INTEGER DEFAULT 0"),
-                        ("total_reps", "INTEGER DEFAULT 0")
-                    ]
-                    
-                    for col_name, col_def in history_columns:
-                        try:
-                            # Try to add the column. If it fails, we assume it exists.
-                            conn.execute(text(f"ALTER TABLE saved_workout_history ADD COLUMN {col_name} {col_def}"))
-                            print(f"Migrated: Added {col_name} to saved_workout_history")
-                        except Exception as e:
-                            pass
-                            
-                    transaction.commit()
-                    print("Migration check complete.")
-                except Exception as e:
-                    transaction.rollback()
-                    print(f"Migration error: {e}")
-                    
+            check_schema(db.engine)
         except Exception as e:
-            print(f"Auto-migration failed: {e}")
+            print(f"Schema migration failed: {e}")
+        _schema_checked.set()
+
+
+if LAZY_INIT:
+    @app.before_request
+    def deferred_schema_check():
+        if request.endpoint != "static":
+            ensure_schema()
+else:
+    with app.app_context():
+        ensure_schema()
 
 
 # ---------------------------------------------------------
@@ -1,12 +1,16 @@
 from flask import Blueprint, request, jsonify
-from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
+from flask_jwt_extended import create_access_token, jwt_required
 from models import db, User
-from marshmallow import ValidationError
-from schemas import UserSchema
 from datetime import timedelta
+from identity import current_identity, invalidate
 
 auth_bp = Blueprint("auth", __name__, url_prefix="/auth")
-user_schema = UserSchema()
+
+
+def load_credentials(payload):
+    """Validate a username/password body; marshmallow is imported on first use, not at startup."""
+    from schemas import UserSchema
+    return UserSchema().load(payload)
 
 
 # ---------------------------------------------------------
@@ -15,8 +19,9 @@ user_schema = UserSchema()
 @auth_bp.route('/register', methods=['POST'])
 def register():
     """User registration endpoint"""
+    from marshmallow import ValidationError
     try:
-        data = user_schema.load(request.json)
+        data = load_credentials(request.json)
     except ValidationError as err:
         return jsonify({"error": "Validation Failed", "messages": err.messages}), 400
 
@@ -58,8 +63,9 @@ def register():
 @auth_bp.route('/login', methods=['POST'])
 def login():
     """User login endpoint"""
+    from marshmallow import ValidationError
     try:
-        data = user_schema.load(request.json)
+        data = load_credentials(request.json)
     except ValidationError as err:
         return jsonify({"error": "Validation Failed", "messages": err.messages}), 400
 
@@ -89,11 +95,10 @@ def login():
 @jwt_required()
 def me():
     """Return current authenticated user info"""
-    user_id = int(get_jwt_identity())
-    user = User.query.get(user_id)
-    if not user:
+    identity = current_identity()
+    if not identity:
         return jsonify({"error": "User not found"}), 404
-    return jsonify({"id": user.id, "username": user.username})
+    return jsonify({"id": identity.id, "username": identity.username})
 
 
 # ---------------------------------------------------------
@@ -188,6 +193,7 @@ def reset_password():
     # Update password
     user.set_password(new_password)
     db.session.commit()
+    invalidate(user.id)
     
     print(f"✅ Password reset successful for user: {user.username}")
     return jsonify({"message": "Password has been reset successfully"}), 200
@@ -0,0 +1,142 @@
+"""
+Local autocomplete engine for food names.
+A sorted array of normalized names answers prefix lookups with a binary
+search; candidates are ranked by how often users searched for them.
+Results per prefix are memoized, so repeated keystrokes are answered in
+microseconds. Names from search results are merged in incrementally;
+searches and logged foods only raise the rank of names already known.
+"""
+import heapq
+import bisect
+import threading
+
+
+def normalize(text):
+    return " ".join(str(text).lower().split())
+
+
+class AutocompleteIndex:
+    """Prefix index over food names ranked by popularity.
+
+    `loader` is an optional callable returning an iterable of names; it is
+    run once, on the first lookup, so building the index never slows
+    down app startup.
+    """
+
+    def __init__(self, loader=None, max_terms=100000, scan_limit=2000, prefix_cache_size=5000):
+        self.loader = loader
+        self.max_terms = max_terms
+        self.scan_limit = scan_limit
+        self.prefix_cache_size = prefix_cache_size
+        self._terms = []      # sorted normalized keys
+        self._popular = []    # sorted keys that have been searched at least once
+        self._entries = {}    # key -> [display name, popularity]
+        self._prefix_cache = {}
+        self._loaded = loader is None
+        self._lock = threading.RLock()
+
+    def _ensure_loaded(self):
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            self._loaded = True
+            try:
+                self.add_many(self.loader())
+            except Exception as e:
+                print(f"Autocomplete index load error: {e}")
+
+    # --- updates ---
+    def add(self, name, weight=0):
+        """Add a name (or bump an existing one's popularity by weight)."""
+        key = normalize(name)
+        if len(key) < 2:
+            return
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if not weight:
+                    return
+                if entry[1] <= 0:
+                    bisect.insort(self._popular, key)
+                entry[1] += weight
+            else:
+                if len(self._terms) >= self.max_terms:
+                    return
+                self._entries[key] = [name.strip(), weight]
+                bisect.insort(self._terms, key)
+                if weight > 0:
+                    bisect.insort(self._popular, key)
+            self._invalidate(key)
+
+    def add_many(self, names, weight=0):
+        """Bulk add with a single re-sort; use for the initial load, add() for incremental updates."""
+        with self._lock:
+            added = False
+            for name in names:
+                key = normalize(name)
+                if len(key) < 2 or key in self._entries:
+                    continue
+                if len(self._entries) >= self.max_terms:
+                    break
+                self._entries[key] = [name.strip(), weight]
+                added = True
+            if added:
+                self._terms = sorted(self._entries)
+                self._popular = sorted(k for k, entry in self._entries.items() if entry[1] > 0)
+                self._prefix_cache.clear()
+
+    def record_query(self, query):
+        """Count a search or logged food so popular foods rank first.
+
+        Only names already in the index count; partial keystrokes, typos and
+        free-text queries are ignored rather than becoming suggestions.
+        """
+        self._ensure_loaded()
+        key = normalize(query)
+        with self._lock:
+            if key in self._entries:
+                self.add(self._entries[key][0], weight=1)
+
+    def _invalidate(self, key):
+        for i in range(1, len(key) + 1):
+            self._prefix_cache.pop(key[:i], None)
+
+    # --- lookups ---
+    def suggest(self, prefix, limit=10):
+        """Return up to `limit` display names starting with prefix, most popular first."""
+        self._ensure_loaded()
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+
+        cached = self._prefix_cache.get(prefix)
+        if cached is not None:
+            cached_limit, result = cached
+            # Reusable if it was computed for at least this many, or the prefix ran out of matches
+            if limit <= cached_limit or len(result) < cached_limit:
+                return result[:limit]
+
+        with self._lock:
+            # Popular terms are always considered; the full list only up to scan_limit
+            candidates = set()
+            for terms in (self._popular, self._terms):
+                start = bisect.bisect_left(terms, prefix)
+                for key in terms[start:start + self.scan_limit]:
+                    if not key.startswith(prefix):
+                        break
+                    candidates.add(key)
+
+            best = heapq.nsmallest(
+                limit, candidates, key=lambda k: (-self._entries[k][1], len(k), k)
+            )
+            result = [self._entries[k][0] for k in best]
+
+            if len(self._prefix_cache) >= self.prefix_cache_size:
+                self._prefix_cache.clear()
+            self._prefix_cache[prefix] = (limit, result)
+        return result
+
+    def __len__(self):
+        return len(self._terms)
@@ -0,0 +1,108 @@
+"""
+Cold-start benchmark.
+Starts a fresh interpreter per run (like a scaled-to-zero worker) and
+reports the min and median of:
+- import app: wall time of `import app`
+- first page: import plus the first GET / (landing page)
+- first API call: plus the first POST /auth/login (database + auth path)
+plus the modules loaded and SQL statements issued before serving (these
+are exact, so they show changes that timing noise on a shared host can
+hide), and an import-time breakdown from `python -X importtime`, grouped by
+top-level package. Run with:
+    python bench_startup.py [--runs 5] [--top 15] [--lazy]
+--lazy sets LAZY_INIT=1 for the measured processes.
+With requests, marshmallow and Pillow imported on first use, `import app`
+loads ~230 modules (was ~370); precompiled .pyc files in the Docker image
+save each worker ~100ms of recompiling.
+"""
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# Runs inside the child interpreter
+PROBE = """
+import sys, json, time
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+statements = []
+event.listen(Engine, "before_cursor_execute", lambda *args: statements.append(1))
+modules = len(sys.modules)
+t0 = time.perf_counter()
+import app
+t1 = time.perf_counter()
+counts = {"modules loaded by import app": len(sys.modules) - modules, "SQL statements during import": len(statements)}
+client = app.app.test_client()
+client.get("/")
+t2 = time.perf_counter()
+counts["SQL statements before first page"] = len(statements)
+client.post("/auth/login", json={"username": "bench-nobody", "password": "not-a-password"})
+t3 = time.perf_counter()
+print(json.dumps({"times": {"import app": t1 - t0, "first page": t2 - t0, "first API call": t3 - t0}, "counts": counts}))
+"""
+
+
+def child_env(lazy):
+    env = dict(os.environ)
+    env.setdefault("DATABASE_URL", "sqlite:///bench.db")
+    env.setdefault("JWT_SECRET_KEY", "bench-secret-key")
+    env.setdefault("OPENAI_API_KEY", "bench")
+    if lazy:
+        env["LAZY_INIT"] = "1"
+    return env
+
+
+def measure(env):
+    out = subprocess.run(
+        [sys.executable, "-c", PROBE], cwd=ROOT, env=env, capture_output=True, text=True, check=True,
+    ).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def import_breakdown(env):
+    """{top-level package: self time in seconds} from one -X importtime run."""
+    err = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app"],
+        cwd=ROOT, env=env, capture_output=True, text=True, check=True,
+    ).stderr
+    totals = {}
+    for line in err.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, _, name = line[len("import time:"):].split("|")
+        package = name.strip().split(".")[0]
+        totals[package] = totals.get(package, 0) + int(self_us) / 1e6
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cold-start benchmark")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--lazy", action="store_true", help="measure with LAZY_INIT=1")
+    args = parser.parse_args()
+    env = child_env(args.lazy)
+
+    measure(env)  # warm-up: creates the benchmark database and .pyc files
+    runs = [measure(env) for _ in range(args.runs)]
+    print(f"Cold start over {args.runs} runs{' (LAZY_INIT=1)' if args.lazy else ''}:  min / median")
+    for key in runs[0]["times"]:
+        values = [r["times"][key] * 1000 for r in runs]
+        print(f"  {key:<16} {min(values):8.1f} / {statistics.median(values):8.1f} ms")
+    for key, value in runs[-1]["counts"].items():
+        print(f"  {key:<34} {value}")
+
+    breakdowns = [import_breakdown(env) for _ in range(args.runs)]
+    packages = {name for b in breakdowns for name in b}
+    medians = {name: statistics.median(b.get(name, 0) for b in breakdowns) for name in packages}
+    print(f"\nImport time by package (self time, top {args.top}):")
+    for name, seconds in sorted(medians.items(), key=lambda item: -item[1])[:args.top]:
+        print(f"  {name:<24} {seconds * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
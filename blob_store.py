@@ -0,0 +1,221 @@
+"""
+Content-addressed blob storage for progress photos and profile images.
+Files are stored once under their sha256 (identical uploads share one
+file) and rows only keep that hash. Each image gets a server-side JPEG
+thumbnail when Pillow is installed. Images are served by the /media
+blueprint (media.py). The default directory is on the app's own disk,
+which hosts like Render wipe on every deploy: point BLOB_STORE_DIR at a
+persistent disk in production. Until it is set, uploads keep their data:
+URL in the database too (see drops_data_url) and migrate_blobs.py refuses
+to drop existing copies. Configure with:
+- BLOB_STORE_DIR: where files are kept (default instance/blobs)
+- THUMBNAIL_SIZE: longest thumbnail edge in pixels (default 320)
+"""
+import os
+import io
+import hmac
+import time
+import base64
+import hashlib
+import binascii
+import tempfile
+
+from flask import current_app, url_for
+from sqlalchemy.exc import IntegrityError
+
+from models import db, MediaBlob
+
+BLOB_STORE_DIR = os.getenv("BLOB_STORE_DIR", os.path.join("instance", "blobs"))
+# Only an explicitly configured directory is trusted to survive restarts
+BLOB_STORE_CONFIGURED = bool(os.getenv("BLOB_STORE_DIR"))
+THUMBNAIL_SIZE = int(os.getenv("THUMBNAIL_SIZE", "320"))
+MAX_BLOB_BYTES = 10 * 1024 * 1024
+
+# Signed media URLs stay identical for a whole window so browsers can cache them
+MEDIA_URL_WINDOW = 24 * 3600
+
+_SIGNATURES = [
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+]
+
+
+class LocalBlobStore:
+    """Filesystem backend: <root>/ab/cd/abcd... per sha256."""
+
+    def __init__(self, root=BLOB_STORE_DIR):
+        self.root = root
+
+    def path(self, digest):
+        return os.path.join(self.root, digest[:2], digest[2:4], digest)
+
+    def exists(self, digest):
+        return os.path.exists(self.path(digest))
+
+    def verify(self, digest):
+        """True if the stored file is present and still hashes to digest."""
+        try:
+            with open(self.path(digest), "rb") as f:
+                return hashlib.sha256(f.read()).hexdigest() == digest
+        except FileNotFoundError:
+            return False
+
+    def put(self, data):
+        """Store bytes and return their sha256; existing content is not rewritten."""
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.path(digest)
+        if os.path.exists(path):
+            return digest
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write then rename, so readers never see a partial file
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path))
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except Exception:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        return digest
+
+    def delete(self, digest):
+        try:
+            os.remove(self.path(digest))
+        except FileNotFoundError:
+            pass
+
+
+blob_store = LocalBlobStore()
+
+
+# ---------------------------------------------------------
+# IMAGES
+# ---------------------------------------------------------
+def sniff_content_type(data):
+    for signature, content_type in _SIGNATURES:
+        if data.startswith(signature):
+            return content_type
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    return None
+
+
+def parse_data_url(value):
+    """Return (bytes, content_type) for a base64 data: URL, or None if it isn't one."""
+    if not isinstance(value, str) or not value.startswith("data:"):
+        return None
+    header, _, payload = value.partition(",")
+    if ";base64" not in header:
+        return None
+    try:
+        data = base64.b64decode(payload, validate=False)
+    except (binascii.Error, ValueError):
+        return None
+    content_type = sniff_content_type(data) or header[5:].split(";")[0]
+    return data, content_type
+
+
+def make_thumbnail(data, size=THUMBNAIL_SIZE):
+    """Return JPEG thumbnail bytes, or None without Pillow or for unreadable images."""
+    try:
+        # Imported on first upload rather than at startup
+        from PIL import Image
+    except ImportError:  # thumbnails are skipped without Pillow
+        return None
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            image.thumbnail((size, size))
+            if image.mode not in ("RGB", "L"):
+                image = image.convert("RGB")
+            out = io.BytesIO()
+            image.save(out, format="JPEG", quality=80, optimize=True)
+            return out.getvalue()
+    except Exception as e:
+        print(f"Thumbnail error: {e}")
+        return None
+
+
+def store_image(data, content_type=None):
+    """Store an image (deduplicated) plus its thumbnail; returns the image sha256.
+
+    Adds MediaBlob rows to the session; the caller commits.
+    """
+    if not data or len(data) > MAX_BLOB_BYTES:
+        raise ValueError("Image is empty or too large")
+    content_type = sniff_content_type(data) or content_type
+    if not content_type or not content_type.startswith("image/"):
+        raise ValueError("Unsupported image type")
+
+    digest = blob_store.put(data)
+    if db.session.get(MediaBlob, digest) is not None:
+        return digest
+
+    thumb_digest = None
+    thumbnail = make_thumbnail(data)
+    if thumbnail is not None and len(thumbnail) < len(data):
+        thumb_digest = blob_store.put(thumbnail)
+        add_blob_row(thumb_digest, "image/jpeg", len(thumbnail))
+    add_blob_row(digest, content_type, len(data), thumbnail_sha256=thumb_digest)
+    return digest
+
+
+def add_blob_row(digest, content_type, size, thumbnail_sha256=None):
+    """Add the MediaBlob row for a stored file unless it exists (caller commits).
+
+    Identical uploads racing each other insert the same primary key; the loser
+    keeps the winner's row, since the file is the same.
+    """
+    if db.session.get(MediaBlob, digest) is not None:
+        return
+    try:
+        with db.session.begin_nested():
+            db.session.add(MediaBlob(sha256=digest, content_type=content_type, size=size,
+                                     thumbnail_sha256=thumbnail_sha256))
+    except IntegrityError:
+        pass
+
+
+def store_data_url(value):
+    """Store a base64 data: URL image; returns its sha256, or None if value isn't a data URL."""
+    parsed = parse_data_url(value)
+    if parsed is None:
+        return None
+    return store_image(*parsed)
+
+
+def drops_data_url(digest):
+    """True if an upload stored as `digest` may drop its data: URL copy (BLOB_STORE_DIR is set).
+
+    On the default directory the copy is kept so a wiped disk can be restored from it.
+    """
+    return bool(digest) and BLOB_STORE_CONFIGURED
+
+
+# ---------------------------------------------------------
+# SIGNED URLS
+# ---------------------------------------------------------
+def _signature(digest, user_id, expires):
+    key = (current_app.config.get("JWT_SECRET_KEY") or "").encode("utf-8")
+    message = f"{digest}:{user_id}:{expires}".encode("utf-8")
+    return hmac.new(key, message, hashlib.sha256).hexdigest()[:32]
+
+
+def media_url(digest, user_id, thumbnail=False):
+    """URL for a blob that works in <img src> (no Authorization header needed)."""
+    if not digest:
+        return None
+    expires = (int(time.time()) // MEDIA_URL_WINDOW + 2) * MEDIA_URL_WINDOW
+    endpoint = "media.get_thumbnail" if thumbnail else "media.get_media"
+    return url_for(endpoint, digest=digest, u=user_id, e=expires, s=_signature(digest, user_id, expires))
+
+
+def verify_media_signature(digest, user_id, expires, signature):
+    try:
+        if int(expires) < time.time():
+            return False
+    except (TypeError, ValueError):
+        return False
+    return hmac.compare_digest(_signature(digest, user_id, expires), signature or "")
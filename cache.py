@@ -0,0 +1,369 @@
+"""
+Response cache for outbound API lookups.
+An in-process LRU sits in front of an optional SQLite file that every
+gunicorn worker can share. Concurrent misses for the same key are
+coalesced into one upstream call (single-flight), within a worker and,
+with the shared file, across workers. Hit/miss counters are reported at
+GET /api/food/cache-stats. Configure with:
+- <PREFIX>_SIZE: max entries kept in the in-process LRU (default 1024)
+- <PREFIX>_DB: path to a SQLite file for the shared cache (optional)
+"""
+import os
+import json
+import time
+import sqlite3
+import inspect
+import threading
+import functools
+from collections import OrderedDict
+
+
+def normalize_key_part(value):
+    """Lowercase and collapse whitespace so trivially different queries share a key."""
+    if isinstance(value, str):
+        return " ".join(value.lower().split())
+    return str(value)
+
+
+class _Call:
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Coalesce concurrent calls for the same key into one execution.
+
+    The first caller for a key runs the function; callers arriving while
+    it is in flight block and receive the same result (or exception).
+    do() returns (result, shared) where shared is True for those waiters.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, func):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = func()
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+        return call.result, False
+
+
+class LRUCache:
+    """Thread-safe in-process LRU with per-entry expiry."""
+
+    def __init__(self, max_size=1024):
+        self.max_size = max_size
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return the stored payload, or None if missing/expired."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            payload, expires_at = entry
+            if expires_at < time.time():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return payload
+
+    def set(self, key, payload, ttl):
+        with self._lock:
+            self._data[key] = (payload, time.time() + ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class SQLiteCache:
+    """Cache stored in a SQLite file so all workers on a host share entries."""
+
+    def __init__(self, path, table="response_cache"):
+        self.path = path
+        self.table = table
+        self._local = threading.local()
+        conn = self._connect()
+        conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {self.table} ("
+            "key TEXT PRIMARY KEY, payload TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {self.table}_locks ("
+            "key TEXT PRIMARY KEY, expires_at REAL NOT NULL)"
+        )
+        conn.commit()
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        """Return (payload, expires_at), or None if missing/expired."""
+        conn = self._connect()
+        row = conn.execute(
+            f"SELECT payload, expires_at FROM {self.table} WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        if row[1] < time.time():
+            self.delete(key)
+            return None
+        return row
+
+    def set(self, key, payload, ttl):
+        conn = self._connect()
+        conn.execute(
+            f"INSERT OR REPLACE INTO {self.table} (key, payload, expires_at) VALUES (?, ?, ?)",
+            (key, payload, time.time() + ttl),
+        )
+        conn.commit()
+
+    def delete(self, key):
+        conn = self._connect()
+        conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+        conn.commit()
+
+    def clear(self):
+        conn = self._connect()
+        conn.execute(f"DELETE FROM {self.table}")
+        conn.execute(f"DELETE FROM {self.table}_locks")
+        conn.commit()
+
+    # --- cross-worker fetch locks ---
+    def try_lock(self, key, ttl):
+        """Claim the right to fetch `key`; expired claims from crashed workers are reclaimed."""
+        conn = self._connect()
+        now = time.time()
+        conn.execute(f"DELETE FROM {self.table}_locks WHERE key = ? AND expires_at < ?", (key, now))
+        cursor = conn.execute(
+            f"INSERT OR IGNORE INTO {self.table}_locks (key, expires_at) VALUES (?, ?)", (key, now + ttl)
+        )
+        conn.commit()
+        return cursor.rowcount == 1
+
+    def is_locked(self, key):
+        row = self._connect().execute(
+            f"SELECT 1 FROM {self.table}_locks WHERE key = ? AND expires_at >= ?", (key, time.time())
+        ).fetchone()
+        return row is not None
+
+    def unlock(self, key):
+        conn = self._connect()
+        conn.execute(f"DELETE FROM {self.table}_locks WHERE key = ?", (key,))
+        conn.commit()
+
+
+class ResponseCache:
+    """Two-tier cache (LRU + optional shared SQLite) keyed on source and normalized arguments.
+
+    Values are stored as JSON, so every hit hands back a fresh copy the
+    caller is free to mutate. Empty results ([] / {}) are cached with the
+    shorter negative TTL; None means "upstream failed" and is never cached.
+    """
+
+    def __init__(self, ttls=None, default_ttl=3600, negative_ttl=600, max_size=1024, shared_path=None,
+                 lock_timeout=10):
+        self.ttls = dict(ttls or {})
+        self.default_ttl = default_ttl
+        self.negative_ttl = negative_ttl
+        self.lock_timeout = lock_timeout
+        self.local = LRUCache(max_size)
+        self.shared = SQLiteCache(shared_path) if shared_path else None
+        self.flight = SingleFlight()
+        self._stats = {}
+        self._stats_lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, prefix, **kwargs):
+        """Build a cache configured from <PREFIX>_SIZE / <PREFIX>_DB environment variables."""
+        size = os.getenv(f"{prefix}_SIZE")
+        if size:
+            kwargs["max_size"] = int(size)
+        shared_path = os.getenv(f"{prefix}_DB")
+        if shared_path:
+            kwargs["shared_path"] = shared_path
+        return cls(**kwargs)
+
+    # --- counters ---
+    def _count(self, source, field):
+        with self._stats_lock:
+            counters = self._stats.setdefault(
+                source, {"hits": 0, "misses": 0, "negative_hits": 0, "coalesced": 0}
+            )
+            counters[field] += 1
+
+    def stats(self):
+        """Return per-source hit/miss counters plus totals."""
+        with self._stats_lock:
+            sources = {name: dict(c) for name, c in self._stats.items()}
+        hits = sum(c["hits"] for c in sources.values())
+        misses = sum(c["misses"] for c in sources.values())
+        total = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "coalesced": sum(c["coalesced"] for c in sources.values()),
+            "hit_rate": round(hits / total, 3) if total else 0.0,
+            "entries": len(self.local),
+            "shared": bool(self.shared),
+            "sources": sources,
+        }
+
+    # --- storage ---
+    def make_key(self, source, *parts):
+        return source + ":" + "|".join(normalize_key_part(p) for p in parts)
+
+    def ttl_for(self, source, value):
+        if not value:
+            return self.negative_ttl
+        return self.ttls.get(source, self.default_ttl)
+
+    def get(self, key):
+        """Return (hit, value) for a key, promoting shared hits into the local LRU."""
+        payload = self.local.get(key)
+        if payload is None and self.shared:
+            try:
+                row = self.shared.get(key)
+            except sqlite3.Error as e:
+                print(f"Shared cache read error: {e}")
+                row = None
+            if row is not None:
+                payload, expires_at = row
+                self.local.set(key, payload, expires_at - time.time())
+        if payload is None:
+            return False, None
+        return True, json.loads(payload)
+
+    def set(self, key, value, ttl):
+        payload = json.dumps(value)
+        self.local.set(key, payload, ttl)
+        if self.shared:
+            try:
+                self.shared.set(key, payload, ttl)
+            except sqlite3.Error as e:
+                print(f"Shared cache write error: {e}")
+
+    def clear(self):
+        self.local.clear()
+        if self.shared:
+            self.shared.clear()
+        with self._stats_lock:
+            self._stats.clear()
+
+    def _fetch(self, key, source, func):
+        """Run func for a miss, letting one worker fetch while the others wait on the shared cache."""
+        if not self.shared:
+            return self._fetch_and_store(key, source, func)
+
+        try:
+            acquired = self.shared.try_lock(key, self.lock_timeout)
+        except sqlite3.Error as e:
+            print(f"Shared cache lock error: {e}")
+            return self._fetch_and_store(key, source, func)
+
+        if acquired:
+            try:
+                return self._fetch_and_store(key, source, func)
+            finally:
+                try:
+                    self.shared.unlock(key)
+                except sqlite3.Error as e:
+                    print(f"Shared cache unlock error: {e}")
+
+        # Another worker is fetching: wait for its result instead of calling upstream too
+        deadline = time.time() + self.lock_timeout
+        try:
+            while time.time() < deadline:
+                hit, value = self.get(key)
+                if hit:
+                    self._count(source, "coalesced")
+                    return value
+                if not self.shared.is_locked(key):
+                    break
+                time.sleep(0.05)
+        except sqlite3.Error as e:
+            print(f"Shared cache wait error: {e}")
+        return self._fetch_and_store(key, source, func)
+
+    def _fetch_and_store(self, key, source, func):
+        value = func()
+        if value is not None:
+            self.set(key, value, self.ttl_for(source, value))
+        return value
+
+    def cached(self, source):
+        """Decorator caching a lookup function's result under `source`.
+
+        The key is built from every bound argument (defaults included), so
+        search("Banana") and search("banana ", max_results=10) share an entry.
+        Concurrent misses for one key share a single upstream call.
+        The undecorated function stays reachable as `.uncached`.
+        """
+        def decorator(func):
+            signature = inspect.signature(func)
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                bound = signature.bind(*args, **kwargs)
+                bound.apply_defaults()
+                key = self.make_key(source, *bound.arguments.values())
+
+                hit, value = self.get(key)
+                if hit:
+                    self._count(source, "hits")
+                    if not value:
+                        self._count(source, "negative_hits")
+                    return value
+
+                self._count(source, "misses")
+                value, shared = self.flight.do(
+                    key, lambda: self._fetch(key, source, lambda: func(*args, **kwargs))
+                )
+                if shared:
+                    self._count(source, "coalesced")
+                if value is not None:
+                    # Every caller gets its own copy, just like a cache hit
+                    value = json.loads(json.dumps(value))
+                return value
+
+            wrapper.uncached = func
+            return wrapper
+        return decorator
@@ -0,0 +1,153 @@
+"""
+Per-source circuit breakers for upstream APIs.
+Each breaker keeps a rolling window of recent calls (success + latency).
+Once the error rate in that window crosses the threshold the breaker
+opens and calls short-circuit to the failure value for a cool-down; after
+that a single half-open probe decides whether to close it again.
+CalorieNinjas, USDA, FatSecret and OpenAI each get one, so an outage falls
+straight through to the local fallback; GET /api/food/source-health shows
+their state.
+"""
+import time
+import threading
+import functools
+from collections import deque
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# Registry of every breaker created, for the metrics endpoint
+breakers = {}
+
+
+class CircuitBreaker:
+    """Rolling-window circuit breaker.
+
+    A call counts as failed if it raises, its result matches is_failure
+    (by default: it is the failure value, None for the lookup helpers), or
+    it takes longer than slow_call_seconds. While configured() returns
+    False (e.g. no API key) calls run without being recorded, since the
+    helper returns before reaching the upstream.
+    """
+
+    def __init__(self, name, window=20, min_calls=5, failure_rate=0.5,
+                 cooldown=30, slow_call_seconds=None, failure_value=None,
+                 is_failure=None, configured=None):
+        self.name = name
+        self.window = window
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.cooldown = cooldown
+        self.slow_call_seconds = slow_call_seconds
+        self.failure_value = failure_value
+        self.is_failure = is_failure or (lambda result: result is failure_value)
+        self.configured = configured
+
+        self.state = CLOSED
+        self.opened_at = None
+        self.short_circuited = 0
+        self._calls = deque(maxlen=window)  # (ok, latency_seconds)
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+        breakers[name] = self
+
+    # --- state machine ---
+    def allow_request(self):
+        """Return True if a call may go upstream right now."""
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN and time.time() - self.opened_at >= self.cooldown:
+                self.state = HALF_OPEN
+            if self.state == HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            self.short_circuited += 1
+            return False
+
+    def record(self, ok, latency):
+        with self._lock:
+            self._calls.append((ok, latency))
+            if self.state == HALF_OPEN:
+                self._probe_in_flight = False
+                if ok:
+                    self.state = CLOSED
+                    self._calls.clear()
+                else:
+                    self._trip()
+                return
+            if self.state == CLOSED and len(self._calls) >= self.min_calls:
+                if self._error_rate() >= self.failure_rate:
+                    self._trip()
+
+    def _trip(self):
+        self.state = OPEN
+        self.opened_at = time.time()
+        print(f"Circuit breaker '{self.name}' opened for {self.cooldown}s")
+
+    def _error_rate(self):
+        if not self._calls:
+            return 0.0
+        return sum(1 for ok, _ in self._calls if not ok) / len(self._calls)
+
+    def reset(self):
+        with self._lock:
+            self.state = CLOSED
+            self.opened_at = None
+            self.short_circuited = 0
+            self._probe_in_flight = False
+            self._calls.clear()
+
+    # --- wrapping ---
+    def call(self, func, *args, **kwargs):
+        if self.configured is not None and not self.configured():
+            return func(*args, **kwargs)
+        if not self.allow_request():
+            return self.failure_value
+
+        started = time.time()
+        try:
+            result = func(*args, **kwargs)
+        except Exception:
+            self.record(False, time.time() - started)
+            raise
+        latency = time.time() - started
+        ok = not self.is_failure(result)
+        if ok and self.slow_call_seconds is not None and latency > self.slow_call_seconds:
+            ok = False
+        self.record(ok, latency)
+        return result
+
+    def __call__(self, func):
+        """Use the breaker as a decorator."""
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            return self.call(func, *args, **kwargs)
+        wrapper.breaker = self
+        return wrapper
+
+    # --- metrics ---
+    def snapshot(self):
+        with self._lock:
+            latencies = sorted(latency for _, latency in self._calls)
+            error_rate = self._error_rate()
+            retry_in = None
+            if self.state == OPEN:
+                retry_in = max(0, round(self.cooldown - (time.time() - self.opened_at), 1))
+            return {
+                "state": self.state,
+                "health": round(1 - error_rate, 3),
+                "error_rate": round(error_rate, 3),
+                "calls_in_window": len(latencies),
+                "avg_latency_ms": round(sum(latencies) / len(latencies) * 1000) if latencies else None,
+                "p95_latency_ms": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] * 1000)
+                if latencies else None,
+                "short_circuited": self.short_circuited,
+                "retry_in_seconds": retry_in,
+            }
+
+
+def snapshot_all():
+    """Return the state of every registered breaker, keyed by name."""
+    return {name: breaker.snapshot() for name, breaker in breakers.items()}
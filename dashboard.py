@@ -0,0 +1,80 @@
+"""
+Dashboard bootstrap.
+One authenticated call returns everything the dashboard and calorie tracker
+need on load: profile, BMR/TDEE and goal settings, today's nutrition and
+training totals, and the most recent workouts. The user and profile come
+from the cached identity (identity.py) and the energy figures are memoized
+on it, so a warm call runs three small indexed queries.
+"""
+from datetime import date
+
+from flask import jsonify, request, Blueprint
+from flask_jwt_extended import jwt_required
+
+from models import SavedWorkoutHistory, DailyNutrition, TrainingStat
+from identity import current_identity
+from fieldsets import load_only_for, serialize
+from food_log import parse_day, totals_to_dict
+from profile import HISTORY_FIELDS, ensure_profile, profile_to_dict
+from training_stats import stat_to_dict
+
+# Blueprint setup
+dashboard_bp = Blueprint("dashboard", __name__, url_prefix="/dashboard")
+
+RECENT_FIELDS = ["id", "workout_name", "duration_seconds", "completed_at", "total_volume", "total_sets", "total_reps"]
+DEFAULT_RECENT = 5
+MAX_RECENT = 20
+
+
+def parse_recent(args):
+    try:
+        recent = int(args.get("recent", DEFAULT_RECENT))
+    except (TypeError, ValueError):
+        raise ValueError("recent must be an integer")
+    return max(0, min(recent, MAX_RECENT))
+
+
+def recent_workouts(user_id, limit):
+    sort_columns = [SavedWorkoutHistory.completed_at, SavedWorkoutHistory.id]
+    rows = (
+        SavedWorkoutHistory.query
+        .options(load_only_for(HISTORY_FIELDS, RECENT_FIELDS, *sort_columns))
+        .filter_by(user_id=user_id)
+        .order_by(*[column.desc() for column in sort_columns])
+        .limit(limit)
+        .all()
+    )
+    return [serialize(row, HISTORY_FIELDS, RECENT_FIELDS) for row in rows]
+
+
+@dashboard_bp.route("/bootstrap", methods=["GET"])
+@jwt_required()
+def bootstrap():
+    """Profile, energy targets, today's totals and recent workouts (?day=YYYY-MM-DD, ?recent=N)."""
+    identity = current_identity()
+    if not identity:
+        return jsonify({"error": "User not found"}), 404
+    try:
+        day = parse_day(request.args.get("day"), date.today())
+        recent = parse_recent(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    if not identity.profile:
+        ensure_profile(identity)
+        identity = current_identity()
+
+    user_id = identity.id
+    nutrition = DailyNutrition.query.filter_by(user_id=user_id, day=day).first()
+    training = TrainingStat.query.filter_by(user_id=user_id, period="day", period_start=day).first()
+
+    return jsonify({
+        "profile": profile_to_dict(identity, identity.profile),
+        "energy": identity.energy(today=day),
+        "today": {
+            "day": day.isoformat(),
+            "nutrition": totals_to_dict(nutrition),
+            "training": stat_to_dict(training),
+        },
+        "recent_workouts": recent_workouts(user_id, recent) if recent else [],
+    }), 200
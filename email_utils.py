@@ -111,8 +111,8 @@ If you did not request this reset, please ignore this email.
     brevo_api_key = os.environ.get('BREVO_API_KEY')
     if brevo_api_key:
         try:
-            import requests
-            response = requests.post(
+            import http_client
+            response = http_client.post(
                 'https://api.brevo.com/v3/smtp/email',
                 headers={
                     'api-key': brevo_api_key,
@@ -138,8 +138,8 @@ If you did not request this reset, please ignore this email.
     # Try SendGrid as fallback
     if sendgrid_api_key:
         try:
-            import requests
-            response = requests.post(
+            import http_client
+            response = http_client.post(
                 'https://api.sendgrid.com/v3/mail/send',
                 headers={
                     'Authorization': f'Bearer {sendgrid_api_key}',
@@ -0,0 +1,338 @@
+"""
+Energy targets from user profiles.
+BMR uses the Mifflin-St Jeor equation; TDEE multiplies it by the
+activity level. Goal targets follow the calorie goal page
+(templates/calorie_goal.html): a fixed deficit or surplus for the weekly
+rate preset chosen when the goal was set (UserProfile.goal_rate_kg), and
+never below 1200 kcal when losing weight. Missing profile values fall back
+to the defaults below.
+
+profile_energy() / goal_target() / project_weight() handle one profile.
+The batch API (profile_columns, batch_energy, project_weights) does the
+same math for many profiles at once with NumPy, which is optional: the
+refresh job falls back to the per-row functions without it.
+Run `python energy.py refresh [--batch 1000] [--dry-run] [--per-row]` to
+recompute daily_calorie_target for every profile whose goal used a preset.
+"""
+import math
+import argparse
+from datetime import date
+
+DEFAULT_WEIGHT_KG = 70
+DEFAULT_HEIGHT_CM = 170
+DEFAULT_AGE = 25
+
+ACTIVITY_LEVELS = {
+    "sedentary": 1.2,
+    "light": 1.375,
+    "moderate": 1.55,
+    "active": 1.725,
+    "very_active": 1.9,
+}
+DEFAULT_ACTIVITY = 1.55
+
+# Weekly rates offered by the goal page (kg/week) and their daily kcal adjustment
+GOAL_RATES = (0.25, 0.5, 1.0)
+GOAL_RATE_NAMES = {"slow": 0.25, "moderate": 0.5, "fast": 1.0}
+GOAL_ADJUSTMENTS = {
+    "lose": (-250, -500, -1000),
+    "gain": (250, 350, 500),
+}
+MIN_LOSE_CALORIES = 1200
+KCAL_PER_KG = 7700
+
+
+def _numpy():
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+
+def js_round(value):
+    """Math.round from the goal page (halves round up)."""
+    return math.floor(value + 0.5)
+
+
+def age_on(date_of_birth, today):
+    if not date_of_birth:
+        return DEFAULT_AGE
+    age = today.year - date_of_birth.year
+    if (today.month, today.day) < (date_of_birth.month, date_of_birth.day):
+        age -= 1
+    return age
+
+
+def bmr_of(weight_kg, height_cm, age, gender):
+    # Mifflin-St Jeor Equation (gender-aware)
+    # Men: BMR = (10 × weight) + (6.25 × height) - (5 × age) + 5
+    # Women: BMR = (10 × weight) + (6.25 × height) - (5 × age) - 161
+    bmr = (10 * weight_kg) + (6.25 * height_cm) - (5 * age)
+    return bmr - 161 if gender == "female" else bmr + 5
+
+
+# ---------------------------------------------------------
+# ONE PROFILE
+# ---------------------------------------------------------
+def profile_energy(profile, activity=None, today=None):
+    """BMR, TDEE, daily target and goal settings for a profile (ORM row or identity snapshot).
+
+    `activity` is only used when the profile has no activity level saved.
+    """
+    weight_kg = profile.weight_kg or DEFAULT_WEIGHT_KG
+    height_cm = profile.height_cm or DEFAULT_HEIGHT_CM
+    gender = getattr(profile, "gender", "male") or "male"
+    age = age_on(profile.date_of_birth, today or date.today())
+    bmr = bmr_of(weight_kg, height_cm, age, gender)
+
+    activity = getattr(profile, "activity_level", None) or activity or "moderate"
+    tdee = int(bmr * ACTIVITY_LEVELS.get(activity, DEFAULT_ACTIVITY))
+
+    # A saved goal overrides the maintenance target
+    daily_target = getattr(profile, "daily_calorie_target", None) or tdee
+
+    return {
+        "bmr": int(bmr),
+        "tdee": tdee,
+        "daily_target": daily_target,
+        "activity_level": activity,
+        "weight_kg": weight_kg,
+        "height_cm": height_cm,
+        "age": age,
+        "gender": gender,
+        "goal_type": getattr(profile, "goal_type", "maintain") or "maintain",
+        "target_weight_kg": getattr(profile, "target_weight_kg", None),
+        "goal_timeline_weeks": getattr(profile, "goal_timeline_weeks", None),
+        "has_goal": daily_target != tdee,
+    }
+
+
+def goal_rate_index(rate):
+    """Index into GOAL_RATES of the preset closest to a weekly rate (kg/week); None if unknown."""
+    if not rate:
+        return None
+    return min(range(len(GOAL_RATES)), key=lambda i: abs(GOAL_RATES[i] - rate))
+
+
+def chosen_rate(profile, name=None):
+    """Weekly rate (kg/week) to save with a goal: the named preset, else the one its numbers imply.
+
+    Called when the goal is set, so the implied rate uses the starting weight;
+    later targets reuse the saved rate instead of re-inferring it.
+    """
+    if (profile.goal_type or "maintain") not in GOAL_ADJUSTMENTS:
+        return None
+    if name in GOAL_RATE_NAMES:
+        return GOAL_RATE_NAMES[name]
+    weeks = profile.goal_timeline_weeks
+    if not profile.target_weight_kg or not weeks or weeks <= 0:
+        return None
+    index = goal_rate_index(abs(profile.target_weight_kg - (profile.weight_kg or DEFAULT_WEIGHT_KG)) / weeks)
+    return GOAL_RATES[index]
+
+
+def _tdee(profile, weight_kg, today):
+    height_cm = profile.height_cm or DEFAULT_HEIGHT_CM
+    age = age_on(profile.date_of_birth, today)
+    multiplier = ACTIVITY_LEVELS.get(profile.activity_level or "moderate", DEFAULT_ACTIVITY)
+    return bmr_of(weight_kg, height_cm, age, profile.gender or "male") * multiplier
+
+
+def goal_target(profile, today=None):
+    """The daily_calorie_target the goal page would save for this profile now.
+
+    Lose/gain goals use the saved goal_rate_kg; None when there is none.
+    """
+    weight_kg = profile.weight_kg or DEFAULT_WEIGHT_KG
+    tdee = _tdee(profile, weight_kg, today or date.today())
+    goal_type = profile.goal_type or "maintain"
+    if goal_type not in GOAL_ADJUSTMENTS:
+        return js_round(tdee)
+    index = goal_rate_index(getattr(profile, "goal_rate_kg", None))
+    if index is None:
+        return None
+    target = js_round(tdee + GOAL_ADJUSTMENTS[goal_type][index])
+    return max(MIN_LOSE_CALORIES, target) if goal_type == "lose" else target
+
+
+def project_weight(profile, target, weeks, today=None):
+    """Weekly weights (weeks + 1 values) eating `target` kcal a day.
+
+    TDEE is recomputed from each week's weight, so progress slows as weight
+    changes; the projection stops at the target weight.
+    """
+    today = today or date.today()
+    weight = profile.weight_kg or DEFAULT_WEIGHT_KG
+    goal_weight = profile.target_weight_kg
+    weights = [weight]
+    for _ in range(weeks):
+        weight += (target - _tdee(profile, weight, today)) * 7 / KCAL_PER_KG
+        if goal_weight:
+            if weights[0] > goal_weight:
+                weight = max(weight, goal_weight)
+            elif weights[0] < goal_weight:
+                weight = min(weight, goal_weight)
+        weights.append(weight)
+    return weights
+
+
+# ---------------------------------------------------------
+# MANY PROFILES (NumPy)
+# ---------------------------------------------------------
+def require_numpy():
+    np = _numpy()
+    if np is None:
+        raise ImportError("The batch energy API needs NumPy: pip install numpy")
+    return np
+
+
+def profile_columns(profiles, today=None):
+    """Column arrays for batch_energy / project_weights from rows with UserProfile's attributes."""
+    np = require_numpy()
+    today = today or date.today()
+    goal_codes = {"lose": -1, "gain": 1}
+    weight, height, age, female, multiplier, goal, rate, target_weight = ([] for _ in range(8))
+    for p in profiles:
+        weight.append(p.weight_kg or DEFAULT_WEIGHT_KG)
+        height.append(p.height_cm or DEFAULT_HEIGHT_CM)
+        age.append(age_on(p.date_of_birth, today))
+        female.append(p.gender == "female")
+        multiplier.append(ACTIVITY_LEVELS.get(p.activity_level or "moderate", DEFAULT_ACTIVITY))
+        goal.append(goal_codes.get(p.goal_type or "maintain", 0))
+        rate.append(getattr(p, "goal_rate_kg", None) or np.nan)
+        target_weight.append(p.target_weight_kg or np.nan)
+    return {
+        "weight_kg": np.array(weight, dtype=float),
+        "height_cm": np.array(height, dtype=float),
+        "age": np.array(age, dtype=float),
+        "female": np.array(female, dtype=bool),
+        "multiplier": np.array(multiplier, dtype=float),
+        "goal": np.array(goal, dtype=int),
+        "rate": np.array(rate, dtype=float),
+        "target_weight_kg": np.array(target_weight, dtype=float),
+    }
+
+
+def _batch_tdee(np, columns, weight_kg):
+    bmr = (10 * weight_kg) + (6.25 * columns["height_cm"]) - (5 * columns["age"])
+    bmr = np.where(columns["female"], bmr - 161, bmr + 5)
+    return bmr, bmr * columns["multiplier"]
+
+
+def batch_energy(columns):
+    """{"bmr", "tdee", "target"} arrays; target is NaN where goal_target() returns None.
+
+    bmr and tdee are unrounded floats (profile_energy truncates them for display).
+    """
+    np = require_numpy()
+    bmr, tdee = _batch_tdee(np, columns, columns["weight_kg"])
+    goal = columns["goal"]
+
+    rate = columns["rate"]
+    index = np.abs(rate[:, None] - np.array(GOAL_RATES)).argmin(axis=1)
+    adjustment = np.select(
+        [goal == -1, goal == 1],
+        [np.array(GOAL_ADJUSTMENTS["lose"])[index], np.array(GOAL_ADJUSTMENTS["gain"])[index]],
+        0,
+    )
+    target = np.floor(tdee + adjustment + 0.5)
+    target = np.where(goal == -1, np.maximum(target, MIN_LOSE_CALORIES), target)
+    target = np.where((goal != 0) & np.isnan(rate), np.nan, target)
+    return {"bmr": bmr, "tdee": tdee, "target": target}
+
+
+def project_weights(columns, targets, weeks):
+    """(profiles, weeks + 1) array of weekly weights, as project_weight() per row."""
+    np = require_numpy()
+    start = columns["weight_kg"]
+    goal_weight = columns["target_weight_kg"]
+    floor = np.where(start > goal_weight, goal_weight, -np.inf)
+    ceiling = np.where(start < goal_weight, goal_weight, np.inf)
+    weights = np.empty((len(start), weeks + 1))
+    weights[:, 0] = start
+    for week in range(1, weeks + 1):
+        _, tdee = _batch_tdee(np, columns, weights[:, week - 1])
+        step = weights[:, week - 1] + (targets - tdee) * 7 / KCAL_PER_KG
+        weights[:, week] = np.clip(step, floor, ceiling)
+    return weights
+
+
+# ---------------------------------------------------------
+# REFRESH daily_calorie_target
+# ---------------------------------------------------------
+def refresh_targets(batch_size=1000, dry_run=False, vectorized=None, today=None):
+    """Recompute daily_calorie_target for preset goals; returns (checked, changed).
+
+    Age and weight drift since a goal was set; this re-applies the goal page's
+    rules, with the saved weekly rate, to the current profile. Custom targets
+    and goals saved before the preset flag existed are left alone. Profiles are read in id order batches and
+    changed targets written with one executemany UPDATE per batch. The UPDATE
+    bumps updated_at, so web workers drop their cached identity snapshots on
+    the next request.
+    """
+    from sqlalchemy import bindparam, select, update
+    from models import db, UserProfile
+
+    if vectorized is None:
+        vectorized = _numpy() is not None
+    today = today or date.today()
+    columns = [
+        UserProfile.id, UserProfile.weight_kg, UserProfile.height_cm, UserProfile.date_of_birth,
+        UserProfile.gender, UserProfile.activity_level, UserProfile.goal_type,
+        UserProfile.target_weight_kg, UserProfile.goal_rate_kg, UserProfile.daily_calorie_target,
+    ]
+    table = UserProfile.__table__
+    write = (
+        update(table)
+        .where(table.c.id == bindparam("profile_id"))
+        .values(daily_calorie_target=bindparam("target"))
+    )
+
+    checked = changed = 0
+    last_id = 0
+    while True:
+        rows = db.session.execute(
+            select(*columns)
+            .where(UserProfile.goal_preset.is_(True), UserProfile.id > last_id)
+            .order_by(UserProfile.id)
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            break
+        last_id = rows[-1].id
+
+        if vectorized:
+            targets = batch_energy(profile_columns(rows, today))["target"].tolist()
+            targets = [None if math.isnan(t) else int(t) for t in targets]
+        else:
+            targets = [goal_target(row, today) for row in rows]
+
+        updates = [
+            {"profile_id": row.id, "target": target}
+            for row, target in zip(rows, targets)
+            if target is not None and target != row.daily_calorie_target
+        ]
+        checked += len(rows)
+        changed += len(updates)
+        if updates and not dry_run:
+            db.session.execute(write, updates)
+            db.session.commit()
+
+    print(f"Calorie targets: {checked} profiles checked, {changed} {'would change' if dry_run else 'updated'}")
+    return checked, changed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Energy targets")
+    sub = parser.add_subparsers(dest="command", required=True)
+    refresh_parser = sub.add_parser("refresh", help="Recompute daily_calorie_target for profiles with a preset goal")
+    refresh_parser.add_argument("--batch", type=int, default=1000, help="profiles per batch")
+    refresh_parser.add_argument("--dry-run", action="store_true", help="count changes without writing")
+    refresh_parser.add_argument("--per-row", action="store_true", help="skip NumPy even if it is installed")
+    args = parser.parse_args()
+
+    from app import app
+
+    with app.app_context():
+        refresh_targets(args.batch, args.dry_run, vectorized=False if args.per_row else None)
@@ -0,0 +1,272 @@
+"""
+Local mirror of the ExerciseDB catalogue.
+`python exercise_catalog.py sync` pages through the ExerciseDB API and
+replaces the exercise_catalog table in one transaction; a failed or empty
+fetch leaves the previous copy in place. Searches are answered from an
+in-memory inverted index built from that table on first use (~0.1ms per
+query over 1,500 exercises, instead of a ~0.5-2s upstream call), so they keep
+working when exercisedb.dev is unreachable. The upstream is only queried
+live while the table is still empty (before the first sync).
+Workers notice a newer sync within EXERCISE_INDEX_CHECK seconds (one
+SELECT MAX(synced_at)) and rebuild their index. Configure with:
+- EXERCISE_INDEX_CHECK: seconds between checks for a newer sync (default 300)
+"""
+import os
+import re
+import time
+import bisect
+import argparse
+import threading
+from datetime import datetime
+
+from sqlalchemy import func, insert
+
+import http_client
+from models import db, CatalogExercise
+
+# External ExerciseDB API URLs
+EXERCISE_API_URL = "https://www.exercisedb.dev/api/v1/exercises"
+
+INDEX_CHECK_SECONDS = float(os.getenv("EXERCISE_INDEX_CHECK", "300"))
+SYNC_PAGE_SIZE = 100
+
+# How much a query term counts when it matches each field
+FIELD_WEIGHTS = {
+    "name": 3.0,
+    "targetMuscles": 2.0,
+    "bodyParts": 2.0,
+    "equipments": 1.5,
+    "secondaryMuscles": 1.0,
+}
+PREFIX_MATCH_FACTOR = 0.5  # "dumb" -> "dumbbell" counts half of an exact term
+
+# Request filters -> catalogue fields they match exactly
+FILTER_FIELDS = {"body_part": "bodyParts", "target": "targetMuscles", "equipment": "equipments"}
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def normalize(text):
+    return " ".join(_TOKEN_RE.findall(str(text).lower()))
+
+
+def tokenize(text):
+    """Lowercase alphanumeric tokens with a plural 's' dropped ("curls" -> "curl", "press" kept)."""
+    tokens = []
+    for token in _TOKEN_RE.findall(str(text).lower()):
+        if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+            token = token[:-1]
+        tokens.append(token)
+    return tokens
+
+
+def _values(doc, field):
+    value = doc.get(field) or []
+    return [value] if isinstance(value, str) else value
+
+
+class ExerciseIndex:
+    """Inverted index over exercise documents (ExerciseDB's JSON shape).
+
+    Every query term must match a name, muscle, body part or equipment
+    token, exactly or as a prefix; results are ranked by the weight of the
+    fields matched, with exact and leading name matches first.
+    """
+
+    def __init__(self, docs):
+        self.docs = list(docs)
+        self._postings = {}   # term -> {doc index: best field weight}
+        self._facets = {field: {} for field in FILTER_FIELDS.values()}  # field -> value -> {doc index}
+        self._names = []
+        for i, doc in enumerate(self.docs):
+            self._names.append(" ".join(tokenize(doc.get("name", ""))))
+            for field, weight in FIELD_WEIGHTS.items():
+                for value in _values(doc, field):
+                    for term in tokenize(value):
+                        postings = self._postings.setdefault(term, {})
+                        if postings.get(i, 0) < weight:
+                            postings[i] = weight
+                    if field in self._facets:
+                        self._facets[field].setdefault(normalize(value), set()).add(i)
+        self._terms = sorted(self._postings)
+
+    def __len__(self):
+        return len(self.docs)
+
+    def _term_scores(self, token):
+        """{doc index: score} for every document matching one query token."""
+        scores = dict(self._postings.get(token, {}))
+        start = bisect.bisect_left(self._terms, token)
+        for term in self._terms[start:]:
+            if not term.startswith(token):
+                break
+            if term == token:
+                continue
+            for i, weight in self._postings[term].items():
+                scores[i] = max(scores.get(i, 0), weight * PREFIX_MATCH_FACTOR)
+        return scores
+
+    def search(self, query="", limit=20, **filters):
+        """Ranked documents for a free-text query and/or exact body_part/target/equipment filters."""
+        allowed = None
+        for name, value in filters.items():
+            if not value:
+                continue
+            matches = self._facets[FILTER_FIELDS[name]].get(normalize(value), set())
+            allowed = matches if allowed is None else allowed & matches
+
+        tokens = tokenize(query)
+        if not tokens:
+            if allowed is None:
+                return []
+            return [self.docs[i] for i in sorted(allowed, key=lambda i: self._names[i])[:limit]]
+
+        scores = None
+        for token in tokens:
+            term_scores = self._term_scores(token)
+            if scores is None:
+                scores = term_scores
+            else:
+                scores = {i: score + term_scores[i] for i, score in scores.items() if i in term_scores}
+            if not scores:
+                return []
+        if allowed is not None:
+            scores = {i: score for i, score in scores.items() if i in allowed}
+
+        phrase = " ".join(tokens)
+        for i in scores:
+            if self._names[i] == phrase:
+                scores[i] += 10
+            elif self._names[i].startswith(phrase):
+                scores[i] += 5
+        ranked = sorted(scores, key=lambda i: (-scores[i], len(self._names[i]), self._names[i]))
+        return [self.docs[i] for i in ranked[:limit]]
+
+
+# ---------------------------------------------------------
+# CATALOG (table -> index)
+# ---------------------------------------------------------
+def exercise_to_doc(row):
+    return {
+        "exerciseId": row.exercise_id,
+        "name": row.name,
+        "bodyParts": row.body_parts or [],
+        "targetMuscles": row.target_muscles or [],
+        "secondaryMuscles": row.secondary_muscles or [],
+        "equipments": row.equipments or [],
+        "instructions": row.instructions or [],
+        "gifUrl": row.gif_url or "",
+    }
+
+
+class ExerciseCatalog:
+    """Per-worker index over the exercise_catalog table, rebuilt when a newer sync lands."""
+
+    def __init__(self, check_seconds=INDEX_CHECK_SECONDS):
+        self.check_seconds = check_seconds
+        self._index = None
+        self._version = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def index(self):
+        """The current index (None while the table is empty); needs an app context."""
+        if time.time() - self._checked_at >= self.check_seconds:
+            with self._lock:
+                if time.time() - self._checked_at >= self.check_seconds:
+                    self._refresh()
+        return self._index
+
+    def _refresh(self):
+        version = db.session.query(func.max(CatalogExercise.synced_at)).scalar()
+        if version != self._version:
+            rows = CatalogExercise.query.order_by(CatalogExercise.name).all()
+            self._index = ExerciseIndex(exercise_to_doc(row) for row in rows) if rows else None
+            self._version = version
+            print(f"Exercise index loaded: {len(rows)} exercises")
+        self._checked_at = time.time()
+
+    def reload(self):
+        with self._lock:
+            self._version = None
+            self._refresh()
+
+    def clear(self):
+        """Forget the index; the next search reloads it from the table."""
+        with self._lock:
+            self._index = self._version = None
+            self._checked_at = 0.0
+
+    def search(self, query="", limit=20, **filters):
+        """Ranked exercises from the local mirror, or None if it has not been synced yet."""
+        index = self.index()
+        if index is None:
+            return None
+        return index.search(query, limit, **filters)
+
+
+catalog = ExerciseCatalog()
+
+
+# ---------------------------------------------------------
+# SYNC
+# ---------------------------------------------------------
+def fetch_catalog(page_size=SYNC_PAGE_SIZE):
+    """Every exercise from the ExerciseDB API, following its pagination; raises on errors."""
+    exercises = []
+    offset = 0
+    while True:
+        response = http_client.get(EXERCISE_API_URL, params={"offset": offset, "limit": page_size})
+        if response.status_code != 200:
+            raise RuntimeError(f"ExerciseDB returned {response.status_code} at offset {offset}")
+        data = response.json()
+        items = data.get("data", []) if isinstance(data, dict) else data
+        exercises.extend(items)
+        metadata = data.get("metadata", {}) if isinstance(data, dict) else {}
+        if not items or not metadata.get("nextPage"):
+            return exercises
+        offset += len(items)
+
+
+def sync(exercises=None):
+    """Replace the local catalogue (fetched from ExerciseDB unless given); returns the row count."""
+    if exercises is None:
+        exercises = fetch_catalog()
+    now = datetime.utcnow()
+    rows = {}
+    for ex in exercises:
+        key = ex.get("exerciseId") or normalize(ex.get("name", ""))
+        if not key or not ex.get("name"):
+            continue
+        rows[key] = {
+            "exercise_id": str(key)[:64],
+            "name": str(ex["name"])[:255],
+            "body_parts": _values(ex, "bodyParts"),
+            "target_muscles": _values(ex, "targetMuscles"),
+            "secondary_muscles": _values(ex, "secondaryMuscles"),
+            "equipments": _values(ex, "equipments"),
+            "instructions": _values(ex, "instructions"),
+            "gif_url": ex.get("gifUrl"),
+            "synced_at": now,
+        }
+    if not rows:
+        raise RuntimeError("ExerciseDB returned no exercises; keeping the current catalogue")
+
+    CatalogExercise.query.delete(synchronize_session=False)
+    db.session.execute(insert(CatalogExercise), list(rows.values()))
+    db.session.commit()
+    catalog.reload()
+    print(f"Synced {len(rows)} exercises from ExerciseDB")
+    return len(rows)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local ExerciseDB mirror")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("sync", help="Download the ExerciseDB catalogue into exercise_catalog")
+    args = parser.parse_args()
+
+    from app import app
+
+    with app.app_context():
+        sync()
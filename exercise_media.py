@@ -0,0 +1,266 @@
+"""
+Caching proxy for exercise demonstration GIFs.
+The exercise search APIs hand out /media/exercise?src=<upstream gifUrl>
+instead of the ExerciseDB URL. The first request for a GIF downloads it
+once and stores it in the blob store under its sha256, with a JPEG poster
+frame when Pillow is installed. Every later request is served from disk
+with an ETag and a year-long public Cache-Control. An animated WebP copy
+(kept only if smaller than the GIF) is made off the request path by a
+background worker or by `warm`; once it exists, browsers that accept WebP
+get it. Concurrent misses for one GIF share a single download, a failed
+download is not retried for FAILURE_TTL seconds, and a GIF whose file has
+gone missing from the blob store is downloaded again.
+Only GIFs listed in the exercise catalogue, on hosts in
+EXERCISE_MEDIA_HOSTS, are fetched; other URLs on those hosts are redirected
+to upstream. Configure with:
+- EXERCISE_MEDIA_PROXY: set to 0 to hand out upstream gifUrls unchanged (default 1)
+- EXERCISE_MEDIA_HOSTS: comma-separated hosts the proxy may fetch from (default the exercisedb.dev hosts)
+- EXERCISE_MEDIA_WEBP_QUALITY: animated WebP quality, 0-100 (default 70)
+- EXERCISE_MEDIA_TRANSCODE_WORKERS: background WebP threads per worker (default 1, 0 leaves it to `warm`)
+Run `python exercise_media.py warm` to fetch and transcode every catalogue GIF ahead of time.
+"""
+import io
+import os
+import hashlib
+import argparse
+from urllib.parse import urlsplit
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app, url_for
+from sqlalchemy.exc import IntegrityError
+
+import http_client
+from cache import LRUCache, SingleFlight
+from blob_store import blob_store, add_blob_row, make_thumbnail, sniff_content_type, MAX_BLOB_BYTES
+from models import db, ExerciseMedia, CatalogExercise
+
+PROXY_ENABLED = os.getenv("EXERCISE_MEDIA_PROXY", "1") != "0"
+ALLOWED_HOSTS = frozenset(
+    host.strip().lower()
+    for host in os.getenv("EXERCISE_MEDIA_HOSTS", "static.exercisedb.dev,www.exercisedb.dev,exercisedb.dev").split(",")
+    if host.strip()
+)
+WEBP_QUALITY = int(os.getenv("EXERCISE_MEDIA_WEBP_QUALITY", "70"))
+TRANSCODE_WORKERS = int(os.getenv("EXERCISE_MEDIA_TRANSCODE_WORKERS", "1"))
+POSTER_SIZE = 360
+
+# The proxied URL always returns the same content, so it may be cached by anyone for a year
+EXERCISE_MEDIA_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+FAILURE_TTL = 60  # seconds a failed download is remembered before trying again
+CHUNK_SIZE = 64 * 1024
+
+failed_fetches = LRUCache(1024)
+_fetches = SingleFlight()
+
+# WebP transcodes run here so a first view only waits for the download; None: only `warm` transcodes
+transcode_pool = (
+    ThreadPoolExecutor(max_workers=TRANSCODE_WORKERS, thread_name_prefix="exercise-webp")
+    if TRANSCODE_WORKERS > 0 else None
+)
+
+
+def source_key(url):
+    return hashlib.sha256(url.encode("utf-8")).hexdigest()
+
+
+def allowed_source(url):
+    """True for an http(s) URL on one of the allowed hosts."""
+    if not isinstance(url, str) or not url:
+        return False
+    parts = urlsplit(url)
+    return parts.scheme in ("http", "https") and (parts.hostname or "") in ALLOWED_HOSTS
+
+
+def catalog_source(url):
+    """True if the URL is the gifUrl of an exercise in the local catalogue."""
+    return db.session.query(CatalogExercise.exercise_id).filter(CatalogExercise.gif_url == url).first() is not None
+
+
+def proxy_url(url, poster=False):
+    """Proxy URL for an upstream gifUrl; other values are returned unchanged."""
+    if not PROXY_ENABLED or not allowed_source(url):
+        return url
+    if poster:
+        return url_for("media.get_exercise_media", src=url, variant="poster")
+    return url_for("media.get_exercise_media", src=url)
+
+
+# ---------------------------------------------------------
+# FETCH + TRANSCODE
+# ---------------------------------------------------------
+def download(url):
+    """The upstream file's bytes; raises RuntimeError if it is missing, too large or not an image."""
+    response = http_client.get(url, stream=True)
+    try:
+        if response.status_code != 200:
+            raise RuntimeError(f"{url} returned {response.status_code}")
+        data = bytearray()
+        for chunk in response.iter_content(CHUNK_SIZE):
+            data.extend(chunk)
+            if len(data) > MAX_BLOB_BYTES:
+                raise RuntimeError(f"{url} is larger than {MAX_BLOB_BYTES} bytes")
+    finally:
+        response.close()
+    data = bytes(data)
+    if not (sniff_content_type(data) or "").startswith("image/"):
+        raise RuntimeError(f"{url} is not an image")
+    return data
+
+
+def make_webp(data, quality=WEBP_QUALITY):
+    """Animated WebP bytes for a GIF, or None without Pillow or for unreadable images."""
+    try:
+        # Imported on first download rather than at startup
+        from PIL import Image
+    except ImportError:  # WebP copies are skipped without Pillow
+        return None
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            out = io.BytesIO()
+            # save_all keeps every frame with its duration; loop=0 repeats forever like the GIF
+            image.save(out, format="WEBP", save_all=True, quality=quality, method=4, loop=0)
+            return out.getvalue()
+    except Exception as e:
+        print(f"WebP transcode error: {e}")
+        return None
+
+
+def put_blob(data, content_type):
+    """Store bytes in the blob store with their MediaBlob row; returns the sha256 (caller commits)."""
+    digest = blob_store.put(data)
+    add_blob_row(digest, content_type, len(data))
+    return digest
+
+
+def cache_media(url):
+    """Download one GIF and store it with its poster unless it is stored already; returns its source key.
+
+    The WebP copy is left to schedule_transcode.
+    """
+    key = source_key(url)
+    if db.session.get(ExerciseMedia, key) is not None:
+        return key
+
+    data = download(url)
+    media = ExerciseMedia(source_key=key, source_url=url, gif_sha256=put_blob(data, sniff_content_type(data)))
+    poster = make_thumbnail(data, size=POSTER_SIZE)
+    if poster is not None:
+        media.poster_sha256 = put_blob(poster, "image/jpeg")
+    db.session.add(media)
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # Another worker stored the same GIF first; its files are identical
+        db.session.rollback()
+        return key
+    print(f"Cached exercise GIF {url}: {len(data)} bytes, poster {len(poster) if poster else '-'}")
+    schedule_transcode(key)
+    return key
+
+
+def transcode(key):
+    """Add the WebP copy to a stored GIF if it has none and WebP is smaller; returns its sha256 or None."""
+    media = db.session.get(ExerciseMedia, key)
+    if media is None or media.webp_sha256 or not blob_store.exists(media.gif_sha256):
+        return None
+    with open(blob_store.path(media.gif_sha256), "rb") as f:
+        data = f.read()
+    webp = make_webp(data)
+    if webp is None or len(webp) >= len(data):
+        return None
+    media.webp_sha256 = put_blob(webp, "image/webp")
+    db.session.commit()
+    print(f"Transcoded exercise GIF {media.source_url}: {len(data)} -> {len(webp)} bytes")
+    return media.webp_sha256
+
+
+def _transcode_job(app, key):
+    with app.app_context():
+        try:
+            transcode(key)
+        except Exception as e:
+            db.session.rollback()
+            print(f"WebP transcode error for {key}: {e}")
+
+
+def schedule_transcode(key):
+    """Queue transcode(key) on the background pool (no-op when it is disabled)."""
+    if transcode_pool is not None:
+        transcode_pool.submit(_transcode_job, current_app._get_current_object(), key)
+
+
+def get_media(url):
+    """ExerciseMedia row for an upstream URL, downloading it on first use.
+
+    Raises ValueError for URLs the proxy may not fetch, LookupError for URLs on
+    allowed hosts that are not catalogue GIFs, and RuntimeError when the
+    download fails (remembered for FAILURE_TTL seconds).
+    """
+    if not allowed_source(url):
+        raise ValueError("Unsupported media source")
+    key = source_key(url)
+    media = db.session.get(ExerciseMedia, key)
+    if media is not None:
+        if blob_store.exists(media.gif_sha256):
+            return media
+        # The file was lost (e.g. an ephemeral blob store was reset): drop the row and fetch it again
+        db.session.query(ExerciseMedia).filter_by(source_key=key).delete()
+        db.session.commit()
+    elif not catalog_source(url):
+        raise LookupError("Not an exercise catalogue GIF")
+
+    error = failed_fetches.get(key)
+    if error is not None:
+        raise RuntimeError(error)
+    try:
+        # Only the key crosses threads; each caller loads the row in its own session
+        _fetches.do(key, lambda: cache_media(url))
+    except Exception as e:
+        failed_fetches.set(key, str(e), FAILURE_TTL)
+        raise RuntimeError(str(e)) from e
+    return db.session.get(ExerciseMedia, key)
+
+
+def variant(media, poster=False, webp=False):
+    """(sha256, content type) of the file to serve: the poster, the WebP copy or the GIF."""
+    if poster and media.poster_sha256:
+        return media.poster_sha256, "image/jpeg"
+    if webp and media.webp_sha256:
+        return media.webp_sha256, "image/webp"
+    return media.gif_sha256, "image/gif"
+
+
+# ---------------------------------------------------------
+# WARM-UP
+# ---------------------------------------------------------
+def warm(limit=None):
+    """Fetch and transcode every GIF referenced by the exercise catalogue; returns (cached, failed)."""
+    query = db.session.query(CatalogExercise.gif_url).filter(CatalogExercise.gif_url.isnot(None)).distinct()
+    urls = [url for (url,) in query if allowed_source(url)]
+    cached = failed = transcoded = 0
+    for url in urls[:limit]:
+        try:
+            media = get_media(url)
+            cached += 1
+        except RuntimeError as e:
+            print(f"Could not cache {url}: {e}")
+            failed += 1
+            continue
+        if transcode(media.source_key):
+            transcoded += 1
+    print(f"Exercise media: {cached} cached ({transcoded} new WebP copies), {failed} failed")
+    return cached, failed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Exercise GIF cache")
+    sub = parser.add_subparsers(dest="command", required=True)
+    warm_parser = sub.add_parser("warm", help="Download and transcode every catalogue GIF into the blob store")
+    warm_parser.add_argument("--limit", type=int, help="Only fetch the first N GIFs")
+    args = parser.parse_args()
+
+    from app import app
+
+    with app.app_context():
+        warm(args.limit)
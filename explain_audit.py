@@ -0,0 +1,136 @@
+"""
+Index audit for the per-user query paths.
+Runs EXPLAIN on each ORM query the blueprints issue and flags sequential
+scans (and, on SQLite, sorts that could not use an index). Works against
+SQLite and PostgreSQL; on PostgreSQL sequential scans are discouraged for
+the session so a "Seq Scan" in the plan means no usable index exists.
+Run with: python explain_audit.py   (uses DATABASE_URL; exits 1 if anything is flagged)
+"""
+import sys
+from datetime import date, datetime
+
+from sqlalchemy import func, tuple_
+
+from models import (
+    db, User, UserProfile, Workout, WorkoutPlan, SavedWorkoutHistory,
+    PlanJob, PlanTemplate, NutritionEstimate, FoodLogEntry, DailyNutrition,
+)
+
+SAMPLE_USER_ID = 1
+SAMPLE_ID = 1
+
+
+def keyset(query, columns, values, limit=20):
+    """A page query as built by pagination.keyset_page."""
+    return (
+        query.filter(tuple_(*columns) < tuple_(*values))
+        .order_by(*[column.desc() for column in columns])
+        .limit(limit + 1)
+    )
+
+
+def audited_queries():
+    """(name, ORM query) for every hot query path, with sample parameters."""
+    return [
+        ("auth.login", User.query.filter_by(username="alice").limit(1)),
+        ("auth.forgot_password", UserProfile.query.filter(func.lower(UserProfile.email) == "a@b.c").limit(1)),
+        ("identity.load_identity", db.session.query(User, UserProfile)
+            .outerjoin(UserProfile, UserProfile.user_id == User.id).filter(User.id == SAMPLE_USER_ID).limit(1)),
+        ("profile.get_saved_history", SavedWorkoutHistory.query.filter_by(user_id=SAMPLE_USER_ID)
+            .order_by(SavedWorkoutHistory.completed_at.desc())),
+        ("profile.delete_history_entry", SavedWorkoutHistory.query.filter_by(id=SAMPLE_ID, user_id=SAMPLE_USER_ID)
+            .limit(1)),
+        ("workout.get_all_workouts", Workout.query.filter_by(user_id=SAMPLE_USER_ID).order_by(Workout.id.desc())),
+        ("workout.get_workout", Workout.query.filter_by(id=SAMPLE_ID, user_id=SAMPLE_USER_ID).limit(1)),
+        ("app.list_workout_plans", WorkoutPlan.query.filter_by(user_id=SAMPLE_USER_ID)
+            .order_by(WorkoutPlan.created_at.desc())),
+        ("app.get_or_update_plan", WorkoutPlan.query.filter_by(id=SAMPLE_ID, user_id=SAMPLE_USER_ID).limit(1)),
+        ("profile.get_saved_history_page", keyset(SavedWorkoutHistory.query.filter_by(user_id=SAMPLE_USER_ID),
+            [SavedWorkoutHistory.completed_at, SavedWorkoutHistory.id], [datetime(2030, 1, 1), SAMPLE_ID])),
+        ("workout.get_all_workouts_page", keyset(Workout.query.filter_by(user_id=SAMPLE_USER_ID),
+            [Workout.id], [SAMPLE_ID])),
+        ("app.list_workout_plans_page", keyset(WorkoutPlan.query.filter_by(user_id=SAMPLE_USER_ID),
+            [WorkoutPlan.created_at, WorkoutPlan.id], [datetime(2030, 1, 1), SAMPLE_ID])),
+        ("ai_plans.get_plan_job", PlanJob.query.filter_by(id="job", user_id=SAMPLE_USER_ID).limit(1)),
+        ("ai_plans.plan_cache_lookup", PlanTemplate.query.filter_by(params_key="key")
+            .filter(PlanTemplate.created_at >= datetime(2000, 1, 1))
+            .order_by(PlanTemplate.last_used_at.asc())),
+        ("nutrition_estimates.lookup", NutritionEstimate.query.filter_by(query_key="key")
+            .filter(NutritionEstimate.created_at >= datetime(2000, 1, 1)).limit(1)),
+        ("food_log.get_food_log", FoodLogEntry.query.filter_by(user_id=SAMPLE_USER_ID, day=date(2030, 1, 1))
+            .order_by(FoodLogEntry.id)),
+        ("food_log.summarize", DailyNutrition.query.filter(DailyNutrition.user_id == SAMPLE_USER_ID,
+            DailyNutrition.day.between(date(2030, 1, 1), date(2030, 1, 7)), DailyNutrition.entries > 0)
+            .order_by(DailyNutrition.day)),
+    ]
+
+
+def explain(conn, query):
+    """Return the plan lines for an ORM query on this connection."""
+    compiled = query.statement.compile(dialect=conn.dialect)
+    params = compiled.params
+    if compiled.positional:
+        params = tuple(params[name] for name in compiled.positiontup)
+
+    if conn.dialect.name == "sqlite":
+        rows = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled}", params).fetchall()
+        return [row[-1] for row in rows]
+    rows = conn.exec_driver_sql(f"EXPLAIN {compiled}", params).fetchall()
+    return [row[0] for row in rows]
+
+
+def find_problems(dialect, plan_lines):
+    """Return the plan lines that show a full scan or an unindexed sort."""
+    problems = []
+    for line in plan_lines:
+        text = line.strip()
+        if dialect == "sqlite":
+            if text.startswith("SCAN ") and "CONSTANT ROW" not in text:
+                problems.append(text)
+            elif text.startswith("USE TEMP B-TREE"):
+                problems.append(text)
+        elif "Seq Scan" in text:
+            problems.append(text)
+    return problems
+
+
+def run_audit(engine):
+    """EXPLAIN every audited query; returns a list of {name, plan, problems}."""
+    results = []
+    with engine.connect() as conn:
+        if conn.dialect.name == "postgresql":
+            conn.exec_driver_sql("SET enable_seqscan = off")
+        for name, query in audited_queries():
+            try:
+                plan = explain(conn, query)
+                problems = find_problems(conn.dialect.name, plan)
+            except Exception as e:
+                plan, problems = [], [f"EXPLAIN failed: {e}"]
+            results.append({"name": name, "plan": plan, "problems": problems})
+        if conn.dialect.name == "postgresql":
+            conn.exec_driver_sql("RESET enable_seqscan")
+    return results
+
+
+def main():
+    from app import app
+    from models import db
+
+    with app.app_context():
+        results = run_audit(db.engine)
+        dialect = db.engine.dialect.name
+
+    flagged = 0
+    print(f"Index audit ({dialect}):")
+    for result in results:
+        status = "FLAG" if result["problems"] else "ok"
+        print(f"  [{status:>4}] {result['name']}")
+        for line in result["problems"]:
+            print(f"         {line}")
+        flagged += bool(result["problems"])
+    print(f"{flagged} of {len(results)} queries flagged")
+    return 1 if flagged else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
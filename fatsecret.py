@@ -6,10 +6,18 @@ Supports CalorieNinjas (primary) and USDA FoodData Central (fallback).
 import os
 import time
 import json
-import requests
+import http_client
+from concurrent.futures import ThreadPoolExecutor, wait
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from models import db, UserProfile
+from cache import ResponseCache
+from circuit_breaker import CircuitBreaker, snapshot_all
+from food_db import LocalFoodStore
+from autocomplete import AutocompleteIndex
+from nutrition_estimates import EstimateCache
+from identity import current_identity, invalidate
+from energy import chosen_rate, goal_target
 
 fatsecret_bp = Blueprint("fatsecret", __name__, url_prefix="/api/food")
 
@@ -36,15 +44,115 @@ OPENAI_API_URL = "https://api.openai.com/v1/chat/completions"
 # TheMealDB API for recipe browsing
 MEALDB_API_URL = "https://www.themealdb.com/api/json/v1/1"
 
+# Response cache lifetimes (seconds) per upstream lookup.
+# Free-text searches go stale sooner; barcodes and food IDs almost never change.
+FOOD_CACHE_TTLS = {
+    "calorieninjas": 6 * 3600,
+    "usda": 6 * 3600,
+    "fatsecret_search": 6 * 3600,
+    "fatsecret_food": 30 * 86400,
+    "fatsecret_barcode": 30 * 86400,
+}
+FOOD_CACHE_NEGATIVE_TTL = 10 * 60  # Empty results
+
+# Shared pool for concurrent upstream lookups (bounded so a burst can't spawn unbounded threads)
+food_search_pool = ThreadPoolExecutor(
+    max_workers=int(os.getenv("FOOD_SEARCH_WORKERS", "8")),
+    thread_name_prefix="food-search",
+)
+
+# Overall deadline (seconds) for the /ai-meal multi-source fan-out
+AI_MEAL_DEADLINE = float(os.getenv("AI_MEAL_DEADLINE", "6"))
+
+# Set FOOD_CACHE_DB to a SQLite path to share the cache across gunicorn workers
+food_cache = ResponseCache.from_env(
+    "FOOD_CACHE",
+    ttls=FOOD_CACHE_TTLS,
+    negative_ttl=FOOD_CACHE_NEGATIVE_TTL,
+)
+
+# Circuit breakers: once a source keeps failing (or answering slower than
+# slow_call_seconds), skip it for the cool-down instead of paying its timeout.
+# Missing credentials are configuration, not an outage, so they never trip a breaker.
+def fatsecret_failed(result):
+    """None (transport or HTTP error) or a FatSecret error below code 100 (auth, IP, quota, server).
+
+    Higher codes (bad parameters, nothing found for a barcode) are answers, not outages.
+    """
+    if result is None:
+        return True
+    error = result.get("error") if isinstance(result, dict) else None
+    if not isinstance(error, dict):
+        return False
+    try:
+        return int(error.get("code", 0)) < 100
+    except (TypeError, ValueError):
+        return True
 
-def estimate_nutrition_with_ai(food_query):
-    """Use OpenAI to estimate nutrition for foods not found in database."""
+
+def fatsecret_configured():
+    return bool((os.getenv("FATSECRET_CONSUMER_KEY") or os.getenv("FATSECRET_CLIENT_ID"))
+                and (os.getenv("FATSECRET_CONSUMER_SECRET") or os.getenv("FATSECRET_CLIENT_SECRET")))
+
+
+def openai_configured():
+    # A swapped-in fake LLM needs no key
+    return nutrition_llm is not openai_nutrition_completion or bool(os.getenv("OPENAI_API_KEY"))
+
+
+calorieninjas_breaker = CircuitBreaker("calorieninjas", cooldown=30, slow_call_seconds=5,
+                                       configured=lambda: bool(os.getenv("CALORIENINJAS_API_KEY")))
+usda_breaker = CircuitBreaker("usda", cooldown=60, slow_call_seconds=5)
+fatsecret_breaker = CircuitBreaker("fatsecret", cooldown=30, slow_call_seconds=5,
+                                   is_failure=fatsecret_failed, configured=fatsecret_configured)
+openai_breaker = CircuitBreaker("openai", cooldown=60, configured=openai_configured)
+
+
+# AI estimates are persisted per normalized query (see nutrition_estimates.py)
+estimate_cache = EstimateCache.from_env()
+
+
+def openai_nutrition_completion(prompt):
+    """Send a nutrition prompt to OpenAI and return the raw reply text, or None."""
     api_key = os.getenv("OPENAI_API_KEY")
     
     if not api_key:
         print("OpenAI API key not configured")
         return None
     
+    response = http_client.post(
+        OPENAI_API_URL,
+        headers={
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {api_key}"
+        },
+        json={
+            "model": "gpt-3.5-turbo",
+            "messages": [
+                {"role": "system", "content": "You are a nutrition expert that returns only valid JSON."},
+                {"role": "user", "content": prompt}
+            ],
+            "temperature": 0.3,
+            "max_tokens": 500
+        },
+        timeout=15
+    )
+    
+    if response.status_code == 200:
+        result = response.json()
+        return result.get("choices", [{}])[0].get("message", {}).get("content", "")
+    
+    print(f"OpenAI API error: {response.status_code} - {response.text}")
+    return None
+
+
+# Swap for nutrition_estimates.FakeNutritionLLM() in tests / offline development
+nutrition_llm = openai_nutrition_completion
+
+
+@openai_breaker
+def request_nutrition_estimate(food_query):
+    """Ask the LLM for a nutrition estimate (uncached)."""
     prompt = f"""You are a nutrition expert. Estimate the nutritional information for: "{food_query}"
 
 Provide your best estimate based on typical recipes, portion sizes, and ingredients.
@@ -65,52 +173,32 @@ Return ONLY valid JSON in this exact format (no markdown, no extra text):
 Be realistic with calorie estimates. A typical fast food meal is 800-1200 calories. A salad is 150-400 calories."""
 
     try:
-        response = requests.post(
-            OPENAI_API_URL,
-            headers={
-                "Content-Type": "application/json",
-                "Authorization": f"Bearer {api_key}"
-            },
-            json={
-                "model": "gpt-3.5-turbo",
-                "messages": [
-                    {"role": "system", "content": "You are a nutrition expert that returns only valid JSON."},
-                    {"role": "user", "content": prompt}
-                ],
-                "temperature": 0.3,
-                "max_tokens": 500
-            },
-            timeout=15
-        )
+        text = nutrition_llm(prompt)
+        if not text:
+            return None
         
-        if response.status_code == 200:
-            result = response.json()
-            text = result.get("choices", [{}])[0].get("message", {}).get("content", "")
-            
-            # Clean up the response (remove markdown code blocks if present)
-            text = text.strip()
-            if text.startswith("```"):
-                text = text.split("```")[1]
-                if text.startswith("json"):
-                    text = text[4:]
-            text = text.strip()
-            
-            # Parse JSON
-            nutrition_data = json.loads(text)
-            
-            return [{
-                "food_name": nutrition_data.get("food_name", food_query.title()),
-                "calories": round(nutrition_data.get("calories", 0)),
-                "protein": round(float(nutrition_data.get("protein", 0)), 1),
-                "carbs": round(float(nutrition_data.get("carbs", 0)), 1),
-                "fat": round(float(nutrition_data.get("fat", 0)), 1),
-                "serving": nutrition_data.get("serving", "1 serving"),
-                "source": "ai_estimate",
-                "confidence": nutrition_data.get("confidence", "medium"),
-                "notes": nutrition_data.get("notes", "AI-estimated values")
-            }]
-        else:
-            print(f"OpenAI API error: {response.status_code} - {response.text}")
+        # Clean up the response (remove markdown code blocks if present)
+        text = text.strip()
+        if text.startswith("```"):
+            text = text.split("```")[1]
+            if text.startswith("json"):
+                text = text[4:]
+        text = text.strip()
+        
+        # Parse JSON
+        nutrition_data = json.loads(text)
+        
+        return [{
+            "food_name": nutrition_data.get("food_name", food_query.title()),
+            "calories": round(nutrition_data.get("calories", 0)),
+            "protein": round(float(nutrition_data.get("protein", 0)), 1),
+            "carbs": round(float(nutrition_data.get("carbs", 0)), 1),
+            "fat": round(float(nutrition_data.get("fat", 0)), 1),
+            "serving": nutrition_data.get("serving", "1 serving"),
+            "source": "ai_estimate",
+            "confidence": nutrition_data.get("confidence", "medium"),
+            "notes": nutrition_data.get("notes", "AI-estimated values")
+        }]
             
     except json.JSONDecodeError as e:
         print(f"OpenAI JSON parse error: {e}")
@@ -120,6 +208,17 @@ Be realistic with calorie estimates. A typical fast food meal is 800-1200 calori
     return None
 
 
+def estimate_nutrition_with_ai(food_query):
+    """Use OpenAI to estimate nutrition for foods not found in database.
+
+    Served from the persistent estimate cache when the same (or a near-duplicate)
+    query was estimated before.
+    """
+    return estimate_cache.get_or_estimate(food_query, request_nutrition_estimate)
+
+
+@food_cache.cached("calorieninjas")
+@calorieninjas_breaker
 def search_calorieninjas(query, max_results=5):
     """Search foods using CalorieNinjas API."""
     api_key = os.getenv("CALORIENINJAS_API_KEY")
@@ -129,11 +228,10 @@ def search_calorieninjas(query, max_results=5):
         return None
     
     try:
-        response = requests.get(
+        response = http_client.get(
             CALORIENINJAS_API_URL,
             params={"query": query},
-            headers={"X-Api-Key": api_key},
-            timeout=10
+            headers={"X-Api-Key": api_key}
         )
         
         if response.status_code == 200:
@@ -153,9 +251,8 @@ def search_calorieninjas(query, max_results=5):
                     "source": "calorieninjas"
                 })
             
-            if foods:
-                print(f"CalorieNinjas returned {len(foods)} results for '{query}'")
-                return foods
+            print(f"CalorieNinjas returned {len(foods)} results for '{query}'")
+            return foods
         else:
             print(f"CalorieNinjas API error: {response.status_code}")
             
@@ -165,20 +262,21 @@ def search_calorieninjas(query, max_results=5):
     return None
 
 
+@food_cache.cached("usda")
+@usda_breaker
 def search_usda_foods(query, max_results=10):
     """Search foods using USDA FoodData Central API."""
     api_key = os.getenv("USDA_API_KEY", "DEMO_KEY")
     
     try:
-        response = requests.get(
+        response = http_client.get(
             USDA_API_URL,
             params={
                 "api_key": api_key,
                 "query": query,
                 "pageSize": max_results,
                 "dataType": ["Survey (FNDDS)", "Foundation", "SR Legacy", "Branded"]
-            },
-            timeout=10
+            }
         )
         
         if response.status_code == 200:
@@ -219,6 +317,7 @@ def search_usda_foods(query, max_results=10):
 # FatSecret OAuth 1.0 Authentication (No IP Restriction)
 # ============================================
 
+@fatsecret_breaker
 def make_fatsecret_request(method, params=None):
     """Make a signed OAuth 1.0 request to FatSecret API.
     
@@ -250,7 +349,7 @@ def make_fatsecret_request(method, params=None):
         request_params.update(params)
     
     try:
-        response = requests.post(
+        response = http_client.post(
             FATSECRET_API_URL,
             data=request_params,
             auth=auth
@@ -285,7 +384,7 @@ def get_fatsecret_token():
         return None
     
     try:
-        response = requests.post(
+        response = http_client.post(
             FATSECRET_TOKEN_URL,
             data={"grant_type": "client_credentials", "scope": "basic"},
             auth=(client_id, client_secret),
@@ -309,6 +408,7 @@ def get_fatsecret_token():
 # FatSecret Premier API Functions (Using OAuth 1.0)
 # ============================================
 
+@food_cache.cached("fatsecret_search")
 def search_fatsecret_foods(query, max_results=20):
     """Search foods using FatSecret foods.search.v4 API with OAuth 1.0."""
     result = make_fatsecret_request("foods.search.v4", {
@@ -316,7 +416,7 @@ def search_fatsecret_foods(query, max_results=20):
         "max_results": max_results
     })
     
-    if result:
+    if result and "error" not in result:
         foods = result.get("foods_search", {}).get("results", {}).get("food", [])
         if isinstance(foods, dict):
             foods = [foods]
@@ -324,6 +424,7 @@ def search_fatsecret_foods(query, max_results=20):
     return None
 
 
+@food_cache.cached("fatsecret_barcode")
 def get_food_by_barcode(barcode):
     """Get food by barcode using FatSecret food.find_id_for_barcode.v2 API with OAuth 1.0.
     
@@ -365,13 +466,14 @@ def get_food_by_barcode(barcode):
 
 
 
+@food_cache.cached("fatsecret_food")
 def get_food_by_id(food_id):
     """Get detailed food info using FatSecret food.get.v4 API with OAuth 1.0."""
     result = make_fatsecret_request("food.get.v4", {
         "food_id": food_id
     })
     
-    if result:
+    if result and "error" not in result:
         return result.get("food", result)
     return None
 
@@ -470,8 +572,36 @@ FALLBACK_FOODS = [
     {"food_id": "f40", "food_name": "Protein Shake", "calories": 150, "serving": "1 scoop", "protein": 25, "carbs": 5, "fat": 2},
 ]
 
+# Indexed local food store (SQLite FTS5), seeded with FALLBACK_FOODS.
+# Import a USDA dump with `python food_db.py import <path>` to make it a primary source.
+local_foods = LocalFoodStore(seed=FALLBACK_FOODS)
+
+# In-memory autocomplete, loaded from the food store on first use and
+# updated with every result name we see; searches and logged foods rank them
+AUTOCOMPLETE_MAX_TERMS = int(os.getenv("AUTOCOMPLETE_MAX_TERMS", "100000"))
+autocomplete_index = AutocompleteIndex(
+    loader=lambda: local_foods.iter_names(AUTOCOMPLETE_MAX_TERMS),
+    max_terms=AUTOCOMPLETE_MAX_TERMS,
+)
+
+
+def learn_food_names(query, foods):
+    """Feed a successful search into the autocomplete index (the query counts if it names a food)."""
+    try:
+        for food in foods:
+            if food.get("food_name"):
+                autocomplete_index.add(food["food_name"])
+        autocomplete_index.record_query(query)
+    except Exception as e:
+        print(f"Autocomplete update error: {e}")
+
+
 def search_fallback_foods(query):
-    """Search the built-in food database."""
+    """Search the local food database, falling back to a scan of the built-in list."""
+    try:
+        return local_foods.search(query, limit=10)
+    except Exception as e:
+        print(f"Local food DB error: {e}")
     query_lower = query.lower()
     results = []
     for food in FALLBACK_FOODS:
@@ -483,15 +613,23 @@ def search_fallback_foods(query):
 @fatsecret_bp.route("/search", methods=["GET"])
 @jwt_required()
 def search_foods():
-    """Search for foods using USDA API (primary) with fallback to local database."""
+    """Search for foods using the local food DB (once imported) or USDA API, with fallback to local database."""
     query = request.args.get("q", "").strip()
     if not query:
         return jsonify({"error": "Missing search query ?q="}), 400
     
+    # Imported USDA dump answers offline without any network call
+    if local_foods.is_primary():
+        local_results = search_fallback_foods(query)
+        if local_results:
+            learn_food_names(query, local_results)
+            return jsonify({"foods": local_results, "source": "local"}), 200
+    
     # Try USDA FoodData Central API first (free, no IP restrictions)
     usda_results = search_usda_foods(query)
     if usda_results:
         print(f"USDA API returned {len(usda_results)} results for '{query}'")
+        learn_food_names(query, usda_results)
         return jsonify({"foods": usda_results, "source": "usda"}), 200
     
     # Fallback to built-in food database
@@ -542,6 +680,7 @@ def fatsecret_search():
                 "serving_id": serving.get("serving_id") if serving else None,
             })
         
+        learn_food_names(query, formatted_foods)
         return jsonify({
             "success": True,
             "foods": formatted_foods,
@@ -613,18 +752,31 @@ def barcode_lookup(barcode):
 @fatsecret_bp.route("/autocomplete", methods=["GET"])
 @jwt_required()
 def autocomplete():
-    """Get autocomplete suggestions using FatSecret Premier API."""
+    """Get autocomplete suggestions from the local index, falling back to FatSecret Premier API."""
     query = request.args.get("q", "").strip()
     if not query or len(query) < 2:
         return jsonify({"suggestions": []}), 200
     
+    # Local index first: no signed upstream round-trip per keystroke
+    suggestions = autocomplete_index.suggest(query)
+    if suggestions:
+        return jsonify({
+            "success": True,
+            "suggestions": suggestions,
+            "query": query,
+            "source": "local"
+        }), 200
+    
     suggestions = get_fatsecret_autocomplete(query)
     
     if suggestions:
+        for suggestion in suggestions:
+            autocomplete_index.add(suggestion)
         return jsonify({
             "success": True,
             "suggestions": suggestions,
-            "query": query
+            "query": query,
+            "source": "fatsecret"
         }), 200
     
     return jsonify({
@@ -670,6 +822,20 @@ def test_fatsecret():
     return jsonify(results), 200
 
 
+@fatsecret_bp.route("/cache-stats", methods=["GET"])
+@jwt_required()
+def cache_stats():
+    """Report hit/miss counters for the food lookup cache."""
+    return jsonify(food_cache.stats()), 200
+
+
+@fatsecret_bp.route("/source-health", methods=["GET"])
+@jwt_required()
+def source_health():
+    """Report circuit breaker state, error rate and latency for each food data source."""
+    return jsonify({"sources": snapshot_all()}), 200
+
+
 @fatsecret_bp.route("/nlp", methods=["POST"])
 @jwt_required()
 def nlp_search():
@@ -756,71 +922,13 @@ def get_categories():
 @jwt_required()
 def calculate_bmr():
     """Calculate BMR and daily calorie target based on user profile."""
-    user_id = get_jwt_identity()
-    
-    profile = UserProfile.query.filter_by(user_id=user_id).first()
+    identity = current_identity()
+    profile = identity.profile if identity else None
     
     if not profile:
         return jsonify({"error": "Profile not found"}), 404
     
-    # Get profile data
-    weight_kg = profile.weight_kg or 70  # Default 70kg
-    height_cm = profile.height_cm or 170  # Default 170cm
-    gender = getattr(profile, 'gender', 'male') or 'male'
-    
-    # Calculate age from date of birth
-    age = 25  # Default age
-    if profile.date_of_birth:
-        from datetime import date
-        today = date.today()
-        age = today.year - profile.date_of_birth.year
-        if (today.month, today.day) < (profile.date_of_birth.month, profile.date_of_birth.day):
-            age -= 1
-    
-    # Mifflin-St Jeor Equation (gender-aware)
-    # Men: BMR = (10 × weight) + (6.25 × height) - (5 × age) + 5
-    # Women: BMR = (10 × weight) + (6.25 × height) - (5 × age) - 161
-    bmr = (10 * weight_kg) + (6.25 * height_cm) - (5 * age)
-    if gender == 'female':
-        bmr -= 161
-    else:
-        bmr += 5
-    
-    # Use saved activity level from profile if available
-    activity = getattr(profile, 'activity_level', None) or request.args.get("activity", "moderate")
-    
-    # Activity level multipliers
-    activity_levels = {
-        "sedentary": 1.2,
-        "light": 1.375,
-        "moderate": 1.55,
-        "active": 1.725,
-        "very_active": 1.9
-    }
-    
-    multiplier = activity_levels.get(activity, 1.55)
-    tdee = int(bmr * multiplier)
-    
-    # Use saved daily calorie target if user has set a goal
-    daily_target = getattr(profile, 'daily_calorie_target', None) or tdee
-    goal_type = getattr(profile, 'goal_type', 'maintain') or 'maintain'
-    target_weight = getattr(profile, 'target_weight_kg', None)
-    goal_weeks = getattr(profile, 'goal_timeline_weeks', None)
-    
-    return jsonify({
-        "bmr": int(bmr),
-        "tdee": tdee,
-        "daily_target": daily_target,
-        "activity_level": activity,
-        "weight_kg": weight_kg,
-        "height_cm": height_cm,
-        "age": age,
-        "gender": gender,
-        "goal_type": goal_type,
-        "target_weight_kg": target_weight,
-        "goal_timeline_weeks": goal_weeks,
-        "has_goal": daily_target != tdee
-    }), 200
+    return jsonify(identity.energy(activity=request.args.get("activity"))), 200
 
 
 @fatsecret_bp.route("/set-goal", methods=["POST"])
@@ -843,10 +951,15 @@ def set_goal():
     profile.activity_level = data.get("activity_level", "moderate")
     profile.gender = data.get("gender", "male")
     profile.daily_calorie_target = data.get("daily_calorie_target")
+    # Keep the chosen preset so later refreshes don't re-infer it from the current weight,
+    # and remember whether the target is the preset one (custom targets are never refreshed)
+    profile.goal_rate_kg = chosen_rate(profile, data.get("goal_rate"))
+    profile.goal_preset = profile.daily_calorie_target is not None and profile.daily_calorie_target == goal_target(profile)
     profile.goal_set_at = datetime.utcnow()
     
     try:
         db.session.commit()
+        invalidate(user_id)
         return jsonify({
             "success": True,
             "message": "Goal saved successfully",
@@ -856,13 +969,56 @@ def set_goal():
         db.session.rollback()
         return jsonify({"success": False, "error": str(e)}), 500
 
+# Sources queried by /ai-meal, in the order their results are merged
+AI_MEAL_SOURCES = [
+    ("calorieninjas", search_calorieninjas),
+    ("usda", search_usda_foods),
+    ("fatsecret", search_fatsecret_foods),
+]
+
+
+def fan_out_meal_search(meal_query, deadline=None):
+    """Run every AI_MEAL_SOURCES lookup concurrently.
+    
+    Returns (results, timed_out): results maps source name to whatever the
+    lookup returned before the deadline; timed_out lists the sources that
+    were still running. Late lookups keep running in the pool and still
+    warm the food cache for the next request.
+    """
+    if deadline is None:
+        deadline = AI_MEAL_DEADLINE
+    
+    futures = {
+        food_search_pool.submit(lookup, meal_query, max_results=5): name
+        for name, lookup in AI_MEAL_SOURCES
+    }
+    done, _ = wait(futures, timeout=deadline)
+    
+    results = {}
+    timed_out = []
+    for future, name in futures.items():
+        if future not in done:
+            timed_out.append(name)
+            continue
+        try:
+            results[name] = future.result()
+        except Exception as e:
+            print(f"AI meal search {name} error: {e}")
+            results[name] = None
+    
+    if timed_out:
+        print(f"AI meal search for '{meal_query}' timed out on: {', '.join(timed_out)}")
+    return results, timed_out
+
+
 @fatsecret_bp.route("/ai-meal", methods=["POST"])
 @jwt_required()
 def search_ai_meal():
     """Search for meal options using multiple databases for comprehensive results.
     
-    Searches: CalorieNinjas → USDA → FatSecret → Fallback → AI
-    Combines results from all available sources for better coverage.
+    Searches: CalorieNinjas + USDA + FatSecret (in parallel) → Fallback
+    Combines results from all available sources for better coverage, in
+    that order. Sources that miss the deadline are listed in "timed_out".
     """
     data = request.get_json() or {}
     meal_query = data.get("meal_name", "").strip()
@@ -870,17 +1026,20 @@ def search_ai_meal():
     if not meal_query:
         return jsonify({"success": False, "error": "Please provide a meal name"}), 400
     
+    # Query all three sources in parallel under one overall deadline
+    results, timed_out = fan_out_meal_search(meal_query)
+    
     all_meals = []
     sources = []
     
     # Source 1: CalorieNinjas API (fast, accurate for common foods)
-    ninja_results = search_calorieninjas(meal_query, max_results=5)
+    ninja_results = results.get("calorieninjas")
     if ninja_results:
         all_meals.extend(ninja_results)
         sources.append("calorieninjas")
     
     # Source 2: USDA Database (extensive, official data)
-    usda_results = search_usda_foods(meal_query, max_results=5)
+    usda_results = results.get("usda")
     if usda_results:
         # Add source field if not present
         for r in usda_results:
@@ -889,7 +1048,7 @@ def search_ai_meal():
         sources.append("usda")
     
     # Source 3: FatSecret API (branded products, international foods)
-    fatsecret_results = search_fatsecret_foods(meal_query, max_results=5)
+    fatsecret_results = results.get("fatsecret")
     if fatsecret_results:
         for food in fatsecret_results:
             # Format FatSecret results to match expected structure
@@ -912,11 +1071,13 @@ def search_ai_meal():
     
     # If we have results from any source, return them
     if all_meals:
+        learn_food_names(meal_query, all_meals)
         return jsonify({
             "success": True,
             "meals": all_meals[:15],  # Limit total results
             "sources": sources,
-            "source": sources[0] if sources else "combined"
+            "source": sources[0] if sources else "combined",
+            "timed_out": timed_out
         }), 200
     
     # Fallback: Local database
@@ -925,13 +1086,15 @@ def search_ai_meal():
         return jsonify({
             "success": True,
             "meals": fallback,
-            "source": "fallback"
+            "source": "fallback",
+            "timed_out": timed_out
         }), 200
     
     # No results found in any database
     return jsonify({
         "success": False,
-        "error": "No meals found. Try a different search term."
+        "error": "No meals found. Try a different search term.",
+        "timed_out": timed_out
     }), 200
 
 
@@ -983,7 +1146,7 @@ def scan_image_nutrition():
     
     try:
         # Call CalorieNinjas Image Text Nutrition API
-        response = requests.post(
+        response = http_client.post(
             "https://api.calorieninjas.com/v1/imagetextnutrition",
             headers={"X-Api-Key": api_key},
             files={"image": ("image.jpg", __import__("base64").b64decode(image_data), "image/jpeg")},
@@ -1066,10 +1229,9 @@ def search_recipes():
         return jsonify({"success": False, "error": "Please provide a search term"}), 400
     
     try:
-        response = requests.get(
+        response = http_client.get(
             f"{MEALDB_API_URL}/search.php",
-            params={"s": query},
-            timeout=10
+            params={"s": query}
         )
         
         if response.status_code == 200:
@@ -1105,9 +1267,8 @@ def search_recipes():
 def get_recipe_categories():
     """Get all meal categories from TheMealDB."""
     try:
-        response = requests.get(
-            f"{MEALDB_API_URL}/categories.php",
-            timeout=10
+        response = http_client.get(
+            f"{MEALDB_API_URL}/categories.php"
         )
         
         if response.status_code == 200:
@@ -1144,10 +1305,9 @@ def get_recipes_by_category():
         return jsonify({"success": False, "error": "Please provide a category"}), 400
     
     try:
-        response = requests.get(
+        response = http_client.get(
             f"{MEALDB_API_URL}/filter.php",
-            params={"c": category},
-            timeout=10
+            params={"c": category}
         )
         
         if response.status_code == 200:
@@ -1181,10 +1341,9 @@ def get_recipe_details(meal_id):
     """Get full recipe details with calculated nutrition."""
     try:
         # Get recipe details from TheMealDB
-        response = requests.get(
+        response = http_client.get(
             f"{MEALDB_API_URL}/lookup.php",
-            params={"i": meal_id},
-            timeout=10
+            params={"i": meal_id}
         )
         
         if response.status_code != 200 or not response.json().get("meals"):
@@ -1254,7 +1413,7 @@ def calculate_recipe_nutrition():
         return jsonify({"success": False, "error": "CalorieNinjas API not configured"}), 500
     
     try:
-        response = requests.get(
+        response = http_client.get(
             CALORIENINJAS_API_URL,
             params={"query": query},
             headers={"X-Api-Key": api_key},
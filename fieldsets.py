@@ -0,0 +1,37 @@
+"""
+Sparse fieldsets (?fields=a,b,c) for the list endpoints.
+Each endpoint describes its response fields as {name: (columns, getter)}.
+Only the columns behind the requested fields are loaded (load_only), so
+large JSON/Text columns are neither read from the database nor
+serialized unless a client asks for them.
+"""
+from sqlalchemy.orm import load_only
+
+
+def parse_fields(args, spec):
+    """Return the requested field names in order, or None for all; raises ValueError."""
+    raw = args.get("fields")
+    if not raw:
+        return None
+    names = []
+    for name in raw.split(","):
+        name = name.strip()
+        if name and name not in names:
+            names.append(name)
+    unknown = [name for name in names if name not in spec]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    return names or None
+
+
+def load_only_for(spec, fields, *required):
+    """Query option loading just the columns the fields (and `required` columns) need."""
+    columns = {column.key: column for column in required}
+    for name in fields or spec:
+        for column in spec[name][0]:
+            columns.setdefault(column.key, column)
+    return load_only(*columns.values())
+
+
+def serialize(obj, spec, fields=None):
+    return {name: spec[name][1](obj) for name in (fields or spec)}
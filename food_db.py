@@ -0,0 +1,348 @@
+"""
+Local indexed food database (SQLite + FTS5).
+Holds the built-in fallback foods and, once imported, a USDA FoodData
+Central dump, so food search can be answered offline in milliseconds.
+Names get an FTS5 token/prefix index plus a trigram index for substrings,
+and /api/food/search asks it before any network call.
+
+Import a dump with:
+    python food_db.py import path/to/FoodData_Central_csv_dir
+    python food_db.py import path/to/foundation_food.json
+
+Configure with:
+- FOOD_DB_PATH: SQLite file to use (default instance/foods.db)
+"""
+import os
+import re
+import csv
+import json
+import sqlite3
+import argparse
+import threading
+from datetime import datetime
+
+FOOD_DB_PATH = os.getenv("FOOD_DB_PATH", os.path.join("instance", "foods.db"))
+
+# USDA nutrient ids (CSV dumps) and nutrient numbers (JSON dumps) we keep
+USDA_NUTRIENT_IDS = {"1008": "calories", "1003": "protein", "1005": "carbs", "1004": "fat"}
+USDA_NUTRIENT_NUMBERS = {"208": "calories", "203": "protein", "205": "carbs", "204": "fat"}
+
+# Top-level keys used by the different FoodData Central JSON downloads
+USDA_JSON_KEYS = ["FoundationFoods", "SRLegacyFoods", "SurveyFoods", "BrandedFoods"]
+
+IMPORT_BATCH_SIZE = 5000
+
+# Max index hits ranked per candidate set; keeps very common prefixes ("chick") in the low milliseconds
+SEARCH_CANDIDATES = 500
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS foods (
+    id INTEGER PRIMARY KEY,
+    food_id TEXT NOT NULL UNIQUE,
+    name TEXT NOT NULL,
+    brand TEXT DEFAULT '',
+    calories REAL DEFAULT 0,
+    protein REAL DEFAULT 0,
+    carbs REAL DEFAULT 0,
+    fat REAL DEFAULT 0,
+    serving TEXT DEFAULT '100g',
+    data_type TEXT DEFAULT ''
+);
+CREATE TABLE IF NOT EXISTS food_db_meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE VIRTUAL TABLE IF NOT EXISTS foods_fts USING fts5(
+    name, brand, content='foods', content_rowid='id',
+    tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+);
+"""
+
+# Substring matches ("berr" -> "Strawberries") need the trigram tokenizer (SQLite 3.34+)
+TRIGRAM_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS foods_trigram USING fts5(
+    name, content='foods', content_rowid='id', tokenize='trigram'
+);
+"""
+
+_TOKEN_RE = re.compile(r"[\w]+", re.UNICODE)
+
+
+def tokenize(query):
+    return _TOKEN_RE.findall(query.lower())
+
+
+class LocalFoodStore:
+    """Read-mostly SQLite food store with token/prefix (FTS5) and substring (trigram) search."""
+
+    def __init__(self, path=FOOD_DB_PATH, seed=None):
+        self.path = path
+        self.seed = seed or []
+        self.has_trigram = False
+        self._local = threading.local()
+        self._init_lock = threading.Lock()
+        self._initialized = False
+
+    # --- connection / schema ---
+    def connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            if self.path != ":memory:":
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=10, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+        if not self._initialized:
+            with self._init_lock:
+                if not self._initialized:
+                    self._init_schema(conn)
+                    self._initialized = True
+        return conn
+
+    def _init_schema(self, conn):
+        conn.executescript(SCHEMA)
+        try:
+            conn.executescript(TRIGRAM_SCHEMA)
+            self.has_trigram = True
+        except sqlite3.OperationalError as e:
+            print(f"Food DB: trigram tokenizer unavailable, substring search disabled ({e})")
+        if self.seed and not conn.execute("SELECT 1 FROM foods LIMIT 1").fetchone():
+            self.bulk_insert(
+                (
+                    (f["food_id"], f["food_name"], f.get("brand", ""), f.get("calories", 0),
+                     f.get("protein", 0), f.get("carbs", 0), f.get("fat", 0),
+                     f.get("serving", "100g"), "builtin")
+                    for f in self.seed
+                ),
+                conn=conn,
+            )
+
+    def rebuild_index(self, conn=None):
+        conn = conn or self.connect()
+        conn.execute("INSERT INTO foods_fts(foods_fts) VALUES('rebuild')")
+        if self.has_trigram:
+            conn.execute("INSERT INTO foods_trigram(foods_trigram) VALUES('rebuild')")
+        conn.commit()
+
+    # --- writes ---
+    def bulk_insert(self, rows, conn=None):
+        """Insert (food_id, name, brand, calories, protein, carbs, fat, serving, data_type) rows.
+
+        Rows are written in batches inside one transaction and the FTS
+        indexes are rebuilt once at the end, which is far faster than
+        maintaining them row by row. Returns the number of rows read.
+        """
+        conn = conn or self.connect()
+        count = 0
+        batch = []
+        with conn:
+            for row in rows:
+                batch.append(row)
+                if len(batch) >= IMPORT_BATCH_SIZE:
+                    self._write_batch(conn, batch)
+                    count += len(batch)
+                    batch = []
+            if batch:
+                self._write_batch(conn, batch)
+                count += len(batch)
+        self.rebuild_index(conn)
+        return count
+
+    def _write_batch(self, conn, batch):
+        conn.executemany(
+            "INSERT OR REPLACE INTO foods "
+            "(food_id, name, brand, calories, protein, carbs, fat, serving, data_type) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            batch,
+        )
+
+    def mark_imported(self, source):
+        conn = self.connect()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO food_db_meta (key, value) VALUES ('imported_from', ?)", (source,)
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO food_db_meta (key, value) VALUES ('imported_at', ?)",
+                (datetime.utcnow().isoformat(),),
+            )
+
+    # --- reads ---
+    def is_primary(self):
+        """True once a USDA dump has been imported, making the store a full primary source."""
+        try:
+            row = self.connect().execute(
+                "SELECT value FROM food_db_meta WHERE key = 'imported_at'"
+            ).fetchone()
+        except sqlite3.Error:
+            return False
+        return row is not None
+
+    def iter_names(self, limit=None):
+        """Yield food names, shortest (most generic) first."""
+        sql = "SELECT name FROM foods ORDER BY length(name)"
+        params = ()
+        if limit:
+            sql += " LIMIT ?"
+            params = (limit,)
+        for row in self.connect().execute(sql, params):
+            yield row["name"]
+
+    def count(self):
+        return self.connect().execute("SELECT COUNT(*) FROM foods").fetchone()[0]
+
+    def search(self, query, limit=10):
+        """Ranked search: token/prefix matches first, then substring matches."""
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+
+        conn = self.connect()
+        normalized = " ".join(tokens)
+        # Every token must match as a word prefix: "chick bre" -> "Chicken Breast"
+        match = " ".join(f'"{t}"*' for t in tokens)
+        # Same, with the name starting with the first token (^ anchors to the column's first word)
+        anchored = f'name : ^"{tokens[0]}"* ' + " ".join(f'"{t}"*' for t in tokens[1:])
+        # Rank two bounded candidate sets so very common prefixes stay fast: the best-ranked names
+        # that start with the query, then any other matches in index order
+        rows = conn.execute(
+            "SELECT foods.* FROM ("
+            "  SELECT rowid, min(score) AS score FROM ("
+            "    SELECT * FROM (SELECT rowid, rank AS score FROM foods_fts WHERE foods_fts MATCH ?"
+            "                   ORDER BY rank LIMIT ?)"
+            "    UNION ALL"
+            "    SELECT * FROM (SELECT rowid, bm25(foods_fts) AS score FROM foods_fts WHERE foods_fts MATCH ? LIMIT ?)"
+            "  ) GROUP BY rowid"
+            ") AS hits JOIN foods ON foods.id = hits.rowid "
+            "ORDER BY (lower(foods.name) LIKE ? || '%') DESC, hits.score, length(foods.name) "
+            "LIMIT ?",
+            (anchored, SEARCH_CANDIDATES, match, SEARCH_CANDIDATES, normalized, limit),
+        ).fetchall()
+
+        if len(rows) < limit and len(normalized) >= 3:
+            seen = [r["id"] for r in rows]
+            exclude = f"AND foods.id NOT IN ({','.join('?' * len(seen))}) " if seen else ""
+            if self.has_trigram:
+                extra = conn.execute(
+                    "SELECT foods.* FROM ("
+                    "  SELECT rowid FROM foods_trigram WHERE foods_trigram MATCH ? LIMIT ?"
+                    f") AS hits JOIN foods ON foods.id = hits.rowid WHERE 1 {exclude}"
+                    "ORDER BY length(foods.name) LIMIT ?",
+                    ['"' + normalized.replace('"', '""') + '"', SEARCH_CANDIDATES, *seen, limit - len(rows)],
+                ).fetchall()
+            else:
+                extra = conn.execute(
+                    f"SELECT * FROM foods WHERE lower(name) LIKE ? {exclude}"
+                    "ORDER BY length(name) LIMIT ?",
+                    [f"%{normalized}%", *seen, limit - len(rows)],
+                ).fetchall()
+            rows = list(rows) + list(extra)
+
+        return [self._to_food(r) for r in rows]
+
+    def _to_food(self, row):
+        food_id = row["food_id"]
+        return {
+            "food_id": int(food_id) if food_id.isdigit() else food_id,
+            "food_name": row["name"],
+            "brand": row["brand"] or "",
+            "calories": round(row["calories"] or 0),
+            "protein": round(row["protein"] or 0, 1),
+            "carbs": round(row["carbs"] or 0, 1),
+            "fat": round(row["fat"] or 0, 1),
+            "serving": row["serving"] or "100g",
+        }
+
+
+# ---------------------------------------------------------
+# USDA FoodData Central importers
+# ---------------------------------------------------------
+def iter_usda_csv(directory):
+    """Yield food rows from an extracted FoodData Central CSV download.
+
+    Reads food.csv and food_nutrient.csv (streamed, so the full branded
+    dump fits in memory as four floats per food) plus branded_food.csv
+    for brand/serving when present.
+    """
+    nutrients = {}
+    with open(os.path.join(directory, "food_nutrient.csv"), newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            field = USDA_NUTRIENT_IDS.get(row.get("nutrient_id"))
+            if field:
+                try:
+                    nutrients.setdefault(row["fdc_id"], {})[field] = float(row.get("amount") or 0)
+                except ValueError:
+                    continue
+
+    branded = {}
+    branded_path = os.path.join(directory, "branded_food.csv")
+    if os.path.exists(branded_path):
+        with open(branded_path, newline="", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                serving = "100g"
+                if row.get("serving_size"):
+                    serving = f"{row['serving_size']}{row.get('serving_size_unit', '')}"
+                branded[row["fdc_id"]] = (row.get("brand_owner", ""), serving)
+
+    with open(os.path.join(directory, "food.csv"), newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            fdc_id = row["fdc_id"]
+            values = nutrients.get(fdc_id)
+            if not values:
+                continue
+            brand, serving = branded.get(fdc_id, ("", "100g"))
+            yield (
+                fdc_id, row.get("description", "Unknown"), brand,
+                values.get("calories", 0), values.get("protein", 0),
+                values.get("carbs", 0), values.get("fat", 0),
+                serving, row.get("data_type", ""),
+            )
+
+
+def iter_usda_json(path):
+    """Yield food rows from a FoodData Central JSON download (Foundation, SR Legacy, Survey, Branded)."""
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+
+    for key in USDA_JSON_KEYS:
+        for food in data.get(key, []):
+            values = {}
+            for n in food.get("foodNutrients", []):
+                nutrient = n.get("nutrient", {})
+                field = USDA_NUTRIENT_NUMBERS.get(str(nutrient.get("number", "")))
+                if field and n.get("amount") is not None:
+                    values[field] = float(n["amount"])
+            if not values:
+                continue
+            serving = "100g"
+            if food.get("servingSize"):
+                serving = f"{food['servingSize']}{food.get('servingSizeUnit', '')}"
+            yield (
+                str(food.get("fdcId")), food.get("description", "Unknown"),
+                food.get("brandOwner", ""),
+                values.get("calories", 0), values.get("protein", 0),
+                values.get("carbs", 0), values.get("fat", 0),
+                serving, food.get("dataType", key),
+            )
+
+
+def import_usda(store, path):
+    """Import a CSV directory or JSON file into the store; returns the row count."""
+    rows = iter_usda_csv(path) if os.path.isdir(path) else iter_usda_json(path)
+    count = store.bulk_insert(rows)
+    store.mark_imported(os.path.basename(os.path.normpath(path)))
+    return count
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage the local food database.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    import_cmd = sub.add_parser("import", help="Import a USDA FoodData Central CSV directory or JSON file")
+    import_cmd.add_argument("path")
+    sub.add_parser("count", help="Print the number of foods in the store")
+    args = parser.parse_args()
+
+    store = LocalFoodStore()
+    if args.command == "import":
+        started = datetime.utcnow()
+        imported = import_usda(store, args.path)
+        print(f"Imported {imported} foods into {store.path} in {(datetime.utcnow() - started).total_seconds():.1f}s")
+    else:
+        print(f"{store.count()} foods in {store.path}")
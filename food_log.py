@@ -0,0 +1,259 @@
+"""
+Server-side food log.
+Entries are stored per user and calendar day (the client's local date).
+daily_nutrition keeps each day's totals up to date in the same transaction
+as every insert/delete, so summaries and the calorie tracker read one row
+per day instead of re-summing entries.
+"""
+from datetime import date, timedelta
+
+from flask import jsonify, request, Blueprint
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from sqlalchemy.exc import IntegrityError
+
+from models import db, FoodLogEntry, DailyNutrition
+
+# Blueprint setup
+food_log_bp = Blueprint("food_log", __name__, url_prefix="/food-log")
+
+MACROS = ("calories", "protein", "carbs", "fat")
+MAX_BULK_ENTRIES = 200
+MAX_SUMMARY_DAYS = 366
+
+
+def parse_day(value, default=None):
+    """YYYY-MM-DD -> date; raises ValueError."""
+    if not value:
+        if default is None:
+            raise ValueError("day is required")
+        return default
+    try:
+        return date.fromisoformat(str(value)[:10])
+    except ValueError:
+        raise ValueError(f"Invalid date: {value}")
+
+
+def _amount(value):
+    try:
+        return round(max(float(value or 0), 0.0), 1)
+    except (TypeError, ValueError):
+        raise ValueError("Macros must be numbers")
+
+
+def build_entry(user_id, item, default_day):
+    if not isinstance(item, dict):
+        raise ValueError("Each entry must be an object")
+    name = str(item.get("name") or item.get("food_name") or "").strip()
+    if not name:
+        raise ValueError("Each entry needs a name")
+    return FoodLogEntry(
+        user_id=user_id,
+        day=parse_day(item.get("day"), default_day),
+        name=name[:255],
+        serving=str(item.get("serving") or "")[:50] or None,
+        **{macro: _amount(item.get(macro)) for macro in MACROS},
+    )
+
+
+def entry_to_dict(entry):
+    return {
+        "id": entry.id,
+        "day": entry.day.isoformat(),
+        "name": entry.name,
+        "serving": entry.serving,
+        **{macro: getattr(entry, macro) for macro in MACROS},
+    }
+
+
+def totals_to_dict(row):
+    result = {"entries": row.entries if row else 0}
+    result.update({macro: round(getattr(row, macro), 1) if row else 0 for macro in MACROS})
+    return result
+
+
+# ---------------------------------------------------------
+# DAILY AGGREGATES
+# ---------------------------------------------------------
+def _bump_day(user_id, day, deltas):
+    """Add deltas to a user's daily_nutrition row with one UPDATE, inserting it if missing."""
+    key = {"user_id": user_id, "day": day}
+    values = {getattr(DailyNutrition, name): getattr(DailyNutrition, name) + delta for name, delta in deltas.items()}
+    if DailyNutrition.query.filter_by(**key).update(values, synchronize_session=False):
+        return
+    try:
+        with db.session.begin_nested():
+            db.session.add(DailyNutrition(**key, **deltas))
+    except IntegrityError:
+        # A concurrent request created the row first
+        DailyNutrition.query.filter_by(**key).update(values, synchronize_session=False)
+
+
+def apply_entries(user_id, entries, sign=1):
+    """Fold entries into the daily aggregates, one UPDATE per distinct day."""
+    per_day = {}
+    for entry in entries:
+        deltas = per_day.setdefault(entry.day, dict.fromkeys(("entries",) + MACROS, 0))
+        deltas["entries"] += sign
+        for macro in MACROS:
+            deltas[macro] += sign * (getattr(entry, macro) or 0)
+    for day, deltas in per_day.items():
+        _bump_day(user_id, day, deltas)
+
+
+# ---------------------------------------------------------
+# GET Day
+# ---------------------------------------------------------
+@food_log_bp.route("", methods=["GET"])
+@jwt_required()
+def get_food_log():
+    """Entries and totals for one day (?day=YYYY-MM-DD, default today)."""
+    user_id = int(get_jwt_identity())
+    try:
+        day = parse_day(request.args.get("day"), date.today())
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    entries = (
+        FoodLogEntry.query.filter_by(user_id=user_id, day=day)
+        .order_by(FoodLogEntry.id)
+        .all()
+    )
+    totals = DailyNutrition.query.filter_by(user_id=user_id, day=day).first()
+    return jsonify({
+        "day": day.isoformat(),
+        "entries": [entry_to_dict(e) for e in entries],
+        "totals": totals_to_dict(totals),
+    }), 200
+
+
+# ---------------------------------------------------------
+# ADD Entries (single or bulk)
+# ---------------------------------------------------------
+@food_log_bp.route("", methods=["POST"])
+@jwt_required()
+def add_food_log_entries():
+    """Log one food, or many with {"entries": [...]} in a single transaction."""
+    user_id = int(get_jwt_identity())
+    data = request.get_json() or {}
+    items = data.get("entries") if isinstance(data.get("entries"), list) else [data]
+    if not items:
+        return jsonify({"error": "No entries"}), 400
+    if len(items) > MAX_BULK_ENTRIES:
+        return jsonify({"error": f"At most {MAX_BULK_ENTRIES} entries per request"}), 400
+
+    try:
+        default_day = parse_day(data.get("day"), date.today())
+        entries = [build_entry(user_id, item, default_day) for item in items]
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    # One multi-row INSERT, then one aggregate UPDATE per day touched
+    db.session.add_all(entries)
+    db.session.flush()
+    apply_entries(user_id, entries)
+    db.session.commit()
+    rank_logged_foods(entries)
+
+    return jsonify({"entries": [entry_to_dict(e) for e in entries]}), 201
+
+
+def rank_logged_foods(entries):
+    """Count logged foods as selections in the autocomplete index (known names only)."""
+    # Imported here: fatsecret owns the index and is a much larger module
+    from fatsecret import autocomplete_index
+    try:
+        for entry in entries:
+            autocomplete_index.record_query(entry.name)
+    except Exception as e:
+        print(f"Autocomplete update error: {e}")
+
+
+# ---------------------------------------------------------
+# DELETE Entry / Day
+# ---------------------------------------------------------
+@food_log_bp.route("/<int:entry_id>", methods=["DELETE"])
+@jwt_required()
+def delete_food_log_entry(entry_id):
+    user_id = int(get_jwt_identity())
+    entry = FoodLogEntry.query.filter_by(id=entry_id, user_id=user_id).first()
+    if not entry:
+        return jsonify({"error": "Entry not found"}), 404
+
+    apply_entries(user_id, [entry], sign=-1)
+    db.session.delete(entry)
+    db.session.commit()
+    return jsonify({"message": "Entry deleted"}), 200
+
+
+@food_log_bp.route("", methods=["DELETE"])
+@jwt_required()
+def clear_food_log_day():
+    """Delete every entry for ?day= (default today)."""
+    user_id = int(get_jwt_identity())
+    try:
+        day = parse_day(request.args.get("day"), date.today())
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    deleted = FoodLogEntry.query.filter_by(user_id=user_id, day=day).delete(synchronize_session=False)
+    DailyNutrition.query.filter_by(user_id=user_id, day=day).delete(synchronize_session=False)
+    db.session.commit()
+    return jsonify({"message": "Food log cleared", "deleted": deleted}), 200
+
+
+# ---------------------------------------------------------
+# SUMMARY
+# ---------------------------------------------------------
+def summarize(user_id, start, end, period="day"):
+    """Daily or weekly (Monday start) totals between start and end, from daily_nutrition."""
+    rows = (
+        DailyNutrition.query
+        .filter(DailyNutrition.user_id == user_id, DailyNutrition.day.between(start, end))
+        .filter(DailyNutrition.entries > 0)
+        .order_by(DailyNutrition.day)
+        .all()
+    )
+    buckets = {}
+    for row in rows:
+        bucket_day = row.day - timedelta(days=row.day.weekday()) if period == "week" else row.day
+        bucket = buckets.setdefault(bucket_day, dict.fromkeys(("entries",) + MACROS, 0))
+        bucket["entries"] += row.entries
+        for macro in MACROS:
+            bucket[macro] += getattr(row, macro)
+
+    totals = dict.fromkeys(("entries",) + MACROS, 0)
+    for bucket in buckets.values():
+        for name in totals:
+            totals[name] += bucket[name]
+    logged_days = len(rows)
+
+    def rounded(values):
+        return {name: round(value, 1) if name in MACROS else value for name, value in values.items()}
+
+    return {
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "period": period,
+        period + "s": [{period: day.isoformat(), **rounded(values)} for day, values in sorted(buckets.items())],
+        "totals": rounded(totals),
+        "daily_average": {macro: round(totals[macro] / logged_days, 1) if logged_days else 0 for macro in MACROS},
+    }
+
+
+@food_log_bp.route("/summary", methods=["GET"])
+@jwt_required()
+def get_food_log_summary():
+    """Macro totals per day or week: ?start=&end= (default the last 7 days), ?period=day|week."""
+    user_id = int(get_jwt_identity())
+    period = request.args.get("period", "day")
+    if period not in ("day", "week"):
+        return jsonify({"error": "period must be day or week"}), 400
+    try:
+        end = parse_day(request.args.get("end"), date.today())
+        start = parse_day(request.args.get("start"), end - timedelta(days=6))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if start > end or (end - start).days >= MAX_SUMMARY_DAYS:
+        return jsonify({"error": f"Range must be 1-{MAX_SUMMARY_DAYS} days"}), 400
+
+    return jsonify(summarize(user_id, start, end, period)), 200
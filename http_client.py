@@ -0,0 +1,84 @@
+"""
+Shared outbound HTTP client for every external API call.
+One pooled requests.Session keeps TCP/TLS connections alive per host,
+every call gets a (connect, read) timeout, and idempotent requests are
+retried with bounded exponential backoff. Configure with:
+- HTTP_POOL_SIZE: connections kept alive per host (default 16)
+- HTTP_MAX_RETRIES: retries for GET/HEAD on connection errors and 5xx (default 2)
+"""
+import os
+import threading
+from urllib.parse import urlsplit
+
+# (connect, read) timeouts in seconds
+DEFAULT_TIMEOUT = (3.05, 10)
+
+# Per-host overrides; callers can still pass timeout= for a single endpoint
+HOST_TIMEOUTS = {
+    "api.openai.com": (3.05, 30),
+    "oauth.fatsecret.com": (3.05, 8),
+    "platform.fatsecret.com": (3.05, 8),
+    "static.exercisedb.dev": (3.05, 20),  # exercise GIFs (exercise_media.py)
+    "www.exercisedb.dev": (3.05, 8),
+}
+
+POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "16"))
+MAX_RETRIES = int(os.getenv("HTTP_MAX_RETRIES", "2"))
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def build_session():
+    """Create a Session whose adapters pool connections and retry idempotent calls."""
+    # requests is imported here, on the first outbound call, to keep it out of app startup
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+
+    retry = Retry(
+        total=MAX_RETRIES,
+        connect=MAX_RETRIES,
+        read=MAX_RETRIES,
+        backoff_factor=0.3,
+        backoff_max=2,
+        status_forcelist=(502, 503, 504),
+        allowed_methods=frozenset({"GET", "HEAD", "OPTIONS"}),
+        raise_on_status=False,
+        respect_retry_after_header=False,
+    )
+    adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE, max_retries=retry)
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def get_session():
+    """Return the process-wide session, creating it on first use."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = build_session()
+    return _session
+
+
+def timeout_for(url):
+    """Return the (connect, read) timeout configured for the URL's host."""
+    return HOST_TIMEOUTS.get(urlsplit(url).hostname, DEFAULT_TIMEOUT)
+
+
+def request(method, url, **kwargs):
+    """Send a request through the shared session with a timeout always applied."""
+    if kwargs.get("timeout") is None:
+        kwargs["timeout"] = timeout_for(url)
+    return get_session().request(method, url, **kwargs)
+
+
+def get(url, **kwargs):
+    return request("GET", url, **kwargs)
+
+
+def post(url, **kwargs):
+    return request("POST", url, **kwargs)
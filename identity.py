@@ -0,0 +1,128 @@
+"""
+Current-user resolution for authenticated requests.
+current_identity() turns the JWT identity into a read-only snapshot of the
+User row and its UserProfile, loaded with one joined query. The snapshot is
+kept on flask.g for the rest of the request and in a per-worker LRU for
+IDENTITY_CACHE_TTL seconds. A worker reuses a cached snapshot only after a
+one-row primary key lookup confirms that the profile's updated_at stamp is
+unchanged, so writes made by any worker or by `python energy.py refresh`
+are seen on the next request. Code that changes a user's profile calls
+invalidate(user_id) after committing to drop the local copy right away.
+Configure with:
+- IDENTITY_CACHE_TTL: seconds a snapshot is reused by a worker (default 30, 0 disables)
+- IDENTITY_CACHE_SIZE: max users kept per worker (default 4096)
+"""
+import os
+from datetime import date
+from types import SimpleNamespace
+
+from flask import g
+from flask_jwt_extended import get_jwt_identity
+from sqlalchemy.orm import load_only
+
+from cache import LRUCache
+from energy import profile_energy
+from models import db, User, UserProfile
+
+IDENTITY_CACHE_TTL = float(os.getenv("IDENTITY_CACHE_TTL", "30"))
+
+identity_cache = LRUCache(int(os.getenv("IDENTITY_CACHE_SIZE", "4096")))
+
+PROFILE_COLUMNS = [column.key for column in UserProfile.__table__.columns]
+
+
+class Identity:
+    """Snapshot of a user (id, username) and their profile columns (None if no profile yet).
+
+    Shared between requests: read it, never mutate it. Load the ORM rows to write.
+    """
+
+    __slots__ = ("id", "username", "profile", "stamp", "_energy")
+
+    def __init__(self, user, profile):
+        self.id = user.id
+        self.username = user.username
+        self.profile = SimpleNamespace(**{name: getattr(profile, name) for name in PROFILE_COLUMNS}) if profile else None
+        self.stamp = (profile.id, profile.updated_at) if profile else (None, None)
+        self._energy = None
+
+    def energy(self, activity=None, today=None):
+        """energy.profile_energy for this profile (must exist), memoized on the snapshot.
+
+        Profile writes invalidate the snapshot and with it the memo; the date is
+        part of the key because age depends on it.
+        """
+        key = (activity, today or date.today())
+        if self._energy is None or self._energy[0] != key:
+            self._energy = (key, profile_energy(self.profile, activity, key[1]))
+        return dict(self._energy[1])
+
+
+def load_identity(user_id):
+    """User + UserProfile in one LEFT JOIN query; None if the user no longer exists."""
+    row = (
+        db.session.query(User, UserProfile)
+        .outerjoin(UserProfile, UserProfile.user_id == User.id)
+        .options(load_only(User.id, User.username))
+        .filter(User.id == user_id)
+        .first()
+    )
+    return Identity(*row) if row else None
+
+
+def load_stamp(user_id):
+    """(profile id, profile updated_at) for a user; None if the user no longer exists.
+
+    Every profile write bumps updated_at (column onupdate), including the
+    bulk UPDATE in energy.refresh_targets, so a matching stamp means the
+    cached snapshot is current.
+    """
+    row = (
+        db.session.query(UserProfile.id, UserProfile.updated_at)
+        .select_from(User)
+        .outerjoin(UserProfile, UserProfile.user_id == User.id)
+        .filter(User.id == user_id)
+        .first()
+    )
+    return tuple(row) if row else None
+
+
+def get_identity(user_id):
+    """Snapshot for a user id, from the request, the worker cache or the database."""
+    user_id = int(user_id)
+    cached = g.get("identity")
+    if cached is not None and cached.id == user_id:
+        return cached
+
+    identity = identity_cache.get(user_id) if IDENTITY_CACHE_TTL > 0 else None
+    if identity is not None and load_stamp(user_id) != identity.stamp:
+        # Changed by another worker (or deleted) since this worker cached it
+        identity_cache.delete(user_id)
+        identity = None
+    if identity is None:
+        identity = load_identity(user_id)
+        if identity is not None and IDENTITY_CACHE_TTL > 0:
+            identity_cache.set(user_id, identity, IDENTITY_CACHE_TTL)
+    if identity is not None:
+        g.identity = identity
+    return identity
+
+
+def current_identity():
+    """Snapshot for the request's JWT identity (call inside @jwt_required); None if the user is gone."""
+    user_id = get_jwt_identity()
+    if user_id is None:
+        return None
+    return get_identity(user_id)
+
+
+def invalidate(user_id):
+    """Forget this worker's snapshot after the user or profile row changed (call after commit).
+
+    Other workers notice the change through the profile's updated_at stamp.
+    """
+    user_id = int(user_id)
+    identity_cache.delete(user_id)
+    cached = g.get("identity")
+    if cached is not None and cached.id == user_id:
+        g.pop("identity")
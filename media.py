@@ -0,0 +1,116 @@
+from flask import Blueprint, jsonify, redirect, request, send_file
+from flask_jwt_extended import verify_jwt_in_request, get_jwt_identity
+from models import db, MediaBlob, SavedWorkoutHistory
+from blob_store import blob_store, verify_media_signature
+from migrate_blobs import restore_blob
+from identity import get_identity
+import exercise_media
+
+# Blueprint setup
+media_bp = Blueprint("media", __name__, url_prefix="/media")
+
+# Blobs are immutable (the URL is the content hash), so browsers may keep them forever
+MEDIA_CACHE_CONTROL = "private, max-age=31536000, immutable"
+
+
+def user_references(user_id, digest):
+    """True if the user owns a profile image or history photo with this hash."""
+    identity = get_identity(user_id)
+    if identity and identity.profile and identity.profile.image_blob == digest:
+        return True
+    return SavedWorkoutHistory.query.filter_by(user_id=user_id, photo_blob=digest).first() is not None
+
+
+def authorized(digest):
+    """Accept a signed URL issued by the API, or a JWT for a user who owns the blob."""
+    args = request.args
+    if "s" in args and verify_media_signature(digest, args.get("u"), args.get("e"), args.get("s")):
+        return True
+    try:
+        verify_jwt_in_request(optional=True)
+    except Exception:
+        return False
+    user_id = get_jwt_identity()
+    return bool(user_id) and user_references(user_id, digest)
+
+
+def serve_file(digest, content_type, cache_control=MEDIA_CACHE_CONTROL):
+    path = blob_store.path(digest)
+    # conditional=True answers If-None-Match with 304 and Range with 206
+    response = send_file(
+        path,
+        mimetype=content_type,
+        conditional=True,
+        etag=digest,
+        max_age=31536000,
+    )
+    response.headers["Cache-Control"] = cache_control
+    return response
+
+
+def serve_blob(blob):
+    return serve_file(blob.sha256, blob.content_type)
+
+
+# ---------------------------------------------------------
+# GET Image / Thumbnail
+# ---------------------------------------------------------
+@media_bp.route("/<digest>", methods=["GET"])
+def get_media(digest):
+    """Stream a stored image."""
+    if not authorized(digest):
+        return jsonify({"error": "Not authorized"}), 403
+    blob = db.session.get(MediaBlob, digest)
+    if not blob or not (blob_store.exists(digest) or restore_blob(digest)):
+        return jsonify({"error": "Not found"}), 404
+    return serve_blob(blob)
+
+
+@media_bp.route("/<digest>/thumbnail", methods=["GET"])
+def get_thumbnail(digest):
+    """Stream an image's thumbnail (the image itself if it has none)."""
+    if not authorized(digest):
+        return jsonify({"error": "Not authorized"}), 403
+    blob = db.session.get(MediaBlob, digest)
+    if not blob:
+        return jsonify({"error": "Not found"}), 404
+    if blob.thumbnail_sha256 and blob_store.exists(blob.thumbnail_sha256):
+        blob = db.session.get(MediaBlob, blob.thumbnail_sha256) or blob
+    if not (blob_store.exists(blob.sha256) or restore_blob(blob.sha256)):
+        return jsonify({"error": "Not found"}), 404
+    return serve_blob(blob)
+
+
+# ---------------------------------------------------------
+# GET Exercise GIF (caching proxy)
+# ---------------------------------------------------------
+@media_bp.route("/exercise", methods=["GET"])
+def get_exercise_media():
+    """Stream an exercise GIF (?src=upstream gifUrl) from the local cache; ?variant=poster for its first frame.
+
+    Public: the file is the same for every user. Browsers that accept WebP get the
+    animated WebP copy once it has been made. Sources outside the catalogue are
+    redirected upstream rather than fetched.
+    """
+    src = request.args.get("src", "")
+    try:
+        media = exercise_media.get_media(src)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except LookupError:
+        # Not in the catalogue (e.g. live search results before the first sync): let the browser fetch it
+        return redirect(src)
+    except RuntimeError as e:
+        print(f"Exercise media error: {e}")
+        return jsonify({"error": "Exercise media is unavailable"}), 502
+
+    digest, content_type = exercise_media.variant(
+        media,
+        poster=request.args.get("variant") == "poster",
+        webp="image/webp" in request.headers.get("Accept", ""),
+    )
+    if not blob_store.exists(digest):
+        return jsonify({"error": "Not found"}), 404
+    response = serve_file(digest, content_type, exercise_media.EXERCISE_MEDIA_CACHE_CONTROL)
+    response.vary.add("Accept")
+    return response
@@ -0,0 +1,117 @@
+"""
+One-time migration: move Base64 images out of the database into the blob store.
+Copies SavedWorkoutHistory.progress_photo and UserProfile.profile_image_url
+data: URLs into blob_store.py and sets photo_blob / image_blob. The Base64
+copy stays in the row until a run with --clear, which only clears rows
+whose file is present and still matches its hash, and refuses to run
+unless BLOB_STORE_DIR is set (the default directory does not survive a
+Render deploy). While the copy is kept, /media restores a missing file
+from it. Rows are processed in id order in small batches, so it can be
+interrupted and re-run. `gc` deletes blobs no row references any more.
+Run with: python migrate_blobs.py [migrate [--clear]|gc]
+"""
+import sys
+
+from sqlalchemy.orm import load_only
+
+from models import db, SavedWorkoutHistory, UserProfile, MediaBlob, ExerciseMedia
+from blob_store import blob_store, store_data_url, parse_data_url, BLOB_STORE_CONFIGURED
+
+BATCH_SIZE = 100
+
+# (model, Base64 column, blob hash column)
+IMAGE_COLUMNS = [
+    (SavedWorkoutHistory, SavedWorkoutHistory.progress_photo, SavedWorkoutHistory.photo_blob),
+    (UserProfile, UserProfile.profile_image_url, UserProfile.image_blob),
+]
+
+
+def _move(model, data_column, blob_column, clear=False):
+    moved = cleared = failed = 0
+    last_id = 0
+    while True:
+        rows = (
+            model.query.options(load_only(model.id, data_column, blob_column))
+            .filter(model.id > last_id, data_column.like("data:%"))
+            .order_by(model.id)
+            .limit(BATCH_SIZE)
+            .all()
+        )
+        if not rows:
+            break
+        for row in rows:
+            last_id = row.id
+            try:
+                digest = store_data_url(getattr(row, data_column.key))
+            except ValueError as e:
+                print(f"Skipped {model.__tablename__} {row.id}: {e}")
+                failed += 1
+                continue
+            if not digest:
+                continue
+            if getattr(row, blob_column.key) != digest:
+                setattr(row, blob_column.key, digest)
+                moved += 1
+            if clear and blob_store.verify(digest):
+                setattr(row, data_column.key, None)
+                cleared += 1
+        db.session.commit()
+        db.session.expunge_all()
+    print(f"{model.__tablename__}: moved {moved} images, cleared {cleared} Base64 copies, skipped {failed}")
+    return moved
+
+
+def migrate(clear=False):
+    """Copy Base64 images into the blob store; with clear=True also drop the verified database copies."""
+    if clear and not BLOB_STORE_CONFIGURED:
+        raise RuntimeError("Set BLOB_STORE_DIR to a persistent disk before clearing the database copies")
+    return sum(_move(model, data_column, blob_column, clear) for model, data_column, blob_column in IMAGE_COLUMNS)
+
+
+def restore_blob(digest):
+    """Rewrite a missing blob file from a row that still keeps its Base64 copy; True if restored."""
+    for model, data_column, blob_column in IMAGE_COLUMNS:
+        value = (
+            db.session.query(data_column)
+            .filter(blob_column == digest, data_column.like("data:%"))
+            .limit(1)
+            .scalar()
+        )
+        parsed = parse_data_url(value)
+        if parsed and blob_store.put(parsed[0]) == digest:
+            print(f"Restored blob {digest} from {model.__tablename__}")
+            return True
+    return False
+
+
+def collect_garbage():
+    """Delete blobs (and their thumbnails) that no history row, profile or cached exercise GIF points at."""
+    referenced = {digest for (digest,) in db.session.query(SavedWorkoutHistory.photo_blob).distinct()}
+    referenced |= {digest for (digest,) in db.session.query(UserProfile.image_blob).distinct()}
+    for column in (ExerciseMedia.gif_sha256, ExerciseMedia.webp_sha256, ExerciseMedia.poster_sha256):
+        referenced |= {digest for (digest,) in db.session.query(column).distinct()}
+    thumbnails = {
+        digest for (digest,) in db.session.query(MediaBlob.thumbnail_sha256)
+        .filter(MediaBlob.sha256.in_(referenced - {None}))
+    }
+    keep = referenced | thumbnails
+    removed = 0
+    for blob in MediaBlob.query.all():
+        if blob.sha256 not in keep:
+            blob_store.delete(blob.sha256)
+            db.session.delete(blob)
+            removed += 1
+    db.session.commit()
+    print(f"Removed {removed} unreferenced blobs")
+    return removed
+
+
+if __name__ == "__main__":
+    from app import app
+
+    command = sys.argv[1] if len(sys.argv) > 1 else "migrate"
+    with app.app_context():
+        if command == "gc":
+            collect_garbage()
+        else:
+            migrate(clear="--clear" in sys.argv[2:])
@@ -0,0 +1,247 @@
+"""
+Versioned schema migrations.
+Each migration is a numbered function that brings an existing database
+forward; applied versions are recorded in the schema_version table. Tables
+for new models are created by create_all() before migrations run, and a
+brand-new database is created from models.py and stamped at the latest
+version without running any of them.
+At boot app.py only runs one query (SELECT MAX(version)), instead of
+inspecting tables and issuing ~10 failing ALTERs per worker, and applies
+pending migrations if the database is behind (set MIGRATE_ON_BOOT=0 to
+only warn, e.g. when migrations run as a separate deploy step).
+Run with: python migrations.py [upgrade|status]
+"""
+import os
+import sys
+from datetime import datetime
+
+from sqlalchemy import inspect, text
+from sqlalchemy.exc import SQLAlchemyError
+
+from models import db, SchemaVersion, CatalogExercise, ExerciseMedia
+
+MIGRATE_ON_BOOT = os.getenv("MIGRATE_ON_BOOT", "1") != "0"
+
+# Serializes concurrent upgrades (several gunicorn workers booting) on PostgreSQL
+PG_LOCK_ID = 7201904
+
+
+# ---------------------------------------------------------
+# HELPERS
+# ---------------------------------------------------------
+def add_columns(conn, table, columns):
+    """ALTER TABLE ... ADD COLUMN for each (name, ddl) the table does not have yet."""
+    inspector = inspect(conn)
+    if table not in inspector.get_table_names():
+        return
+    existing = {column["name"] for column in inspector.get_columns(table)}
+    for name, ddl in columns:
+        if name not in existing:
+            conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {name} {ddl}"))
+            print(f"Migrated: added {name} to {table}")
+
+
+def index_names(conn, inspector, table):
+    if conn.dialect.name == "sqlite":
+        # SQLite reflection leaves out expression indexes such as lower(email)
+        rows = conn.execute(text("SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = :t"), {"t": table})
+        return {name for (name,) in rows}
+    return {ix["name"] for ix in inspector.get_indexes(table)}
+
+
+def ensure_indexes(conn):
+    """Create any index declared in models.py that the database is missing."""
+    inspector = inspect(conn)
+    tables = set(inspector.get_table_names())
+    created = []
+    for table in db.metadata.sorted_tables:
+        if table.name not in tables:
+            continue
+        existing = index_names(conn, inspector, table.name)
+        for index in table.indexes:
+            if index.name not in existing:
+                index.create(bind=conn)
+                created.append(index.name)
+                print(f"Migrated: created index {index.name}")
+    return created
+
+
+# ---------------------------------------------------------
+# MIGRATIONS (append only; never renumber)
+# ---------------------------------------------------------
+def profile_contact_columns(conn):
+    add_columns(conn, "user_profiles", [
+        ("email", "VARCHAR(255)"),
+        ("date_of_birth", "DATE"),
+    ])
+
+
+def profile_goal_columns(conn):
+    add_columns(conn, "user_profiles", [
+        ("gender", "VARCHAR(20) DEFAULT 'male'"),
+        ("goal_type", "VARCHAR(20) DEFAULT 'maintain'"),
+        ("target_weight_kg", "FLOAT"),
+        ("goal_timeline_weeks", "INTEGER"),
+        ("activity_level", "VARCHAR(20) DEFAULT 'moderate'"),
+        ("daily_calorie_target", "INTEGER"),
+        ("goal_set_at", "TIMESTAMP"),
+    ])
+
+
+def history_totals_columns(conn):
+    add_columns(conn, "saved_workout_history", [
+        ("total_volume", "INTEGER DEFAULT 0"),
+        ("total_sets", "INTEGER DEFAULT 0"),
+        ("total_reps", "INTEGER DEFAULT 0"),
+    ])
+
+
+def blob_columns(conn):
+    add_columns(conn, "user_profiles", [("image_blob", "VARCHAR(64)")])
+    add_columns(conn, "saved_workout_history", [("photo_blob", "VARCHAR(64)")])
+
+
+def history_client_id(conn):
+    add_columns(conn, "saved_workout_history", [("client_id", "VARCHAR(64)")])
+
+
+def backfill_completed_at(conn):
+    # Keyset pagination sorts history on completed_at, so it must not be NULL
+    conn.execute(text("UPDATE saved_workout_history SET completed_at = created_at WHERE completed_at IS NULL"))
+
+
+def declared_indexes(conn):
+    ensure_indexes(conn)
+
+
+def exercise_catalog_table(conn):
+    CatalogExercise.__table__.create(bind=conn, checkfirst=True)
+
+
+def exercise_media_table(conn):
+    ExerciseMedia.__table__.create(bind=conn, checkfirst=True)
+
+
+def plan_job_days(conn):
+    add_columns(conn, "plan_jobs", [("days", "JSON")])
+
+
+def profile_goal_rate(conn):
+    # Goals saved before this have no preset flag and are left alone by `energy.py refresh`
+    add_columns(conn, "user_profiles", [("goal_rate_kg", "FLOAT"), ("goal_preset", "BOOLEAN")])
+
+
+def rekey_nutrition_estimates(conn):
+    # Keys used to drop amounts, so "2 bowls of oatmeal" was cached as "oatmeal"; drop estimates
+    # whose query now has a different key and let them be estimated again
+    from nutrition_estimates import normalize_food_query
+    if "nutrition_estimates" not in inspect(conn).get_table_names():
+        return
+    rows = conn.execute(text("SELECT id, query_key, query_text FROM nutrition_estimates")).all()
+    stale = [{"id": row.id} for row in rows if normalize_food_query(row.query_text or "")[0] != row.query_key]
+    if stale:
+        conn.execute(text("DELETE FROM nutrition_estimates WHERE id = :id"), stale)
+        print(f"Migrated: dropped {len(stale)} nutrition estimates cached without their amount")
+
+
+def history_local_day(conn):
+    # Older entries never sent the client's date; their UTC date is the best guess
+    add_columns(conn, "saved_workout_history", [("day", "DATE")])
+    if "saved_workout_history" in inspect(conn).get_table_names():
+        conn.execute(text("UPDATE saved_workout_history SET day = DATE(completed_at) WHERE day IS NULL"))
+
+
+MIGRATIONS = [
+    (1, "user_profiles email and date_of_birth", profile_contact_columns),
+    (2, "user_profiles goal columns", profile_goal_columns),
+    (3, "saved_workout_history totals", history_totals_columns),
+    (4, "blob store hash columns", blob_columns),
+    (5, "saved_workout_history client_id", history_client_id),
+    (6, "backfill saved_workout_history.completed_at", backfill_completed_at),
+    (7, "indexes declared in models.py", declared_indexes),
+    (8, "exercise_catalog table", exercise_catalog_table),
+    (9, "exercise_media table", exercise_media_table),
+    (10, "plan_jobs.days", plan_job_days),
+    (11, "user_profiles goal rate and preset flag", profile_goal_rate),
+    (12, "re-key nutrition estimates with their amount", rekey_nutrition_estimates),
+    (13, "saved_workout_history.day", history_local_day),
+]
+
+HEAD = MIGRATIONS[-1][0]
+
+
+# ---------------------------------------------------------
+# RUNNER
+# ---------------------------------------------------------
+def current_version(conn):
+    """The applied schema version: 0 if none recorded, None if schema_version is missing."""
+    try:
+        return conn.execute(text("SELECT MAX(version) FROM schema_version")).scalar() or 0
+    except SQLAlchemyError:
+        return None
+
+
+def _record(conn, version, description):
+    conn.execute(SchemaVersion.__table__.insert().values(
+        version=version, description=description, applied_at=datetime.utcnow(),
+    ))
+
+
+def upgrade(engine):
+    """Apply pending migrations in one transaction; returns the versions applied."""
+    with engine.begin() as conn:
+        if conn.dialect.name == "postgresql":
+            conn.execute(text("SELECT pg_advisory_xact_lock(:id)"), {"id": PG_LOCK_ID})
+
+        fresh = not inspect(conn).get_table_names()
+        db.metadata.create_all(conn)  # new models' tables, including schema_version
+        if fresh:
+            _record(conn, HEAD, "created from models.py")
+            print(f"Database created at schema version {HEAD}")
+            return []
+
+        version = current_version(conn) or 0
+        applied = []
+        for number, description, migrate in MIGRATIONS:
+            if number <= version:
+                continue
+            migrate(conn)
+            _record(conn, number, description)
+            applied.append(number)
+            print(f"Applied migration {number}: {description}")
+    return applied
+
+
+def check_schema(engine):
+    """Boot check: one query when up to date; applies or warns about pending migrations."""
+    with engine.connect() as conn:
+        version = current_version(conn)
+    if version == HEAD:
+        return []
+    if not MIGRATE_ON_BOOT:
+        print(f"Database schema is at version {version or 0}, code expects {HEAD}: run python migrations.py upgrade")
+        return []
+    return upgrade(engine)
+
+
+def status(engine):
+    with engine.connect() as conn:
+        version = current_version(conn)
+    print(f"Schema version: {version or 0} (latest {HEAD})")
+    for number, description, _ in MIGRATIONS:
+        mark = "applied" if version and number <= version else "pending"
+        print(f"  {number:>3} {mark:<8} {description}")
+    return version
+
+
+if __name__ == "__main__":
+    os.environ.setdefault("MIGRATE_ON_BOOT", "0")  # importing app must not migrate on its own
+    from app import app
+
+    command = sys.argv[1] if len(sys.argv) > 1 else "upgrade"
+    with app.app_context():
+        if command == "status":
+            status(db.engine)
+        else:
+            applied = upgrade(db.engine)
+            print(f"Migrations finished ({len(applied)} applied)")
@@ -34,7 +34,7 @@ class Goal(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(80), nullable=False)
     description = db.Column(db.String(120), nullable=False)
-    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False, index=True)
 
 
 # ---------------------------------------------------------
@@ -45,7 +45,7 @@ class Session(db.Model):
     date = db.Column(db.DateTime, default=datetime.utcnow)
     duration_seconds = db.Column(db.Integer)
     details = db.Column(db.JSON)
-    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False, index=True)
 
 
 # ---------------------------------------------------------
@@ -53,6 +53,9 @@ class Session(db.Model):
 # ---------------------------------------------------------
 class WorkoutPlan(db.Model):
     __tablename__ = "workout_plans"
+    __table_args__ = (
+        db.Index("ix_workout_plans_user_id_created_at", "user_id", "created_at", "id"),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
@@ -75,6 +78,9 @@ class WorkoutPlan(db.Model):
 # ---------------------------------------------------------
 class Workout(db.Model):
     __tablename__ = "workouts"
+    __table_args__ = (
+        db.Index("ix_workouts_user_id_id", "user_id", "id"),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
@@ -100,7 +106,8 @@ class UserProfile(db.Model):
     date_of_birth = db.Column(db.Date)
     height_cm = db.Column(db.Float)
     weight_kg = db.Column(db.Float)
-    profile_image_url = db.Column(db.Text)  # Can store Base64 or URL
+    profile_image_url = db.Column(db.Text)  # External URL (legacy rows: Base64)
+    image_blob = db.Column(db.String(64))  # sha256 of the uploaded image in the blob store
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
@@ -111,25 +118,38 @@ class UserProfile(db.Model):
     goal_timeline_weeks = db.Column(db.Integer)  # How many weeks to reach goal
     activity_level = db.Column(db.String(20), default="moderate")  # sedentary, light, moderate, active, very_active
     daily_calorie_target = db.Column(db.Integer)  # Calculated calorie goal
+    goal_rate_kg = db.Column(db.Float)  # Weekly rate preset chosen for a lose/gain goal (kg/week)
+    goal_preset = db.Column(db.Boolean)  # daily_calorie_target follows the goal page rules (False: custom)
     goal_set_at = db.Column(db.DateTime)  # When the goal was set
 
     # Relationship back to user
     user = db.relationship("User", backref=db.backref("profile", uselist=False))
 
 
+# Password reset looks profiles up by func.lower(email)
+db.Index("ix_user_profiles_email_lower", db.func.lower(UserProfile.email))
+
+
 # ---------------------------------------------------------
 # SAVED WORKOUT HISTORY MODEL (Server-side storage)
 # ---------------------------------------------------------
 class SavedWorkoutHistory(db.Model):
     __tablename__ = "saved_workout_history"
+    __table_args__ = (
+        db.Index("ix_saved_workout_history_user_id_completed_at", "user_id", "completed_at", "id"),
+        db.Index("ux_saved_workout_history_user_id_client_id", "user_id", "client_id", unique=True),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
     workout_name = db.Column(db.String(255))
     duration_seconds = db.Column(db.Integer)
     exercises = db.Column(db.JSON)
-    progress_photo = db.Column(db.Text)  # Base64 image data
+    progress_photo = db.Column(db.Text)  # Legacy Base64 image data, moved out by migrate_blobs.py
+    photo_blob = db.Column(db.String(64))  # sha256 of the photo in the blob store
+    client_id = db.Column(db.String(64))  # idempotency key from offline clients, unique per user
     completed_at = db.Column(db.DateTime)
+    day = db.Column(db.Date)  # the client's local date of completed_at; rollups count it on this day
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     total_volume = db.Column(db.Integer, default=0)
     total_sets = db.Column(db.Integer, default=0)
@@ -137,3 +157,184 @@ class SavedWorkoutHistory(db.Model):
 
     # Relationship back to user
     user = db.relationship("User", backref="saved_history")
+
+
+# ---------------------------------------------------------
+# AI NUTRITION ESTIMATE CACHE
+# ---------------------------------------------------------
+class NutritionEstimate(db.Model):
+    __tablename__ = "nutrition_estimates"
+
+    id = db.Column(db.Integer, primary_key=True)
+    query_key = db.Column(db.String(255), unique=True, nullable=False, index=True)  # normalized query
+    tokens = db.Column(db.String(255), nullable=False)  # space-separated stems, for near-duplicate matching
+    query_text = db.Column(db.String(255))  # first raw query that produced this estimate
+    estimate = db.Column(db.JSON, nullable=False)
+    confidence = db.Column(db.String(20))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+# ---------------------------------------------------------
+# AI WORKOUT PLAN GENERATION JOB
+# ---------------------------------------------------------
+class PlanJob(db.Model):
+    __tablename__ = "plan_jobs"
+
+    id = db.Column(db.String(36), primary_key=True)  # uuid4 hex job id
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False, index=True)
+    status = db.Column(db.String(20), nullable=False, default="queued")  # queued, running, done, failed
+    params = db.Column(db.JSON, nullable=False)
+    plan_id = db.Column(db.Integer, db.ForeignKey("workout_plans.id"))
+    days = db.Column(db.JSON)  # weekly_plan days finished so far, saved while the model writes
+    error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+
+
+# ---------------------------------------------------------
+# AI WORKOUT PLAN TEMPLATE CACHE
+# ---------------------------------------------------------
+class PlanTemplate(db.Model):
+    __tablename__ = "plan_templates"
+    __table_args__ = (
+        db.Index("ix_plan_templates_params_key_last_used_at", "params_key", "last_used_at"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    params_key = db.Column(db.String(64), nullable=False)  # sha256 of canonical plan inputs
+    params = db.Column(db.JSON, nullable=False)
+    plan_json = db.Column(JSON, nullable=False)
+    hits = db.Column(db.Integer, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    last_used_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+
+# ---------------------------------------------------------
+# BLOB STORE METADATA (progress photos, profile images)
+# ---------------------------------------------------------
+class MediaBlob(db.Model):
+    __tablename__ = "media_blobs"
+
+    sha256 = db.Column(db.String(64), primary_key=True)  # content hash = file name in the blob store
+    content_type = db.Column(db.String(100), nullable=False)
+    size = db.Column(db.Integer, nullable=False)
+    thumbnail_sha256 = db.Column(db.String(64))  # None if no thumbnail could be made
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+# ---------------------------------------------------------
+# TRAINING STATS ROLLUPS (maintained by training_stats.py)
+# ---------------------------------------------------------
+class TrainingStat(db.Model):
+    __tablename__ = "training_stats"
+    __table_args__ = (
+        db.UniqueConstraint("user_id", "period", "period_start", name="uq_training_stats_user_period"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
+    period = db.Column(db.String(10), nullable=False)  # day, week, all
+    period_start = db.Column(db.Date, nullable=False)  # the day, the week's Monday, or 1970-01-01 for all
+    workouts = db.Column(db.Integer, default=0, nullable=False)
+    duration_seconds = db.Column(db.Integer, default=0, nullable=False)
+    total_volume = db.Column(db.Integer, default=0, nullable=False)
+    total_sets = db.Column(db.Integer, default=0, nullable=False)
+    total_reps = db.Column(db.Integer, default=0, nullable=False)
+
+
+class PersonalBest(db.Model):
+    __tablename__ = "personal_bests"
+    __table_args__ = (
+        db.UniqueConstraint("user_id", "exercise", name="uq_personal_bests_user_exercise"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
+    exercise = db.Column(db.String(255), nullable=False)  # normalized (lowercased) exercise name
+    display_name = db.Column(db.String(255))
+    sessions = db.Column(db.Integer, default=0, nullable=False)
+    best_volume = db.Column(db.Float, default=0, nullable=False)  # most volume in one session
+    best_volume_at = db.Column(db.DateTime)
+    best_volume_history_id = db.Column(db.Integer)
+    best_reps = db.Column(db.Integer, default=0, nullable=False)  # most reps in one session
+    best_reps_at = db.Column(db.DateTime)
+    best_reps_history_id = db.Column(db.Integer)
+
+
+# ---------------------------------------------------------
+# FOOD LOG
+# ---------------------------------------------------------
+class FoodLogEntry(db.Model):
+    __tablename__ = "food_log_entries"
+    __table_args__ = (
+        db.Index("ix_food_log_entries_user_id_day", "user_id", "day", "id"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
+    day = db.Column(db.Date, nullable=False)  # the user's local calendar day
+    name = db.Column(db.String(255), nullable=False)
+    serving = db.Column(db.String(50))
+    calories = db.Column(db.Float, default=0, nullable=False)
+    protein = db.Column(db.Float, default=0, nullable=False)
+    carbs = db.Column(db.Float, default=0, nullable=False)
+    fat = db.Column(db.Float, default=0, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class DailyNutrition(db.Model):
+    """Per-user per-day food log totals, maintained by food_log.py."""
+    __tablename__ = "daily_nutrition"
+    __table_args__ = (
+        db.UniqueConstraint("user_id", "day", name="uq_daily_nutrition_user_day"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
+    day = db.Column(db.Date, nullable=False)
+    entries = db.Column(db.Integer, default=0, nullable=False)
+    calories = db.Column(db.Float, default=0, nullable=False)
+    protein = db.Column(db.Float, default=0, nullable=False)
+    carbs = db.Column(db.Float, default=0, nullable=False)
+    fat = db.Column(db.Float, default=0, nullable=False)
+
+
+# ---------------------------------------------------------
+# EXERCISE CATALOG (ExerciseDB mirror, synced by exercise_catalog.py)
+# ---------------------------------------------------------
+class CatalogExercise(db.Model):
+    __tablename__ = "exercise_catalog"
+
+    exercise_id = db.Column(db.String(64), primary_key=True)  # ExerciseDB exerciseId
+    name = db.Column(db.String(255), nullable=False)
+    body_parts = db.Column(db.JSON, default=list)
+    target_muscles = db.Column(db.JSON, default=list)
+    secondary_muscles = db.Column(db.JSON, default=list)
+    equipments = db.Column(db.JSON, default=list)
+    instructions = db.Column(db.JSON, default=list)
+    gif_url = db.Column(db.Text)
+    synced_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class ExerciseMedia(db.Model):
+    """Local copy of an exercise GIF (maintained by exercise_media.py); files live in the blob store."""
+    __tablename__ = "exercise_media"
+
+    source_key = db.Column(db.String(64), primary_key=True)  # sha256 of the upstream URL
+    source_url = db.Column(db.Text, nullable=False)
+    gif_sha256 = db.Column(db.String(64), nullable=False)
+    webp_sha256 = db.Column(db.String(64))    # animated WebP, only kept when smaller than the GIF
+    poster_sha256 = db.Column(db.String(64))  # first frame as JPEG
+    fetched_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+# ---------------------------------------------------------
+# SCHEMA VERSION (written by migrations.py)
+# ---------------------------------------------------------
+class SchemaVersion(db.Model):
+    __tablename__ = "schema_version"
+
+    version = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    description = db.Column(db.String(255))
+    applied_at = db.Column(db.DateTime, default=datetime.utcnow)
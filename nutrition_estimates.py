@@ -0,0 +1,219 @@
+"""
+Persistent cache for AI nutrition estimates.
+Queries are normalized (lowercased, words stemmed and sorted) so "Bowl of
+Oatmeal" and "oatmeal bowl" share one estimate. The LLM is asked about the
+raw query, so an explicit amount ("2 bowls") stays in the key: "2 Bowls of
+Oatmeal" and "oatmeal, 2 bowls" share an estimate, "oatmeal" does not.
+Unit words without a number are dropped. Optionally a near-duplicate query
+with the same amount whose stems overlap enough (Jaccard similarity)
+reuses an existing estimate too. Estimates are kept
+in the nutrition_estimates table so every worker and restart shares them.
+"""
+import os
+import re
+import json
+from datetime import datetime, timedelta
+
+from models import db, NutritionEstimate
+from cache import SingleFlight
+
+# Words that only describe an amount; the estimate is always "per serving"
+UNITS = {
+    "g", "gram", "kg", "kilogram", "mg", "oz", "ounce", "lb", "pound",
+    "ml", "l", "liter", "litre", "cup", "tbsp", "tablespoon", "tsp", "teaspoon",
+    "slice", "piece", "serving", "portion", "bowl", "plate", "glass", "can",
+    "bottle", "scoop", "handful", "pinch", "dozen", "half", "x",
+}
+STOPWORDS = {"a", "an", "the", "of", "some", "and", "or", "my"}
+NUMBER_WORDS = {"one": "1", "two": "2", "three": "3", "four": "4", "five": "5",
+                "six": "6", "seven": "7", "eight": "8", "nine": "9", "ten": "10"}
+
+_TOKEN = re.compile(r"\d+(?:[.,/]\d+)*|[a-z]+")
+
+# Separates the food words from the amount in a cache key: "oatmeal @ 2 bowl"
+AMOUNT_SEPARATOR = " @ "
+
+
+def stem(word):
+    """Tiny plural/suffix stemmer, enough to merge "tomatoes" and "tomato"."""
+    if len(word) > 4 and word.endswith("ies"):
+        return word[:-3] + "y"
+    if len(word) > 4 and word.endswith(("oes", "ches", "shes", "xes", "sses")):
+        return word[:-2]
+    if len(word) > 3 and word.endswith("s") and not word.endswith(("ss", "us", "is")):
+        return word[:-1]
+    return word
+
+
+def normalize_food_query(query):
+    """Return (key, tokens) for a free-text food query; key is "" if no food word is left.
+
+    tokens are the food's word stems; the key adds the amount (numbers and the
+    units next to them, in order) when the query has a number.
+    """
+    tokens = set()
+    amount = []
+    has_number = False
+    for word in _TOKEN.findall(str(query).lower()):
+        if word[0].isdigit() or word in NUMBER_WORDS:
+            amount.append(NUMBER_WORDS.get(word, word.replace(",", ".")))
+            has_number = True
+            continue
+        if word in STOPWORDS:
+            continue
+        word = stem(word)
+        if word in UNITS:
+            amount.append(word)
+            continue
+        tokens.add(word)
+    tokens = sorted(tokens)
+    if not tokens:
+        return "", tokens
+    quantity = AMOUNT_SEPARATOR + " ".join(amount) if has_number else ""
+    return " ".join(tokens)[:255 - len(quantity)] + quantity, tokens
+
+
+def key_amount(key):
+    """The amount part of a cache key ("" for a plain serving)."""
+    return key.partition(AMOUNT_SEPARATOR)[2]
+
+
+def token_similarity(a, b):
+    """Jaccard similarity of two token collections."""
+    a, b = set(a), set(b)
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+class EstimateCache:
+    """Database-backed cache in front of an AI nutrition estimator.
+
+    similarity_threshold: minimum Jaccard overlap for a near-duplicate hit
+    (None disables fuzzy matching). max_age_days: estimates older than this
+    are re-estimated. Needs an app context.
+    """
+
+    def __init__(self, similarity_threshold=0.75, max_age_days=90, candidate_limit=50):
+        self.similarity_threshold = similarity_threshold
+        self.max_age_days = max_age_days
+        self.candidate_limit = candidate_limit
+        self.flight = SingleFlight()
+
+    @classmethod
+    def from_env(cls):
+        threshold = os.getenv("AI_ESTIMATE_SIMILARITY", "0.75")
+        return cls(
+            similarity_threshold=float(threshold) if threshold else None,
+            max_age_days=int(os.getenv("AI_ESTIMATE_MAX_AGE_DAYS", "90")),
+        )
+
+    def _fresh(self):
+        query = NutritionEstimate.query
+        if self.max_age_days:
+            cutoff = datetime.utcnow() - timedelta(days=self.max_age_days)
+            query = query.filter(NutritionEstimate.created_at >= cutoff)
+        return query
+
+    def lookup(self, food_query):
+        """Return the cached estimate list for a query, or None."""
+        key, tokens = normalize_food_query(food_query)
+        if not key:
+            return None
+        row = self._fresh().filter_by(query_key=key).first()
+        if row is None and self.similarity_threshold and tokens:
+            row = self._nearest(tokens, key_amount(key))
+        if row is None:
+            return None
+        return self._serve(row)
+
+    def _nearest(self, tokens, amount):
+        # Any near-duplicate must share the query's most specific (longest) stem and its amount
+        anchor = max(tokens, key=len)
+        candidates = (
+            self._fresh()
+            .filter(NutritionEstimate.tokens.like(f"%{anchor}%"))
+            .limit(self.candidate_limit)
+            .all()
+        )
+        best, best_score = None, 0.0
+        for row in candidates:
+            if key_amount(row.query_key) != amount:
+                continue
+            score = token_similarity(tokens, row.tokens.split())
+            if score > best_score:
+                best, best_score = row, score
+        if best is not None and best_score >= self.similarity_threshold:
+            return best
+        return None
+
+    def _serve(self, row):
+        estimate = json.loads(json.dumps(row.estimate))
+        for item in estimate:
+            item["source"] = "ai_estimate"
+            item["cached"] = True
+            item["estimated_at"] = row.created_at.isoformat() if row.created_at else None
+        return estimate
+
+    def store(self, food_query, estimate):
+        """Persist an estimate list under the query's normalized key."""
+        key, tokens = normalize_food_query(food_query)
+        if not key or not estimate:
+            return
+        try:
+            row = NutritionEstimate.query.filter_by(query_key=key).first()
+            if row is None:
+                row = NutritionEstimate(query_key=key, tokens=" ".join(tokens)[:255])
+                db.session.add(row)
+            row.query_text = str(food_query)[:255]
+            row.estimate = estimate
+            row.confidence = estimate[0].get("confidence")
+            row.created_at = datetime.utcnow()
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            print(f"Estimate cache store error: {e}")
+
+    def get_or_estimate(self, food_query, estimator):
+        """Serve from the cache, else call estimator(food_query) once and store the result.
+
+        Concurrent requests for the same normalized query share one estimator call.
+        """
+        try:
+            cached = self.lookup(food_query)
+        except Exception as e:
+            print(f"Estimate cache lookup error: {e}")
+            cached = None
+        if cached is not None:
+            return cached
+
+        key, _ = normalize_food_query(food_query)
+        estimate, shared = self.flight.do(key or str(food_query), lambda: estimator(food_query))
+        if estimate and not shared:
+            self.store(food_query, estimate)
+        return json.loads(json.dumps(estimate)) if estimate else estimate
+
+
+class FakeNutritionLLM:
+    """Stand-in for the OpenAI chat call in tests and offline development.
+
+    Called with the prompt, returns the JSON text the real model would,
+    and records every prompt in `calls`.
+    """
+
+    def __init__(self, calories=350, protein=20.0, carbs=30.0, fat=12.0, confidence="medium"):
+        self.values = {"calories": calories, "protein": protein, "carbs": carbs, "fat": fat}
+        self.confidence = confidence
+        self.calls = []
+
+    def __call__(self, prompt):
+        self.calls.append(prompt)
+        match = re.search(r'information for: "([^"]*)"', prompt)
+        name = match.group(1).title() if match else "Food"
+        return json.dumps(dict(
+            self.values,
+            food_name=name,
+            serving="1 serving",
+            confidence=self.confidence,
+            notes="Fake estimate",
+        ))
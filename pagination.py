@@ -0,0 +1,69 @@
+"""
+Keyset (cursor) pagination for the per-user list endpoints.
+A page is `WHERE (sort, id) < (last sort, last id) ORDER BY sort DESC, id
+DESC LIMIT n`, which the (user_id, sort, id) indexes answer with a range
+scan, so page N costs the same as page 1. Cursors are opaque base64 tokens
+of the last row's key values.
+"""
+import json
+import base64
+from datetime import datetime
+
+from sqlalchemy import DateTime, tuple_
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+def encode_cursor(values):
+    raw = json.dumps([v.isoformat() if isinstance(v, datetime) else v for v in values])
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor, columns):
+    """Return the key values in a cursor, typed for the given columns; raises ValueError."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if not isinstance(values, list) or len(values) != len(columns) or None in values:
+        raise ValueError("Invalid cursor")
+    typed = []
+    for column, value in zip(columns, values):
+        if isinstance(column.type, DateTime):
+            value = datetime.fromisoformat(value)
+        typed.append(value)
+    return typed
+
+
+def wants_page(args):
+    """Pagination is opt-in so existing clients keep getting the full list."""
+    return "limit" in args or "after" in args
+
+
+def parse_limit(args):
+    """Return the page size from ?limit=, clamped to 1..MAX_PAGE_SIZE; raises ValueError."""
+    try:
+        limit = int(args.get("limit", DEFAULT_PAGE_SIZE))
+    except (TypeError, ValueError):
+        raise ValueError("limit must be an integer")
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+
+def keyset_page(query, columns, limit, after=None):
+    """Return (rows, next_cursor) for a query sorted newest first on `columns`.
+
+    `columns` are the sort key followed by a unique tiebreaker (the id);
+    `after` is the cursor from the previous page. next_cursor is None on
+    the last page.
+    """
+    if after:
+        query = query.filter(tuple_(*columns) < tuple_(*decode_cursor(after, columns)))
+    rows = query.order_by(*[column.desc() for column in columns]).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor([getattr(rows[-1], column.key) for column in columns])
+    return rows, next_cursor
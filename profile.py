@@ -1,7 +1,16 @@
 from flask import jsonify, request, Blueprint
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from models import db, User, UserProfile, SavedWorkoutHistory
-from datetime import datetime
+from models import db, UserProfile, SavedWorkoutHistory
+from datetime import date, datetime
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm.attributes import set_committed_value
+from pagination import wants_page, parse_limit, keyset_page
+from blob_store import store_data_url, drops_data_url, media_url
+from fieldsets import parse_fields, load_only_for, serialize
+from identity import current_identity, invalidate
+from food_log import parse_day
+import training_stats
 
 # Blueprint setup
 profile_bp = Blueprint("profile", __name__, url_prefix="/profile")
@@ -10,35 +19,44 @@ profile_bp = Blueprint("profile", __name__, url_prefix="/profile")
 # ---------------------------------------------------------
 # GET Profile
 # ---------------------------------------------------------
+def ensure_profile(identity):
+    """The identity's profile, creating an empty one on first use."""
+    if identity.profile:
+        return identity.profile
+    profile = UserProfile(user_id=identity.id, display_name=identity.username)
+    db.session.add(profile)
+    db.session.commit()
+    invalidate(identity.id)
+    return profile
+
+
+def profile_to_dict(identity, profile):
+    user_id = identity.id
+    return {
+        "id": profile.id,
+        "username": identity.username,
+        "display_name": profile.display_name or identity.username,
+        "email": profile.email,
+        "date_of_birth": profile.date_of_birth.isoformat() if profile.date_of_birth else None,
+        "height_cm": profile.height_cm,
+        "weight_kg": profile.weight_kg,
+        "profile_image_url": media_url(profile.image_blob, user_id) or profile.profile_image_url,
+        "profile_image_thumb": media_url(profile.image_blob, user_id, thumbnail=True),
+        "created_at": profile.created_at.isoformat() if profile.created_at else None,
+    }
+
+
 @profile_bp.route("", methods=["GET"])
 @jwt_required()
 def get_profile():
     """Get the current user's profile."""
-    user_id = get_jwt_identity()
-    user = User.query.get(int(user_id))
+    identity = current_identity()
     
-    if not user:
+    if not identity:
         return jsonify({"error": "User not found"}), 404
     
-    profile = UserProfile.query.filter_by(user_id=user_id).first()
-    
     # Auto-create profile if it doesn't exist
-    if not profile:
-        profile = UserProfile(user_id=user_id, display_name=user.username)
-        db.session.add(profile)
-        db.session.commit()
-    
-    return jsonify({
-        "id": profile.id,
-        "username": user.username,
-        "display_name": profile.display_name or user.username,
-        "email": profile.email,
-        "date_of_birth": profile.date_of_birth.isoformat() if profile.date_of_birth else None,
-        "height_cm": profile.height_cm,
-        "weight_kg": profile.weight_kg,
-        "profile_image_url": profile.profile_image_url,
-        "created_at": profile.created_at.isoformat() if profile.created_at else None,
-    }), 200
+    return jsonify(profile_to_dict(identity, ensure_profile(identity))), 200
 
 
 # ---------------------------------------------------------
@@ -74,9 +92,17 @@ def update_profile():
     if "weight_kg" in data:
         profile.weight_kg = data["weight_kg"]
     if "profile_image_url" in data:
-        profile.profile_image_url = data["profile_image_url"]
+        # Uploaded images (data: URLs) go to the blob store; the row keeps the hash (and the
+        # data URL until the store is persistent)
+        try:
+            image_blob = store_data_url(data["profile_image_url"])
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        profile.image_blob = image_blob
+        profile.profile_image_url = None if drops_data_url(image_blob) else data["profile_image_url"]
     
     db.session.commit()
+    invalidate(user_id)
     
     return jsonify({
         "message": "Profile updated successfully",
@@ -87,46 +113,113 @@ def update_profile():
 # ---------------------------------------------------------
 # GET Saved Workout History
 # ---------------------------------------------------------
+# Response fields -> (columns they need, getter); see fieldsets.py
+HISTORY_FIELDS = {
+    "id": ([SavedWorkoutHistory.id], lambda h: h.id),
+    "workout_name": ([SavedWorkoutHistory.workout_name], lambda h: h.workout_name),
+    "duration_seconds": ([SavedWorkoutHistory.duration_seconds], lambda h: h.duration_seconds),
+    "exercises": ([SavedWorkoutHistory.exercises], lambda h: h.exercises),
+    # The Base64 column stays deferred; load_legacy_photos fills it for rows without a blob
+    "progress_photo": (
+        [SavedWorkoutHistory.photo_blob, SavedWorkoutHistory.user_id],
+        lambda h: media_url(h.photo_blob, h.user_id) or h.progress_photo,
+    ),
+    "progress_photo_thumb": (
+        [SavedWorkoutHistory.photo_blob, SavedWorkoutHistory.user_id],
+        lambda h: media_url(h.photo_blob, h.user_id, thumbnail=True),
+    ),
+    "completed_at": (
+        [SavedWorkoutHistory.completed_at],
+        lambda h: h.completed_at.isoformat() if h.completed_at else None,
+    ),
+    "created_at": (
+        [SavedWorkoutHistory.created_at],
+        lambda h: h.created_at.isoformat() if h.created_at else None,
+    ),
+    "total_volume": ([SavedWorkoutHistory.total_volume], lambda h: h.total_volume or 0),
+    "total_sets": ([SavedWorkoutHistory.total_sets], lambda h: h.total_sets or 0),
+    "total_reps": ([SavedWorkoutHistory.total_reps], lambda h: h.total_reps or 0),
+}
+
+
 @profile_bp.route("/history", methods=["GET"])
 @jwt_required()
 def get_saved_history():
-    """Get all saved workout history for the current user."""
+    """Get saved workout history for the current user, newest first.
+
+    With ?limit= and/or ?after=<cursor> returns one page as {"items", "next_cursor"}.
+    ?fields=a,b,c returns (and loads) only those fields.
+    """
     user_id = get_jwt_identity()
+    sort_columns = [SavedWorkoutHistory.completed_at, SavedWorkoutHistory.id]
+    try:
+        fields = parse_fields(request.args, HISTORY_FIELDS)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    query = SavedWorkoutHistory.query.filter_by(user_id=user_id)
+    query = query.options(load_only_for(HISTORY_FIELDS, fields, *sort_columns))
+    
+    if wants_page(request.args):
+        try:
+            history, next_cursor = keyset_page(
+                query, sort_columns, parse_limit(request.args), request.args.get("after")
+            )
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        load_legacy_photos(history, fields)
+        return jsonify({
+            "items": [history_to_dict(h, fields) for h in history],
+            "next_cursor": next_cursor,
+        }), 200
     
-    history = SavedWorkoutHistory.query.filter_by(user_id=user_id).order_by(
-        SavedWorkoutHistory.completed_at.desc()
-    ).all()
-    
-    return jsonify([
-        {
-            "id": h.id,
-            "workout_name": h.workout_name,
-            "duration_seconds": h.duration_seconds,
-            "exercises": h.exercises,
-            "progress_photo": h.progress_photo,
-            "completed_at": h.completed_at.isoformat() if h.completed_at else None,
-            "created_at": h.created_at.isoformat() if h.created_at else None,
-            "total_volume": h.total_volume or 0,
-            "total_sets": h.total_sets or 0,
-            "total_reps": h.total_reps or 0,
-        }
-        for h in history
-    ]), 200
+    history = query.order_by(SavedWorkoutHistory.completed_at.desc()).all()
+    load_legacy_photos(history, fields)
+    return jsonify([history_to_dict(h, fields) for h in history]), 200
+
+
+def load_legacy_photos(history, fields=None):
+    """Load the Base64 progress_photo, in one query, for rows that have no blob to link to."""
+    if fields and "progress_photo" not in fields:
+        return
+    legacy = [h for h in history if not h.photo_blob]
+    if not legacy:
+        return
+    photos = dict(
+        db.session.query(SavedWorkoutHistory.id, SavedWorkoutHistory.progress_photo)
+        .filter(SavedWorkoutHistory.id.in_([h.id for h in legacy]))
+    )
+    for h in legacy:
+        set_committed_value(h, "progress_photo", photos.get(h.id))
+
+
+def history_to_dict(h, fields=None):
+    return serialize(h, HISTORY_FIELDS, fields)
 
 
 # ---------------------------------------------------------
 # SAVE Workout to Profile History
 # ---------------------------------------------------------
-@profile_bp.route("/history", methods=["POST"])
-@jwt_required()
-def save_to_history():
-    """Save a workout session to the user's profile history."""
+MAX_BATCH_ENTRIES = 100
+
+
+def parse_client_id(data):
+    client_id = data.get("client_id")
+    if client_id is None:
+        return None
+    client_id = str(client_id).strip()
+    if not client_id or len(client_id) > 64:
+        raise ValueError("client_id must be 1-64 characters")
+    return client_id
+
+
+def build_history_entry(user_id, data):
+    """Validate a posted workout and return an unsaved SavedWorkoutHistory; raises ValueError."""
     import json
-    user_id = get_jwt_identity()
-    data = request.get_json() or {}
-    
+    if not isinstance(data, dict):
+        raise ValueError("Each entry must be an object")
+
     workout_name = data.get("workout_name", "Workout")
-    duration_seconds = data.get("duration_seconds", 0)
     exercises = data.get("exercises", [])
     
     # Ensure exercises is a proper Python list/dict for PostgreSQL JSON column
@@ -136,35 +229,80 @@ def save_to_history():
         except json.JSONDecodeError:
             exercises = []
     
+    counters = {}
+    for name in ("duration_seconds", "total_volume", "total_sets", "total_reps"):
+        try:
+            counters[name] = int(float(data.get(name) or 0))
+        except (TypeError, ValueError, OverflowError):
+            raise ValueError(f"{name} must be a number")
+    
     progress_photo = data.get("progress_photo")
-    completed_at_str = data.get("completed_at")
-    total_volume = data.get("total_volume", 0)
-    total_sets = data.get("total_sets", 0)
-    total_reps = data.get("total_reps", 0)
+    photo_blob = None
+    if progress_photo:
+        # Photos go to the blob store; the row keeps the content hash (and the data URL
+        # until the store is persistent)
+        photo_blob = store_data_url(progress_photo)
+        if drops_data_url(photo_blob):
+            progress_photo = None
     
     # Parse completed_at if provided
     completed_at = None
+    completed_at_str = data.get("completed_at")
     if completed_at_str:
         try:
-            completed_at = datetime.fromisoformat(completed_at_str.replace("Z", "+00:00"))
+            completed_at = datetime.fromisoformat(str(completed_at_str).replace("Z", "+00:00"))
         except ValueError:
             completed_at = datetime.utcnow()
     else:
         completed_at = datetime.utcnow()
     
-    history_entry = SavedWorkoutHistory(
+    # The client's local date, as for the food log; clients that do not send it get the UTC date
+    day = parse_day(data.get("day"), default=completed_at.date())
+    
+    return SavedWorkoutHistory(
         user_id=user_id,
+        client_id=parse_client_id(data),
         workout_name=workout_name,
-        duration_seconds=duration_seconds,
         exercises=exercises,
         progress_photo=progress_photo,
+        photo_blob=photo_blob,
         completed_at=completed_at,
-        total_volume=total_volume,
-        total_sets=total_sets,
-        total_reps=total_reps,
+        day=day,
+        **counters,
     )
+
+
+@profile_bp.route("/history", methods=["POST"])
+@jwt_required()
+def save_to_history():
+    """Save a workout session to the user's profile history.
+
+    A repeated client_id returns the entry saved the first time (200).
+    """
+    user_id = int(get_jwt_identity())
+    data = request.get_json() or {}
+
+    try:
+        client_id = parse_client_id(data)
+        if client_id:
+            existing = SavedWorkoutHistory.query.filter_by(user_id=user_id, client_id=client_id).first()
+            if existing:
+                return jsonify({"message": "Workout already saved", "id": existing.id}), 200
+        history_entry = build_history_entry(user_id, data)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     
-    db.session.add(history_entry)
+    try:
+        db.session.add(history_entry)
+        db.session.flush()
+    except IntegrityError:
+        # A concurrent request saved this client_id first
+        db.session.rollback()
+        existing = SavedWorkoutHistory.query.filter_by(user_id=user_id, client_id=client_id).first()
+        if existing is None:
+            raise
+        return jsonify({"message": "Workout already saved", "id": existing.id}), 200
+    training_stats.record_workout(history_entry)
     db.session.commit()
     
     return jsonify({
@@ -173,6 +311,108 @@ def save_to_history():
     }), 201
 
 
+def insert_history(entries):
+    """Insert entries (all with a client_id) as one executemany and set their ids."""
+    if not entries:
+        return
+    db.session.flush()
+    now = datetime.utcnow()
+    columns = [c.key for c in SavedWorkoutHistory.__table__.columns if c.key != "id"]
+    rows = [{**{key: getattr(entry, key) for key in columns}, "created_at": now} for entry in entries]
+    db.session.execute(insert(SavedWorkoutHistory.__table__), rows)
+
+    # Ids come back through the (user_id, client_id) index rather than per-row RETURNING
+    ids = dict(
+        db.session.query(SavedWorkoutHistory.client_id, SavedWorkoutHistory.id)
+        .filter(SavedWorkoutHistory.user_id == entries[0].user_id,
+                SavedWorkoutHistory.client_id.in_([entry.client_id for entry in entries]))
+        .all()
+    )
+    for entry in entries:
+        entry.id = ids[entry.client_id]
+        entry.created_at = now
+
+
+@profile_bp.route("/history/batch", methods=["POST"])
+@jwt_required()
+def save_history_batch():
+    """Save many workouts (e.g. an offline backlog) in one transaction.
+
+    Body: {"entries": [{"client_id": ..., <same fields as POST /history>}, ...]}.
+    client_id is required; entries whose client_id was already saved are
+    reported as duplicates, so a retried sync never creates a workout twice.
+    Returns one result per entry, in order:
+    {"index", "client_id", "status": created|duplicate|invalid, "id"|"error"}.
+    """
+    user_id = int(get_jwt_identity())
+    data = request.get_json() or {}
+    items = data.get("entries")
+    if not isinstance(items, list) or not items:
+        return jsonify({"error": "entries must be a non-empty list"}), 400
+    if len(items) > MAX_BATCH_ENTRIES:
+        return jsonify({"error": f"At most {MAX_BATCH_ENTRIES} entries per request"}), 400
+
+    results = []
+    for i, item in enumerate(items):
+        client_id = item.get("client_id") if isinstance(item, dict) else None
+        results.append({"index": i, "client_id": str(client_id).strip() if client_id is not None else None})
+    for attempt in range(2):
+        # One query for every client_id already stored for this user
+        client_ids = {r["client_id"] for r in results if r["client_id"]}
+        existing = {}
+        if client_ids:
+            existing = dict(
+                db.session.query(SavedWorkoutHistory.client_id, SavedWorkoutHistory.id)
+                .filter(SavedWorkoutHistory.user_id == user_id,
+                        SavedWorkoutHistory.client_id.in_(client_ids))
+                .all()
+            )
+
+        pending = []
+        for result, item in zip(results, items):
+            result.pop("error", None)
+            client_id = result["client_id"]
+            if client_id and client_id in existing:
+                result.update(status="duplicate", id=existing[client_id])
+                continue
+            try:
+                if not client_id:
+                    raise ValueError("client_id is required")
+                entry = build_history_entry(user_id, item)
+            except ValueError as e:
+                result.update(status="invalid", id=None, error=str(e))
+                continue
+            # Repeats within the same batch count once
+            existing[entry.client_id] = None
+            pending.append((result, entry))
+
+        entries = [entry for _, entry in pending]
+        try:
+            insert_history(entries)
+        except IntegrityError:
+            # A concurrent sync stored some of these client_ids first: re-check and retry
+            db.session.rollback()
+            if attempt:
+                raise
+            continue
+        training_stats.record_workouts(entries)
+        db.session.commit()
+        break
+
+    for result, entry in pending:
+        result.update(status="created", id=entry.id)
+    # Repeats within the batch point at the entry created for the first one
+    created = {entry.client_id: entry.id for _, entry in pending}
+    for result in results:
+        if result["status"] == "duplicate" and result["id"] is None:
+            result["id"] = created.get(result["client_id"])
+
+    return jsonify({
+        "created": sum(1 for r in results if r["status"] == "created"),
+        "results": results,
+    }), 200
+
+
 # ---------------------------------------------------------
 # DELETE Saved Workout History Entry
 # ---------------------------------------------------------
@@ -189,7 +429,27 @@ def delete_history_entry(history_id):
     if not entry:
         return jsonify({"error": "History entry not found"}), 404
     
+    training_stats.remove_workout(entry)
     db.session.delete(entry)
     db.session.commit()
     
     return jsonify({"message": "History entry deleted"}), 200
+
+
+# ---------------------------------------------------------
+# GET Training Stats
+# ---------------------------------------------------------
+@profile_bp.route("/stats", methods=["GET"])
+@jwt_required()
+def get_training_stats():
+    """Totals, weekly rollups, streak and personal bests (precomputed).
+
+    ?day=YYYY-MM-DD is the client's local date, so "today" and the streak
+    line up with the days workouts were saved under.
+    """
+    user_id = int(get_jwt_identity())
+    try:
+        today = parse_day(request.args.get("day"), default=date.today())
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(training_stats.get_stats(user_id, today=today)), 200
@@ -39,6 +39,94 @@ document.addEventListener("DOMContentLoaded", () => {
   let currentPlan = null;
   let currentPlanId = null; // ✅ store latest plan ID returned from backend
 
+  // Plan generation runs as a background job: queue it, then poll until it finishes
+  async function requestPlan(payload) {
+    const token = localStorage.getItem("access_token");
+    const headers = {
+      "Content-Type": "application/json",
+      Authorization: `Bearer ${token}`,
+    };
+    const response = await fetch("/ai/workout-plan", {
+      method: "POST",
+      headers,
+      body: JSON.stringify(payload),
+    });
+    const job = await response.json();
+    if (!response.ok) return { ok: false, data: job };
+    return requestJob(job, headers);
+  }
+
+  // Poll a queued job until it finishes
+  async function requestJob(job, headers) {
+    while (job.status === "queued" || job.status === "running") {
+      await new Promise((resolve) => setTimeout(resolve, 1500));
+      const res = await fetch(`/ai/workout-plan/jobs/${job.job_id}`, { headers });
+      job = await res.json();
+      if (!res.ok) return { ok: false, data: job };
+    }
+    if (job.status !== "done") return { ok: false, data: { error: job.error || "Plan generation failed" } };
+    return { ok: true, data: job.result };
+  }
+
+  // Queue the job, then follow its event stream: each day arrives as soon as the worker has written it.
+  // The server closes each connection after a few seconds; reconnect with Last-Event-ID to resume.
+  async function streamPlan(payload, onDay) {
+    const token = localStorage.getItem("access_token");
+    const headers = {
+      "Content-Type": "application/json",
+      Authorization: `Bearer ${token}`,
+    };
+    const queued = await fetch("/ai/workout-plan", {
+      method: "POST",
+      headers,
+      body: JSON.stringify(payload),
+    });
+    const job = await queued.json();
+    if (!queued.ok) return { ok: false, data: job };
+
+    let lastEventId = "0";
+    let retry = 1000;
+    while (true) {
+      let response;
+      try {
+        response = await fetch(`/ai/workout-plan/jobs/${job.job_id}/events`, {
+          headers: { ...headers, "Last-Event-ID": lastEventId },
+        });
+      } catch (e) {
+        response = null;
+      }
+      // No stream (network, proxy): the job keeps running, so poll it instead
+      if (!response || !response.ok || !response.body) return requestJob(job, headers);
+
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = "";
+      while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+
+        let boundary;
+        while ((boundary = buffer.indexOf("\n\n")) !== -1) {
+          const message = buffer.slice(0, boundary);
+          buffer = buffer.slice(boundary + 2);
+          const retryHint = (message.match(/^retry: (\d+)$/m) || [])[1];
+          if (retryHint) retry = parseInt(retryHint);
+          const id = (message.match(/^id: (.*)$/m) || [])[1];
+          if (id !== undefined) lastEventId = id;
+          const event = (message.match(/^event: (.*)$/m) || [])[1];
+          if (!event) continue;
+          const data = JSON.parse((message.match(/^data: (.*)$/m) || [])[1] || "{}");
+          if (event === "day") onDay(data);
+          if (event === "done") return { ok: true, data };
+          if (event === "error") return { ok: false, data };
+        }
+      }
+      // The connection window ended before the job did: reconnect after the server's retry hint
+      await new Promise((resolve) => setTimeout(resolve, retry));
+    }
+  }
+
   // -----------------------------
   // GENERATE PLAN
   // -----------------------------
@@ -57,21 +145,19 @@ document.addEventListener("DOMContentLoaded", () => {
     };
 
     try {
-      const token = localStorage.getItem("access_token");
-      const response = await fetch("/ai/workout-plan", {
-        method: "POST",
-        headers: {
-          "Content-Type": "application/json",
-          Authorization: `Bearer ${token}`,
-        },
-        body: JSON.stringify(payload),
+      let streamedDays = 0;
+      const { ok, data } = await streamPlan(payload, (day) => {
+        if (streamedDays === 0) {
+          loading.style.display = "none";
+          startPlan();
+        }
+        streamedDays += 1;
+        appendDay(day);
       });
-
-      const data = await response.json();
       loading.style.display = "none";
       generateBtn.disabled = false;
 
-      if (!response.ok) {
+      if (!ok) {
         resultDiv.innerHTML = `<p style="color:red;">Error: ${data.error}</p>`;
         return;
       }
@@ -82,7 +168,8 @@ document.addEventListener("DOMContentLoaded", () => {
       localStorage.setItem("last_ai_plan_id", data.id);
 
 
-      displayPlan(data.plan);
+      // Days were already rendered as they streamed in, unless the final plan differs
+      if (streamedDays !== (data.plan.weekly_plan || []).length) displayPlan(data.plan);
       saveBtn.style.display = "inline-block";
       convertBtn.style.display = "inline-block";
     } catch (err) {
@@ -99,25 +186,16 @@ document.addEventListener("DOMContentLoaded", () => {
   saveBtn.addEventListener("click", async () => {
     if (!currentPlan) return alert("Generate a plan first!");
 
-    const token = localStorage.getItem("access_token");
     try {
-      const res = await fetch("/ai/workout-plan", {
-        method: "POST",
-        headers: {
-          "Content-Type": "application/json",
-          Authorization: "Bearer " + token,
-        },
-        body: JSON.stringify({
-          goal: document.getElementById("goal").value,
-          experience: document.getElementById("experience").value,
-          days_per_week: parseInt(document.getElementById("days_per_week").value),
-          equipment: document.getElementById("equipment").value,
-          injuries: document.getElementById("injuries").value,
-        }),
+      const { ok, data } = await requestPlan({
+        goal: document.getElementById("goal").value,
+        experience: document.getElementById("experience").value,
+        days_per_week: parseInt(document.getElementById("days_per_week").value),
+        equipment: document.getElementById("equipment").value,
+        injuries: document.getElementById("injuries").value,
       });
 
-      const data = await res.json();
-      if (res.ok) {
+      if (ok) {
         alert("✅ Plan saved successfully!");
       } else {
         alert("❌ " + (data.error || "Save failed."));
@@ -163,24 +241,38 @@ document.addEventListener("DOMContentLoaded", () => {
   // -----------------------------
   // DISPLAY PLAN
   // -----------------------------
-  function displayPlan(plan) {
+  function startPlan() {
     resultDiv.classList.remove("hidden");
-    resultDiv.style.opacity = "0";
-    resultDiv.style.transition = "opacity 0.6s ease";
+    resultDiv.style.opacity = "1";
+    resultDiv.innerHTML = `<h2 class="text-2xl font-bold text-slate-900 dark:text-white mb-4">Your Weekly Plan</h2>`;
+  }
 
-    let html = `<h2 class="text-2xl font-bold text-slate-900 dark:text-white mb-4">Your Weekly Plan</h2>`;
-    plan.weekly_plan.forEach((day) => {
-      html += `
+  function appendDay(day) {
+    resultDiv.insertAdjacentHTML("beforeend", dayHtml(day));
+  }
+
+  function dayHtml(day) {
+    return `
         <div class="p-4 bg-slate-200 dark:bg-slate-800 rounded-lg mb-3">
           <h3 class="font-bold text-lg text-slate-900 dark:text-white mb-2">${day.day} <span class="text-primary">— ${day.focus}</span></h3>
           <ul class="space-y-1 mb-3">
-            ${day.exercises
+            ${(day.exercises || [])
           .map((ex) => `<li class="text-slate-700 dark:text-slate-300 text-sm">• ${ex.name} <span class="text-slate-500">(${ex.sets} × ${ex.reps})</span></li>`)
           .join("")}
           </ul>
           <p class="text-sm text-slate-600 dark:text-slate-400"><strong>Warmup:</strong> ${day.warmup || "—"}</p>
           <p class="text-sm text-slate-600 dark:text-slate-400"><strong>Cooldown:</strong> ${day.cooldown || "—"}</p>
         </div>`;
+  }
+
+  function displayPlan(plan) {
+    resultDiv.classList.remove("hidden");
+    resultDiv.style.opacity = "0";
+    resultDiv.style.transition = "opacity 0.6s ease";
+
+    let html = `<h2 class="text-2xl font-bold text-slate-900 dark:text-white mb-4">Your Weekly Plan</h2>`;
+    plan.weekly_plan.forEach((day) => {
+      html += dayHtml(day);
     });
 
     resultDiv.innerHTML = html;
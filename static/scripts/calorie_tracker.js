@@ -54,28 +54,16 @@ document.querySelectorAll(".tab-btn").forEach(btn => {
 // =======================================
 // CALORIE TRACKER CORE
 // =======================================
-let dailyCalorieTarget = 2000;
-let caloriesConsumed = 0;
-let caloriesBurned = 0;
-let foodLog = [];
+// Food log state and loading live in food_log.js
 
 async function initCalorieTracker() {
     const dateEl = document.getElementById("calorie_date");
     if (dateEl) dateEl.textContent = new Date().toLocaleDateString();
 
-    // Load food log from localStorage
-    const savedLog = localStorage.getItem("todayFoodLog");
-    const savedDate = localStorage.getItem("foodLogDate");
-    const today = new Date().toDateString();
-
-    if (savedLog && savedDate === today) {
-        foodLog = JSON.parse(savedLog);
-        caloriesConsumed = foodLog.reduce((sum, f) => sum + (f.calories || 0), 0);
-    } else {
-        foodLog = [];
-        localStorage.setItem("todayFoodLog", "[]");
-        localStorage.setItem("foodLogDate", today);
-    }
+    // Upload any legacy entries first so today's totals include them, then load
+    // the entries and the bootstrap (target + totals) in parallel
+    await migrateLegacyFoodLog();
+    await Promise.all([loadFoodLog(), loadCalorieTarget()]);
 
     // Load burned calories from today's sessions
     const history = JSON.parse(localStorage.getItem("workoutHistory") || "[]");
@@ -84,22 +72,6 @@ async function initCalorieTracker() {
         .filter(h => new Date(h.date).toDateString() === todayStr)
         .reduce((sum, h) => sum + (h.caloriesBurned || 0), 0);
 
-    // Fetch personalized BMR target
-    const token = localStorage.getItem("access_token");
-    if (token) {
-        try {
-            const res = await fetch("/api/food/bmr", {
-                headers: { Authorization: `Bearer ${token}` }
-            });
-            if (res.ok) {
-                const data = await res.json();
-                dailyCalorieTarget = data.daily_target;
-            }
-        } catch (e) {
-            console.log("Could not fetch BMR, using default");
-        }
-    }
-
     updateCalorieDisplay();
     renderFoodLog();
 }
@@ -124,9 +96,9 @@ function updateCalorieDisplay() {
 }
 
 function updateMacroChart() {
-    const totalProtein = foodLog.reduce((sum, f) => sum + (f.protein || 0), 0);
-    const totalCarbs = foodLog.reduce((sum, f) => sum + (f.carbs || 0), 0);
-    const totalFat = foodLog.reduce((sum, f) => sum + (f.fat || 0), 0);
+    const totalProtein = foodTotals.protein || 0;
+    const totalCarbs = foodTotals.carbs || 0;
+    const totalFat = foodTotals.fat || 0;
 
     const proteinEl = document.getElementById("totalProteinG");
     const carbsEl = document.getElementById("totalCarbsG");
@@ -198,29 +170,43 @@ function renderFoodLog() {
     updateMacroChart();
 }
 
-function addFoodToLog(food) {
-    foodLog.push(food);
-    caloriesConsumed += food.calories || 0;
-    localStorage.setItem("todayFoodLog", JSON.stringify(foodLog));
-    localStorage.setItem("foodLogDate", new Date().toDateString());
+async function addFoodToLog(food) {
+    try {
+        const res = await fetch("/food-log", {
+            method: "POST",
+            headers: foodLogHeaders(),
+            body: JSON.stringify({ ...food, day: localDay() })
+        });
+        if (!res.ok) throw new Error("Failed to log food");
+        const data = await res.json();
+        foodLog.push(...data.entries);
+        data.entries.forEach(entry => adjustFoodTotals(entry, 1));
+    } catch (e) {
+        alert("Could not add food to your log");
+        return;
+    }
     updateCalorieDisplay();
     renderFoodLog();
 }
 
-window.removeFoodFromLog = function (idx) {
-    const removed = foodLog.splice(idx, 1)[0];
-    caloriesConsumed -= removed.calories || 0;
-    localStorage.setItem("todayFoodLog", JSON.stringify(foodLog));
+window.removeFoodFromLog = async function (idx) {
+    const food = foodLog[idx];
+    if (!food) return;
+    const res = await fetch(`/food-log/${food.id}`, { method: "DELETE", headers: foodLogHeaders() });
+    if (!res.ok && res.status !== 404) return;
+    foodLog.splice(idx, 1);
+    adjustFoodTotals(food, -1);
     updateCalorieDisplay();
     renderFoodLog();
 };
 
 // Clear all food log
-document.getElementById("clearFoodLog")?.addEventListener("click", () => {
+document.getElementById("clearFoodLog")?.addEventListener("click", async () => {
     if (confirm("Clear all foods from today's log?")) {
+        const res = await fetch(`/food-log?day=${localDay()}`, { method: "DELETE", headers: foodLogHeaders() });
+        if (!res.ok) return;
         foodLog = [];
-        caloriesConsumed = 0;
-        localStorage.setItem("todayFoodLog", "[]");
+        setFoodTotals({ calories: 0, protein: 0, carbs: 0, fat: 0 });
         updateCalorieDisplay();
         renderFoodLog();
     }
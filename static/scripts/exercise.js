@@ -28,7 +28,7 @@ async function loadExercises() {
         card.className = "exercise-card";
 
         card.innerHTML = `
-            <img src="${ex.gifUrl}">
+            <img src="${ex.gifUrl}" loading="lazy">
             <h3>${ex.name}</h3>
             <p><strong>Body:</strong> ${ex.bodyPart}</p>
             <p><strong>Target:</strong> ${ex.target}</p>
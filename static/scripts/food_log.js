@@ -0,0 +1,93 @@
+/**
+ * Food Log (shared)
+ * Today's server-side food log and calorie target, used by the dashboard
+ * (main_page.js) and the calorie tracker page (calorie_tracker.js).
+ * Include it before either page script.
+ */
+
+// =======================================
+// STATE
+// =======================================
+let dailyCalorieTarget = 2000;
+let caloriesConsumed = 0;
+let caloriesBurned = 0;
+let foodLog = [];
+let foodTotals = { calories: 0, protein: 0, carbs: 0, fat: 0 };
+
+// The user's local calendar day (of `date`, default now) as YYYY-MM-DD
+function localDay(date = new Date()) {
+    return date.toLocaleDateString("en-CA");
+}
+
+function foodLogHeaders() {
+    const token = localStorage.getItem("access_token");
+    return { "Content-Type": "application/json", Authorization: `Bearer ${token}` };
+}
+
+function setFoodTotals(totals) {
+    foodTotals = totals;
+    caloriesConsumed = Math.round(totals.calories || 0);
+}
+
+function adjustFoodTotals(food, sign) {
+    const totals = { ...foodTotals };
+    for (const key of ["calories", "protein", "carbs", "fat"]) {
+        totals[key] = (totals[key] || 0) + sign * (food[key] || 0);
+    }
+    setFoodTotals(totals);
+}
+
+// =======================================
+// LOADING
+// =======================================
+// Move any entries still kept by older versions of the pages into the server log
+async function migrateLegacyFoodLog() {
+    if (!localStorage.getItem("access_token")) return;
+    try {
+        const legacyLog = JSON.parse(localStorage.getItem("todayFoodLog") || "[]");
+        let migrated = true;
+        if (legacyLog.length && localStorage.getItem("foodLogDate") === new Date().toDateString()) {
+            const res = await fetch("/food-log", {
+                method: "POST",
+                headers: foodLogHeaders(),
+                body: JSON.stringify({ day: localDay(), entries: legacyLog })
+            });
+            migrated = res.ok;
+        }
+        if (migrated) {
+            localStorage.removeItem("todayFoodLog");
+            localStorage.removeItem("foodLogDate");
+        }
+    } catch (e) {
+        console.log("Could not upload the local food log");
+    }
+}
+
+// Today's entries; the totals come with the dashboard bootstrap (loadCalorieTarget)
+async function loadFoodLog() {
+    if (!localStorage.getItem("access_token")) return;
+    try {
+        const res = await fetch(`/food-log?day=${localDay()}`, { headers: foodLogHeaders() });
+        if (res.ok) {
+            const data = await res.json();
+            foodLog = data.entries;
+        }
+    } catch (e) {
+        console.log("Could not load food log");
+    }
+}
+
+async function loadCalorieTarget() {
+    if (!localStorage.getItem("access_token")) return;
+    try {
+        const res = await fetch(`/dashboard/bootstrap?day=${localDay()}&recent=0`, { headers: foodLogHeaders() });
+        if (res.ok) {
+            const data = await res.json();
+            dailyCalorieTarget = data.energy.daily_target;
+            // Pre-aggregated daily_nutrition totals, so nothing is summed in the browser
+            setFoodTotals(data.today.nutrition);
+        }
+    } catch (e) {
+        console.log("Could not fetch calorie target, using default");
+    }
+}
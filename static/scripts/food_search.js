@@ -204,37 +204,36 @@ document.getElementById("cancelServing")?.addEventListener("click", () => {
     servingModal?.classList.remove("flex");
 });
 
-document.getElementById("confirmServing")?.addEventListener("click", () => {
+document.getElementById("confirmServing")?.addEventListener("click", async () => {
     if (!selectedFood) return;
 
     const amount = parseFloat(servingAmount?.value) || 100;
     const baseServing = selectedFood.serving || 100;
     const multiplier = amount / baseServing;
 
-    // Add to food log in localStorage
-    const today = new Date().toDateString();
-    let foodLog = JSON.parse(localStorage.getItem("todayFoodLog") || "[]");
-    const savedDate = localStorage.getItem("foodLogDate");
-
-    if (savedDate !== today) {
-        foodLog = [];
-        localStorage.setItem("foodLogDate", today);
+    // Add to the server-side food log for the user's local day
+    const token = localStorage.getItem("access_token");
+    try {
+        const res = await fetch("/food-log", {
+            method: "POST",
+            headers: { "Content-Type": "application/json", Authorization: `Bearer ${token}` },
+            body: JSON.stringify({
+                day: new Date().toLocaleDateString("en-CA"),
+                name: selectedFood.food_name,
+                calories: Math.round(selectedFood.calories * multiplier),
+                serving: `${amount}g`,
+                protein: Math.round(selectedFood.protein * multiplier * 10) / 10,
+                carbs: Math.round(selectedFood.carbs * multiplier * 10) / 10,
+                fat: Math.round(selectedFood.fat * multiplier * 10) / 10
+            })
+        });
+        if (!res.ok) throw new Error("Failed to log food");
+        alert(`Added ${selectedFood.food_name} (${amount}g) to your food log!`);
+    } catch (e) {
+        alert("Could not add food to your log");
     }
 
-    foodLog.push({
-        name: selectedFood.food_name,
-        calories: Math.round(selectedFood.calories * multiplier),
-        serving: `${amount}g`,
-        protein: Math.round(selectedFood.protein * multiplier * 10) / 10,
-        carbs: Math.round(selectedFood.carbs * multiplier * 10) / 10,
-        fat: Math.round(selectedFood.fat * multiplier * 10) / 10
-    });
-
-    localStorage.setItem("todayFoodLog", JSON.stringify(foodLog));
-
-    // Show success message
-    alert(`Added ${selectedFood.food_name} (${amount}g) to your food log!`);
-
     servingModal?.classList.add("hidden");
     servingModal?.classList.remove("flex");
 });
+
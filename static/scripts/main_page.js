@@ -53,10 +53,7 @@ function userHasGoal() {
 // =======================================
 // CALORIE TRACKER
 // =======================================
-let dailyCalorieTarget = 2000;
-let caloriesConsumed = 0;
-let caloriesBurned = 0;
-let foodLog = [];
+// Food log state and loading live in food_log.js
 
 // Initialize calorie tracker on page load
 async function initCalorieTracker() {
@@ -64,20 +61,10 @@ async function initCalorieTracker() {
   const dateEl = document.getElementById("calorie_date");
   if (dateEl) dateEl.textContent = new Date().toLocaleDateString();
 
-  // Load food log from localStorage
-  const savedLog = localStorage.getItem("todayFoodLog");
-  const savedDate = localStorage.getItem("foodLogDate");
-  const today = new Date().toDateString();
-
-  if (savedLog && savedDate === today) {
-    foodLog = JSON.parse(savedLog);
-    caloriesConsumed = foodLog.reduce((sum, f) => sum + (f.calories || 0), 0);
-  } else {
-    // New day, reset log
-    foodLog = [];
-    localStorage.setItem("todayFoodLog", "[]");
-    localStorage.setItem("foodLogDate", today);
-  }
+  // Upload any legacy entries first so today's totals include them, then load
+  // the entries and the bootstrap (target + totals) in parallel
+  await migrateLegacyFoodLog();
+  await Promise.all([loadFoodLog(), loadCalorieTarget()]);
 
   // Load burned calories from today's sessions
   const history = JSON.parse(localStorage.getItem("workoutHistory") || "[]");
@@ -86,22 +73,6 @@ async function initCalorieTracker() {
     .filter(h => new Date(h.date).toDateString() === todayStr)
     .reduce((sum, h) => sum + (h.caloriesBurned || 0), 0);
 
-  // Fetch personalized BMR target
-  const token = localStorage.getItem("access_token");
-  if (token) {
-    try {
-      const res = await fetch("/api/food/bmr", {
-        headers: { Authorization: `Bearer ${token}` }
-      });
-      if (res.ok) {
-        const data = await res.json();
-        dailyCalorieTarget = data.daily_target;
-      }
-    } catch (e) {
-      console.log("Could not fetch BMR, using default");
-    }
-  }
-
   updateCalorieDisplay();
   renderFoodLog();
 }
@@ -127,9 +98,9 @@ function updateCalorieDisplay() {
 }
 
 function updateMacroChart() {
-  const totalProtein = foodLog.reduce((sum, f) => sum + (f.protein || 0), 0);
-  const totalCarbs = foodLog.reduce((sum, f) => sum + (f.carbs || 0), 0);
-  const totalFat = foodLog.reduce((sum, f) => sum + (f.fat || 0), 0);
+  const totalProtein = foodTotals.protein || 0;
+  const totalCarbs = foodTotals.carbs || 0;
+  const totalFat = foodTotals.fat || 0;
 
   // Update text displays
   const proteinEl = document.getElementById("totalProteinG");
@@ -209,19 +180,32 @@ function renderFoodLog() {
   updateMacroChart();
 }
 
-function addFoodToLog(food) {
-  foodLog.push(food);
-  caloriesConsumed += food.calories || 0;
-  localStorage.setItem("todayFoodLog", JSON.stringify(foodLog));
-  localStorage.setItem("foodLogDate", new Date().toDateString());
+async function addFoodToLog(food) {
+  try {
+    const res = await fetch("/food-log", {
+      method: "POST",
+      headers: foodLogHeaders(),
+      body: JSON.stringify({ ...food, day: localDay() })
+    });
+    if (!res.ok) throw new Error("Failed to log food");
+    const data = await res.json();
+    foodLog.push(...data.entries);
+    data.entries.forEach(entry => adjustFoodTotals(entry, 1));
+  } catch (e) {
+    alert("Could not add food to your log");
+    return;
+  }
   updateCalorieDisplay();
   renderFoodLog();
 }
 
-window.removeFoodFromLog = function (idx) {
-  const removed = foodLog.splice(idx, 1)[0];
-  caloriesConsumed -= removed.calories || 0;
-  localStorage.setItem("todayFoodLog", JSON.stringify(foodLog));
+window.removeFoodFromLog = async function (idx) {
+  const food = foodLog[idx];
+  if (!food) return;
+  const res = await fetch(`/food-log/${food.id}`, { method: "DELETE", headers: foodLogHeaders() });
+  if (!res.ok && res.status !== 404) return;
+  foodLog.splice(idx, 1);
+  adjustFoodTotals(food, -1);
   updateCalorieDisplay();
   renderFoodLog();
 };
@@ -670,7 +654,7 @@ async function setupWorkoutSearch() {
         const card = document.createElement("div");
         card.className = "flex items-start gap-4 p-3 bg-slate-200 dark:bg-slate-800 rounded-lg";
         card.innerHTML = `
-          <img src="${ex.gifUrl}" class="w-16 h-16 rounded-lg object-cover flex-shrink-0" alt="${ex.name}">
+          <img src="${ex.posterUrl || ex.gifUrl}" loading="lazy" class="w-16 h-16 rounded-lg object-cover flex-shrink-0" alt="${ex.name}">
           <div class="flex-1 min-w-0">
             <p class="font-semibold text-slate-900 dark:text-white truncate">${ex.name}</p>
             <p class="text-xs text-slate-500 dark:text-slate-400 mt-1">${(ex.targetMuscles || []).join(", ")}</p>
@@ -706,7 +690,7 @@ async function loadUserWorkouts() {
   if (!token) return;
 
   try {
-    const res = await fetch("/workout/all", {
+    const res = await fetch("/workout/all?fields=id,title,category,details", {
       headers: { Authorization: `Bearer ${token}` },
     });
     const data = await res.json();
@@ -879,6 +863,9 @@ function loadWorkoutHistory() {
 
   const history = JSON.parse(localStorage.getItem("workoutHistory") || "[]");
 
+  const syncBtn = document.getElementById("btn_sync_history");
+  if (syncBtn) syncBtn.onclick = syncHistoryToProfile;
+
   if (clearBtn) {
     clearBtn.onclick = () => {
       if (confirm("Are you sure you want to clear your workout history?")) {
@@ -1039,49 +1026,137 @@ function deleteHistoryEntry(entryId) {
 // =======================================
 // SAVE TO PROFILE (Server-side)
 // =======================================
-async function saveToProfile(entry) {
+function historyPayload(entry) {
+  return {
+    // Stable per local entry, so retries and re-syncs never save it twice
+    client_id: `local-${entry.id}`,
+    workout_name: entry.name || "Workout",
+    duration_seconds: entry.durationSeconds || 0,
+    exercises: entry.exercises || [],
+    progress_photo: entry.progressPhoto || null,
+    completed_at: entry.date || new Date().toISOString(),
+    // Stats count the workout on the user's local day, like the food log
+    day: localDay(entry.date ? new Date(entry.date) : new Date()),
+    total_volume: entry.totalVolume || 0,
+    total_sets: entry.totalSets || 0,
+    total_reps: entry.totalReps || 0
+  };
+}
+
+// Upload local entries in one request; returns the per-entry results
+async function uploadHistory(entries) {
   const token = localStorage.getItem("access_token");
   if (!token) {
     alert("Please log in to save workouts to your profile.");
     window.location.href = "/";
-    return;
+    return null;
   }
 
-  try {
-    const response = await fetch("/profile/history", {
-      method: "POST",
-      headers: {
-        "Content-Type": "application/json",
-        Authorization: `Bearer ${token}`
-      },
-      body: JSON.stringify({
-        workout_name: entry.name || "Workout",
-        duration_seconds: entry.durationSeconds || 0,
-        exercises: entry.exercises || [],
-        progress_photo: entry.progressPhoto || null,
-        completed_at: entry.date || new Date().toISOString(),
-        total_volume: entry.totalVolume || 0,
-        total_sets: entry.totalSets || 0,
-        total_reps: entry.totalReps || 0
-      })
-    });
+  const response = await fetch("/profile/history/batch", {
+    method: "POST",
+    headers: {
+      "Content-Type": "application/json",
+      Authorization: `Bearer ${token}`
+    },
+    body: JSON.stringify({ entries: entries.map(historyPayload) })
+  });
 
-    if (response.ok) {
-      alert("Workout saved to your profile! View it on your Profile page.");
-    } else if (response.status === 401 || response.status === 422) {
-      // JWT token expired or invalid
-      alert("Your session has expired. Please log in again.");
-      localStorage.removeItem("access_token");
-      window.location.href = "/";
+  if (response.status === 401 || response.status === 422) {
+    // JWT token expired or invalid
+    alert("Your session has expired. Please log in again.");
+    localStorage.removeItem("access_token");
+    window.location.href = "/";
+    return null;
+  }
+  const data = await response.json();
+  if (!response.ok) throw new Error(data.error || "Failed to save workouts");
+
+  // Remember which local entries the server has
+  const saved = new Set(
+    data.results.filter((r) => r.status !== "invalid").map((r) => r.client_id)
+  );
+  const history = JSON.parse(localStorage.getItem("workoutHistory") || "[]");
+  history.forEach((e) => {
+    if (saved.has(`local-${e.id}`)) e.synced = true;
+  });
+  localStorage.setItem("workoutHistory", JSON.stringify(history));
+  return data.results;
+}
+
+async function saveToProfile(entry) {
+  try {
+    const results = await uploadHistory([entry]);
+    if (!results) return;
+    if (results[0].status === "invalid") {
+      alert(results[0].error || "Failed to save workout");
     } else {
-      const data = await response.json();
-      alert(data.error || "Failed to save workout");
+      alert("Workout saved to your profile! View it on your Profile page.");
     }
   } catch (err) {
     console.error("Error saving to profile:", err);
     alert("Error saving workout to profile");
   }
 }
+
+// Same workout: name plus completion time to the second (the server drops the "Z")
+function historyMatchKey(name, completedAt) {
+  const iso = /[zZ]|[+-]\d\d:\d\d$/.test(completedAt) ? completedAt : `${completedAt}Z`;
+  return `${name || "Workout"}|${Math.floor(Date.parse(iso) / 1000)}`;
+}
+
+// Entries saved before client ids existed carry no synced flag; mark the ones the
+// profile already has, once, so the first sync doesn't upload them again
+async function markLegacyEntriesSynced() {
+  if (localStorage.getItem("historySyncChecked")) return true;
+  const token = localStorage.getItem("access_token");
+  if (!token) return true;
+
+  const response = await fetch("/profile/history?fields=workout_name,completed_at", {
+    headers: { Authorization: `Bearer ${token}` }
+  });
+  if (!response.ok) return false;
+  const saved = new Set(
+    (await response.json()).map((h) => historyMatchKey(h.workout_name, h.completed_at))
+  );
+  const history = JSON.parse(localStorage.getItem("workoutHistory") || "[]");
+  history.forEach((e) => {
+    if (!e.synced && e.date && saved.has(historyMatchKey(e.name, e.date))) e.synced = true;
+  });
+  localStorage.setItem("workoutHistory", JSON.stringify(history));
+  localStorage.setItem("historySyncChecked", "1");
+  return true;
+}
+
+// Sync every local session the profile doesn't have yet (small batches: entries may carry photos)
+async function syncHistoryToProfile() {
+  try {
+    if (!(await markLegacyEntriesSynced())) throw new Error("Could not load profile history");
+  } catch (err) {
+    console.error("Error checking saved history:", err);
+    alert("Error syncing workouts to profile");
+    return;
+  }
+  const pending = JSON.parse(localStorage.getItem("workoutHistory") || "[]").filter((e) => !e.synced);
+  if (!pending.length) {
+    alert("All workouts are already saved to your profile.");
+    return;
+  }
+
+  try {
+    let created = 0;
+    for (let i = 0; i < pending.length; i += 25) {
+      const results = await uploadHistory(pending.slice(i, i + 25));
+      if (!results) return;
+      created += results.filter((r) => r.status === "created").length;
+    }
+    alert(`Synced ${created} workout${created === 1 ? "" : "s"} to your profile.`);
+    loadWorkoutHistory();
+  } catch (err) {
+    console.error("Error syncing history:", err);
+    alert("Error syncing workouts to profile");
+  }
+}
+
 // =======================================
 // PHOTO LIGHTBOX
 // =======================================
@@ -81,7 +81,9 @@ async function loadSavedHistory() {
     if (!token) return;
 
     try {
-        const response = await fetch("/profile/history", {
+        // Only the columns the list renders (skips created_at, set/rep totals)
+        const fields = "id,workout_name,duration_seconds,exercises,progress_photo,progress_photo_thumb,completed_at,total_volume";
+        const response = await fetch(`/profile/history?fields=${fields}`, {
             headers: { Authorization: `Bearer ${token}` }
         });
 
@@ -161,7 +163,7 @@ function renderSavedHistory(history) {
             </div>
             ${entry.progress_photo ? `
                 <div class="w-20 h-20 rounded-lg overflow-hidden cursor-pointer flex-shrink-0" onclick="openPhotoLightbox('${entry.progress_photo}')">
-                    <img src="${entry.progress_photo}" alt="Progress" class="w-full h-full object-cover hover:scale-110 transition" />
+                    <img src="${entry.progress_photo_thumb || entry.progress_photo}" alt="Progress" class="w-full h-full object-cover hover:scale-110 transition" />
                 </div>
             ` : ""}
             <div class="flex flex-col gap-2 self-start">
@@ -201,7 +203,7 @@ async function useInSession(id) {
     const token = getToken();
     try {
         // Get saved history to find the entry
-        const response = await fetch('/profile/history', {
+        const response = await fetch('/profile/history?fields=id,workout_name,exercises', {
             headers: { Authorization: `Bearer ${token}` }
         });
 
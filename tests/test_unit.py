@@ -25,6 +25,12 @@ def app():
         db.create_all()
         yield flask_app
         db.drop_all()
+    from identity import identity_cache
+    from exercise_catalog import catalog
+    from exercise_media import failed_fetches
+    identity_cache.clear()
+    catalog.clear()
+    failed_fetches.clear()
 
 
 @pytest.fixture
@@ -126,5 +132,1316 @@ class TestWorkoutEndpoints:
         assert response.status_code in [401, 422]
 
 
+class TestPlanJobs:
+    """Test background AI workout plan generation."""
+
+    class InlineExecutor:
+        def submit(self, fn, *args):
+            fn(*args)
+
+    @pytest.fixture
+    def auth_headers(self, app):
+        from flask_jwt_extended import create_access_token
+        return {"Authorization": f"Bearer {create_access_token(identity='1')}"}
+
+    def test_post_returns_job_and_poll_returns_plan(self, client, auth_headers, monkeypatch):
+        """Test the POST queues a job whose result is the saved plan."""
+        import ai_plans
+
+        fake = ai_plans.FakePlanClient('```json\n{"weekly_plan": [{"day": "Monday", "exercises": []}]}\n```')
+        monkeypatch.setattr(ai_plans, "plan_client", fake)
+        monkeypatch.setattr(ai_plans, "plan_executor", self.InlineExecutor())
+
+        response = client.post("/ai/workout-plan", headers=auth_headers, json={
+            "goal": "strength", "experience": "beginner", "days_per_week": 3,
+        })
+        assert response.status_code == 202
+        job = response.get_json()
+
+        status = client.get(f"/ai/workout-plan/jobs/{job['job_id']}", headers=auth_headers).get_json()
+        assert status["status"] == "done"
+        assert status["result"]["plan"]["weekly_plan"][0]["day"] == "Monday"
+        assert fake.calls == 1
+
+        # ?wait=1 keeps the pre-job response: 201 with the saved plan
+        waited = client.post("/ai/workout-plan?wait=1&fresh=true", headers=auth_headers, json={
+            "goal": "strength", "experience": "beginner", "days_per_week": 3,
+        })
+        assert waited.status_code == 201
+        assert waited.get_json()["plan"]["weekly_plan"][0]["day"] == "Monday" and "id" in waited.get_json()
+
+    def test_failed_generation_is_reported(self, client, auth_headers, monkeypatch):
+        """Test an unparseable reply marks the job failed."""
+        import ai_plans
+
+        monkeypatch.setattr(ai_plans, "plan_client", ai_plans.FakePlanClient("not json"))
+        monkeypatch.setattr(ai_plans, "plan_executor", self.InlineExecutor())
+
+        job = client.post("/ai/workout-plan", headers=auth_headers, json={
+            "goal": "strength", "experience": "beginner", "days_per_week": 3,
+        }).get_json()
+        status = client.get(f"/ai/workout-plan/jobs/{job['job_id']}", headers=auth_headers).get_json()
+        assert status["status"] == "failed"
+        assert status["error"]
+
+
+class TestPlanTemplateCache:
+    """Test the content-addressed AI plan cache."""
+
+    PARAMS = {"goal": "Build Muscle", "experience": "beginner", "days_per_week": 3,
+              "equipment": "Dumbbells, bench", "injuries": ""}
+
+    @pytest.fixture
+    def auth_headers(self, app):
+        from flask_jwt_extended import create_access_token
+        return {"Authorization": f"Bearer {create_access_token(identity='1')}"}
+
+    def test_equivalent_inputs_share_a_key(self):
+        """Test case, whitespace and list order don't change the key."""
+        from ai_plans import plan_params_key
+
+        same = {"goal": " build  muscle", "experience": "Beginner", "days_per_week": "3",
+                "equipment": "bench,dumbbells", "injuries": "None"}
+        assert plan_params_key(self.PARAMS) == plan_params_key(same)
+        assert plan_params_key(self.PARAMS) != plan_params_key(dict(same, days_per_week=4))
+
+    def test_repeat_request_is_served_from_cache(self, client, auth_headers, monkeypatch):
+        """Test a cache hit skips the LLM unless fresh=true."""
+        import ai_plans
+
+        fake = ai_plans.FakePlanClient('{"weekly_plan": [{"day": "Monday"}]}')
+        monkeypatch.setattr(ai_plans, "plan_client", fake)
+        monkeypatch.setattr(ai_plans, "plan_executor", TestPlanJobs.InlineExecutor())
+
+        first = client.post("/ai/workout-plan", headers=auth_headers, json=self.PARAMS).get_json()
+        second = client.post("/ai/workout-plan", headers=auth_headers, json=self.PARAMS).get_json()
+        assert fake.calls == 1
+        assert second["status"] == "done"
+        assert second["job_id"] != first["job_id"]
+
+        client.post("/ai/workout-plan?fresh=true", headers=auth_headers, json=self.PARAMS)
+        assert fake.calls == 2
+
+    def test_variants_are_capped(self, app):
+        """Test the least recently used variant is evicted once a key is full."""
+        from ai_plans import PlanTemplateCache
+        from models import PlanTemplate
+
+        cache = PlanTemplateCache(variants=2)
+        for i in range(3):
+            cache.store(self.PARAMS, {"weekly_plan": [{"day": f"v{i}"}]})
+
+        assert PlanTemplate.query.count() == 2
+        assert cache.lookup(self.PARAMS)["weekly_plan"][0]["day"] in ("v1", "v2")
+
+
+class TestPlanStreaming:
+    """Test the server-sent-events plan endpoint."""
+
+    PLAN = {"weekly_plan": [
+        {"day": "Monday", "focus": "Push {upper}", "exercises": [{"name": "Push-ups", "sets": 3, "reps": "8"}]},
+        {"day": "Wednesday", "focus": "Legs", "exercises": []},
+    ]}
+
+    def test_parser_emits_days_as_they_complete(self):
+        """Test a day is emitted once its closing brace arrives."""
+        import json
+        from ai_plans import PlanDayParser
+
+        text = json.dumps(self.PLAN)
+        split = text.index("Wednesday")
+        parser = PlanDayParser()
+        first = parser.feed(text[:split])
+        rest = parser.feed(text[split:])
+
+        assert [d["day"] for d in first] == ["Monday"]
+        assert [d["day"] for d in rest] == ["Wednesday"]
+        assert parser.result() == self.PLAN
+
+    def test_job_events_send_days_then_done(self, client, monkeypatch):
+        """Test the job streams days onto its row and its event stream forwards them."""
+        import json
+        import ai_plans
+        from models import db, PlanJob
+        from flask_jwt_extended import create_access_token
+
+        fake = ai_plans.FakePlanClient(json.dumps(self.PLAN), chunk_size=7)
+        monkeypatch.setattr(ai_plans, "plan_client", fake)
+        monkeypatch.setattr(ai_plans, "plan_executor", TestPlanJobs.InlineExecutor())
+        headers = {"Authorization": f"Bearer {create_access_token(identity='1')}"}
+        payload = {"goal": "strength", "experience": "beginner", "days_per_week": 2}
+
+        job = client.post("/ai/workout-plan", headers=headers, json=payload).get_json()
+        assert db.session.get(PlanJob, job["job_id"]).days == self.PLAN["weekly_plan"]
+        response = client.get(f"/ai/workout-plan/jobs/{job['job_id']}/events", headers=headers)
+        body = response.get_data(as_text=True)
+
+        assert response.mimetype == "text/event-stream"
+        assert body.count("event: day") == 2
+        done = json.loads(body.split("event: done\ndata: ")[1])
+        assert done["plan"] == self.PLAN
+        saved = client.get(f"/workout-plans/{done['id']}", headers=headers).get_json()
+        assert saved["plan"] == self.PLAN
+
+        # A reconnect resumes after the days the client already has
+        resumed = client.get(f"/ai/workout-plan/jobs/{job['job_id']}/events",
+                             headers=dict(headers, **{"Last-Event-ID": "1"})).get_data(as_text=True)
+        assert resumed.count("event: day") == 1 and "id: 2\nevent: day" in resumed and "event: done" in resumed
+        assert fake.calls == 1
+
+    def test_stream_closes_after_its_window(self, client, monkeypatch):
+        """Test a stream for an unfinished job ends after PLAN_EVENTS_WINDOW instead of holding the thread."""
+        import ai_plans
+        from flask_jwt_extended import create_access_token
+
+        monkeypatch.setattr(ai_plans, "plan_client", ai_plans.FakePlanClient("{}"))
+        monkeypatch.setattr(ai_plans, "plan_executor", type("Idle", (), {"submit": lambda self, *args: None})())
+        monkeypatch.setattr(ai_plans, "PLAN_EVENTS_WINDOW", 0)
+        headers = {"Authorization": f"Bearer {create_access_token(identity='1')}"}
+
+        job = client.post("/ai/workout-plan", headers=headers, json={
+            "goal": "strength", "experience": "beginner", "days_per_week": 2}).get_json()
+        body = client.get(f"/ai/workout-plan/jobs/{job['job_id']}/events", headers=headers).get_data(as_text=True)
+        assert body.startswith("retry: 1000") and "event: status" in body
+        assert "event: done" not in body and "event: error" not in body
+
+
+class TestIndexAudit:
+    """Test the EXPLAIN-based index audit."""
+
+    def test_hot_queries_use_indexes(self, app):
+        """Test no audited query plans a full scan."""
+        from models import db
+        from explain_audit import run_audit
+
+        flagged = [r for r in run_audit(db.engine) if r["problems"]]
+        assert flagged == []
+
+    def test_missing_index_is_flagged(self, app):
+        """Test dropping an index makes its query show up."""
+        from sqlalchemy import text
+        from models import db
+        from explain_audit import run_audit
+
+        with db.engine.begin() as conn:
+            conn.execute(text("DROP INDEX ix_workouts_user_id_id"))
+        db.engine.dispose()  # pooled SQLite connections keep prepared statements for the old schema
+        flagged = {r["name"] for r in run_audit(db.engine) if r["problems"]}
+        assert flagged == {"workout.get_all_workouts"}
+
+
+class TestIdentityCache:
+    """Test the cached JWT identity lookup."""
+
+    def _user(self, app):
+        from models import db, User
+        user = User(username="ana")
+        user.set_password("secret")
+        db.session.add(user)
+        db.session.commit()
+        return user.id
+
+    def _get(self, client, url, headers):
+        """GET as a fresh request: the fixture's app context otherwise keeps flask.g between requests."""
+        from flask import g
+        g.pop("identity", None)
+        return client.get(url, headers=headers)
+
+    def test_user_is_loaded_once(self, app, client):
+        """Test /auth/me, /profile and /api/food/bmr share one joined user load plus stamp checks."""
+        from sqlalchemy import event
+        from flask_jwt_extended import create_access_token
+        from models import db
+
+        user_id = self._user(app)
+        headers = {"Authorization": f"Bearer {create_access_token(identity=str(user_id))}"}
+        assert client.get("/profile", headers=headers).status_code == 200  # creates the profile
+
+        statements = []
+        event.listen(db.engine, "before_cursor_execute", lambda conn, cursor, statement, *args: statements.append(statement))
+        assert self._get(client, "/auth/me", headers).get_json()["username"] == "ana"
+        assert self._get(client, "/profile", headers).get_json()["display_name"] == "ana"
+        assert self._get(client, "/api/food/bmr", headers).status_code == 200
+        loads = [s for s in statements if "user.username" in s]
+        assert len(loads) == 1 and "JOIN user_profiles" in loads[0], loads
+        stamps = [s for s in statements if "user" in s and s not in loads]
+        assert len(stamps) == 2 and all("user_profiles.updated_at" in s for s in stamps), stamps
+
+    def test_profile_changes_invalidate(self, app, client):
+        """Test profile and goal updates are visible on the next request."""
+        from flask_jwt_extended import create_access_token
+
+        user_id = self._user(app)
+        headers = {"Authorization": f"Bearer {create_access_token(identity=str(user_id))}"}
+        client.get("/profile", headers=headers)
+        client.put("/profile", headers=headers, json={"weight_kg": 80})
+        assert client.get("/profile", headers=headers).get_json()["weight_kg"] == 80
+        client.post("/api/food/set-goal", headers=headers, json={"daily_calorie_target": 2100})
+        assert client.get("/api/food/bmr", headers=headers).get_json()["daily_target"] == 2100
+
+    def test_writes_from_other_workers_are_seen(self, app, client):
+        """Test a profile UPDATE that skips invalidate() (another worker, energy refresh) is picked up."""
+        from flask_jwt_extended import create_access_token
+        from sqlalchemy import update
+        from models import db, UserProfile
+
+        user_id = self._user(app)
+        headers = {"Authorization": f"Bearer {create_access_token(identity=str(user_id))}"}
+        client.put("/profile", headers=headers, json={"weight_kg": 80})
+        assert self._get(client, "/profile", headers).get_json()["weight_kg"] == 80
+        db.session.execute(update(UserProfile).where(UserProfile.user_id == user_id).values(weight_kg=75))
+        db.session.commit()
+        assert self._get(client, "/profile", headers).get_json()["weight_kg"] == 75
+
+
+class TestDashboardBootstrap:
+    """Test the combined dashboard bootstrap endpoint."""
+
+    def test_bootstrap_combines_profile_energy_and_today(self, app, client):
+        """Test one call returns profile, energy, today's totals and recent workouts."""
+        from flask_jwt_extended import create_access_token
+        from models import db, User
+
+        user = User(username="bo")
+        user.set_password("secret")
+        db.session.add(user)
+        db.session.commit()
+        headers = {"Authorization": f"Bearer {create_access_token(identity=str(user.id))}"}
+        client.put("/profile", headers=headers, json={"weight_kg": 80, "height_cm": 180})
+        client.post("/food-log", headers=headers, json={"day": "2026-03-02", "name": "Oats", "calories": 300})
+        client.post("/profile/history", headers=headers, json={
+            "workout_name": "Push", "total_volume": 1000, "completed_at": "2026-03-02T10:00:00"})
+
+        data = client.get("/dashboard/bootstrap?day=2026-03-02", headers=headers).get_json()
+        assert data["profile"]["username"] == "bo"
+        assert data["energy"] == client.get("/api/food/bmr", headers=headers).get_json()
+        assert data["today"]["nutrition"]["calories"] == 300
+        assert data["today"]["training"]["total_volume"] == 1000
+        assert [w["workout_name"] for w in data["recent_workouts"]] == ["Push"]
+        assert "exercises" not in data["recent_workouts"][0]
+
+        client.post("/api/food/set-goal", headers=headers, json={"daily_calorie_target": 1900})
+        again = client.get("/dashboard/bootstrap?day=2026-03-02&recent=0", headers=headers).get_json()
+        assert (again["energy"]["daily_target"], again["recent_workouts"]) == (1900, [])
+
+
+class TestEnergyEngine:
+    """Test the energy target engine and its batch API."""
+
+    def _profiles(self):
+        from datetime import date
+        from types import SimpleNamespace
+        return [
+            SimpleNamespace(weight_kg=90, height_cm=180, date_of_birth=date(1990, 5, 1), gender="male",
+                            activity_level="moderate", goal_type="lose", target_weight_kg=80, goal_timeline_weeks=20,
+                            goal_rate_kg=0.5),
+            SimpleNamespace(weight_kg=55, height_cm=160, date_of_birth=None, gender="female",
+                            activity_level="sedentary", goal_type="lose", target_weight_kg=50, goal_timeline_weeks=5,
+                            goal_rate_kg=1.0),
+            SimpleNamespace(weight_kg=None, height_cm=None, date_of_birth=None, gender=None,
+                            activity_level=None, goal_type="gain", target_weight_kg=None, goal_timeline_weeks=None,
+                            goal_rate_kg=None),
+            SimpleNamespace(weight_kg=70, height_cm=175, date_of_birth=date(2000, 1, 1), gender="male",
+                            activity_level="active", goal_type="maintain", target_weight_kg=None, goal_timeline_weeks=None,
+                            goal_rate_kg=None),
+        ]
+
+    def test_goal_targets_match_goal_page(self):
+        """Test targets follow the calorie goal page rules."""
+        from datetime import date
+        from energy import goal_target
+
+        today = date(2026, 3, 2)
+        # 90kg/180cm/35y male, moderate: TDEE 1855 * 1.55 = 2875.25; 10kg in 20 weeks -> -500
+        assert [goal_target(p, today) for p in self._profiles()] == [2375, 1200, None, 2879]
+
+    def test_batch_matches_per_row(self):
+        """Test the NumPy batch API gives the per-row targets and trajectories."""
+        np = pytest.importorskip("numpy")
+        from datetime import date
+        from energy import goal_target, project_weight, profile_columns, batch_energy, project_weights
+
+        today = date(2026, 3, 2)
+        profiles = self._profiles()
+        columns = profile_columns(profiles, today)
+        result = batch_energy(columns)
+        assert [None if np.isnan(t) else t for t in result["target"].tolist()] == [goal_target(p, today) for p in profiles]
+
+        targets = np.where(np.isnan(result["target"]), result["tdee"], result["target"])
+        weights = project_weights(columns, targets, 30)
+        for profile, target, row in zip(profiles, targets.tolist(), weights.tolist()):
+            assert row == pytest.approx(project_weight(profile, target, 30, today))
+        assert weights[0, -1] == 80 and weights[0, 1] < 90
+
+    def test_refresh_updates_changed_targets(self, app):
+        """Test the bulk refresh rewrites stale targets for preset goals only."""
+        from datetime import date, datetime
+        from models import db, User, UserProfile
+        from energy import refresh_targets
+
+        for i, profile in enumerate(self._profiles()):
+            user = User(username=f"u{i}", password_hash="x")
+            db.session.add(user)
+            db.session.flush()
+            db.session.add(UserProfile(user_id=user.id, daily_calorie_target=2000, goal_set_at=datetime(2026, 1, 1),
+                                       goal_preset=True, **vars(profile)))
+        db.session.add(UserProfile(user_id=98, weight_kg=60, goal_type="maintain", daily_calorie_target=1800,
+                                   goal_set_at=datetime(2026, 1, 1), goal_preset=False))
+        db.session.add(UserProfile(user_id=99, weight_kg=60, daily_calorie_target=1500))
+        db.session.commit()
+
+        assert refresh_targets(batch_size=2, dry_run=True, today=date(2026, 3, 2)) == (4, 3)
+        assert refresh_targets(batch_size=2, vectorized=False, today=date(2026, 3, 2)) == (4, 3)
+        targets = [p.daily_calorie_target for p in UserProfile.query.order_by(UserProfile.user_id)]
+        assert targets == [2375, 1200, 2000, 2879, 1800, 1500]
+
+    def test_set_goal_keeps_rate_and_custom_targets(self, app, client):
+        """Test the rate chosen on the goal page survives weight changes and custom targets are not refreshed."""
+        from datetime import date
+        from flask_jwt_extended import create_access_token
+        from models import db, User, UserProfile
+        from energy import refresh_targets
+
+        headers = []
+        for name in ("steady", "custom"):
+            user = User(username=name)
+            user.set_password("secret")
+            db.session.add(user)
+            db.session.commit()
+            headers.append({"Authorization": f"Bearer {create_access_token(identity=str(user.id))}"})
+            client.put("/profile", headers=headers[-1], json={"weight_kg": 80, "height_cm": 180})
+        # 80 -> 70 kg over 20 weeks at the moderate preset, default age 25: TDEE 1805 * 1.55 = 2797.75 - 500
+        goal = {"goal_type": "lose", "target_weight_kg": 70, "goal_timeline_weeks": 20, "goal_rate": "moderate",
+                "activity_level": "moderate", "gender": "male", "daily_calorie_target": 2298}
+        client.post("/api/food/set-goal", headers=headers[0], json=goal)
+        client.post("/api/food/set-goal", headers=headers[1], json=dict(goal, goal_rate=None, daily_calorie_target=1900))
+        for h in headers:
+            client.put("/profile", headers=h, json={"weight_kg": 75})
+
+        assert refresh_targets(today=date(2026, 3, 2)) == (1, 1)
+        steady, custom = UserProfile.query.order_by(UserProfile.user_id)
+        # Still the 0.5 kg/week preset at 75 kg (5 kg left in 20 weeks would infer 0.25)
+        assert (steady.goal_rate_kg, steady.daily_calorie_target) == (0.5, 2220)
+        assert (custom.goal_preset, custom.daily_calorie_target) == (False, 1900)
+
+
+class TestExerciseCatalog:
+    """Test the local ExerciseDB mirror and its search index."""
+
+    EXERCISES = [
+        {"exerciseId": "a1", "name": "dumbbell biceps curl", "bodyParts": ["upper arms"], "targetMuscles": ["biceps"],
+         "equipments": ["dumbbell"], "secondaryMuscles": ["forearms"], "gifUrl": "https://example.com/a1.gif"},
+        {"exerciseId": "a2", "name": "barbell curl", "bodyParts": ["upper arms"], "targetMuscles": ["biceps"],
+         "equipments": ["barbell"], "secondaryMuscles": ["forearms"], "gifUrl": "https://example.com/a2.gif"},
+        {"exerciseId": "a3", "name": "dumbbell bench press", "bodyParts": ["chest"], "targetMuscles": ["pectorals"],
+         "equipments": ["dumbbell"], "secondaryMuscles": ["triceps"], "gifUrl": "https://example.com/a3.gif"},
+        {"exerciseId": "a4", "name": "hammer curl", "bodyParts": ["upper arms"], "targetMuscles": ["brachialis"],
+         "equipments": ["dumbbell"], "secondaryMuscles": ["biceps"], "gifUrl": "https://example.com/a4.gif"},
+    ]
+
+    def test_index_ranks_and_filters(self):
+        """Test prefix/plural matching, field-weighted ranking and exact filters."""
+        from exercise_catalog import ExerciseIndex
+
+        index = ExerciseIndex(self.EXERCISES)
+        names = lambda docs: [d["name"] for d in docs]
+        assert names(index.search("barbell curl")) == ["barbell curl"]
+        assert names(index.search("barbell curls")) == ["barbell curl"]
+        assert sorted(names(index.search("curls"))) == ["barbell curl", "dumbbell biceps curl", "hammer curl"]
+        # name > target muscle > secondary muscle
+        assert names(index.search("bicep")) == ["dumbbell biceps curl", "barbell curl", "hammer curl"]
+        assert names(index.search("dumb curl")) == ["dumbbell biceps curl", "hammer curl"]
+        assert names(index.search("curl", equipment="Dumbbell", target="biceps")) == ["dumbbell biceps curl"]
+        assert names(index.search("", body_part="chest")) == ["dumbbell bench press"]
+        assert index.search("squat") == []
+
+    def test_search_is_served_locally_after_sync(self, client, monkeypatch):
+        """Test searches use the mirror (no upstream calls) and a failed sync keeps it."""
+        import http_client
+        from flask_jwt_extended import create_access_token
+        from exercise_catalog import sync
+
+        def unreachable(*args, **kwargs):
+            raise ConnectionError("exercisedb.dev is down")
+
+        assert sync(self.EXERCISES) == 4
+        monkeypatch.setattr(http_client, "get", unreachable)
+        headers = {"Authorization": f"Bearer {create_access_token(identity='1')}"}
+
+        results = client.get("/api/exercises/search?q=curl&equipment=barbell", headers=headers).get_json()
+        assert [(r["name"], r["bodyPart"]) for r in results] == [("barbell curl", "upper arms")]
+        results = client.get("/api/exercises/search?bodyPart=upper%20arms", headers=headers).get_json()
+        assert len(results) == 3
+
+        with pytest.raises(RuntimeError):
+            sync([])
+        with pytest.raises(ConnectionError):
+            sync()
+        results = client.get("/api/exercises/search?q=bench", headers=headers).get_json()
+        assert [r["name"] for r in results] == ["dumbbell bench press"]
+
+
+class TestExerciseMedia:
+    """Test the caching proxy for exercise GIFs."""
+
+    GIF_URL = "https://static.exercisedb.dev/media/a1.gif"
+    MISSING_URL = "https://static.exercisedb.dev/media/zz.gif"
+
+    @pytest.fixture
+    def upstream(self, app, tmp_path, monkeypatch):
+        """Catalogue GIF_URL and MISSING_URL, serve GIF_URL from memory and count the downloads."""
+        import http_client
+        import blob_store
+        import exercise_media
+        from exercise_catalog import sync
+        monkeypatch.setattr(blob_store.blob_store, "root", str(tmp_path))
+        monkeypatch.setattr(exercise_media, "transcode_pool", None)  # tests transcode explicitly
+        sync([{"exerciseId": "a1", "name": "barbell curl", "gifUrl": self.GIF_URL},
+              {"exerciseId": "zz", "name": "zottman curl", "gifUrl": self.MISSING_URL}])
+        files = {self.GIF_URL: self.animated_gif()}
+        calls = []
+
+        class FakeResponse:
+            def __init__(self, data):
+                self.status_code = 200 if data else 404
+                self.data = data or b""
+
+            def iter_content(self, size):
+                return [self.data[i:i + size] for i in range(0, len(self.data), size)]
+
+            def close(self):
+                pass
+
+        def fake_get(url, **kwargs):
+            calls.append(url)
+            return FakeResponse(files.get(url))
+
+        monkeypatch.setattr(http_client, "get", fake_get)
+        return calls
+
+    @staticmethod
+    def animated_gif():
+        import io
+        try:
+            from PIL import Image
+        except ImportError:
+            return b"GIF89a" + b"\0" * 200
+        frames = [Image.new("RGB", (120, 120), (i * 60, 90, 200 - i * 60)) for i in range(3)]
+        out = io.BytesIO()
+        frames[0].save(out, format="GIF", save_all=True, append_images=frames[1:], duration=100, loop=0)
+        return out.getvalue()
+
+    def test_gif_is_fetched_once_and_cached(self, client, upstream):
+        """Test search results point at the proxy, which downloads once and serves with ETag."""
+        from flask_jwt_extended import create_access_token
+
+        headers = {"Authorization": f"Bearer {create_access_token(identity='1')}"}
+        result = client.get("/api/exercises/search?q=barbell", headers=headers).get_json()[0]
+        assert result["gifUrl"].startswith("/media/exercise?src=")
+
+        first = client.get(result["gifUrl"])
+        assert first.status_code == 200 and first.mimetype == "image/gif"
+        assert first.headers["Cache-Control"] == "public, max-age=31536000, immutable"
+        assert client.get(result["gifUrl"], headers={"If-None-Match": first.headers["ETag"]}).status_code == 304
+        assert upstream == [self.GIF_URL]
+
+        missing = f"/media/exercise?src={self.MISSING_URL}"
+        assert client.get(missing).status_code == 502
+        assert client.get(missing).status_code == 502
+        assert len(upstream) == 2  # failures are remembered for a while
+        assert client.get("/media/exercise?src=http://169.254.169.254/latest").status_code == 400
+        # Allowed host but not a catalogue GIF: redirected, never fetched
+        other = client.get("/media/exercise?src=https://static.exercisedb.dev/media/other.gif")
+        assert other.status_code == 302 and other.headers["Location"] == "https://static.exercisedb.dev/media/other.gif"
+        assert len(upstream) == 2
+
+    def test_webp_and_poster_variants(self, client, upstream):
+        """Test the GIF is served until the WebP copy is made off the request; ?variant=poster is a JPEG frame."""
+        pytest.importorskip("PIL")
+        from exercise_media import warm
+        url = f"/media/exercise?src={self.GIF_URL}"
+        accept_webp = {"Accept": "image/avif,image/webp,*/*"}
+
+        assert client.get(url, headers=accept_webp).mimetype == "image/gif"
+        assert warm() == (1, 1)
+        webp = client.get(url, headers=accept_webp)
+        assert webp.mimetype == "image/webp" and webp.data.startswith(b"RIFF")
+        assert "Accept" in webp.headers["Vary"]
+        assert client.get(url, headers={"Accept": "*/*"}).mimetype == "image/gif"
+        poster = client.get(url + "&variant=poster")
+        assert poster.mimetype == "image/jpeg" and poster.data.startswith(b"\xff\xd8")
+        assert upstream == [self.GIF_URL, self.MISSING_URL]  # warm tried the missing GIF; a1 was fetched once
+
+    def test_gc_keeps_media_and_lost_files_are_refetched(self, client, upstream):
+        """Test blob gc keeps cached GIFs, and a GIF whose file is gone is downloaded again."""
+        import os
+        from blob_store import blob_store
+        from migrate_blobs import collect_garbage
+        from exercise_media import get_media, source_key
+        from models import db, ExerciseMedia
+        url = f"/media/exercise?src={self.GIF_URL}"
+
+        first = client.get(url)
+        assert collect_garbage() == 0
+        digest = db.session.get(ExerciseMedia, source_key(self.GIF_URL)).gif_sha256
+        os.remove(blob_store.path(digest))
+        db.session.expire_all()
+        assert get_media(self.GIF_URL).gif_sha256 == digest
+        again = client.get(url)
+        assert again.status_code == 200 and again.data == first.data
+        assert len(upstream) == 2
+
+
+class TestMigrations:
+    """Test the versioned schema migration runner."""
+
+    def test_legacy_database_is_upgraded_once(self, tmp_path):
+        """Test an unversioned database gets its columns, backfill and indexes, then is stamped."""
+        from sqlalchemy import create_engine, inspect, text
+        from migrations import upgrade, current_version, HEAD
+
+        engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+        with engine.begin() as conn:
+            conn.execute(text("CREATE TABLE user (id INTEGER PRIMARY KEY, username VARCHAR(80), password_hash VARCHAR(255))"))
+            conn.execute(text("CREATE TABLE user_profiles (id INTEGER PRIMARY KEY, user_id INTEGER, email VARCHAR(255))"))
+            conn.execute(text("CREATE TABLE saved_workout_history (id INTEGER PRIMARY KEY, user_id INTEGER, "
+                              "workout_name VARCHAR(255), completed_at DATETIME, created_at DATETIME)"))
+            conn.execute(text("INSERT INTO saved_workout_history (user_id, created_at) VALUES (1, '2025-01-01 10:00:00')"))
+
+        assert upgrade(engine) == list(range(1, HEAD + 1))
+        inspector = inspect(engine)
+        history_columns = {c["name"] for c in inspector.get_columns("saved_workout_history")}
+        assert {"total_volume", "photo_blob", "client_id"} <= history_columns
+        assert "goal_type" in {c["name"] for c in inspector.get_columns("user_profiles")}
+        assert "ux_saved_workout_history_user_id_client_id" in {
+            ix["name"] for ix in inspector.get_indexes("saved_workout_history")}
+        with engine.connect() as conn:
+            assert conn.execute(text("SELECT completed_at FROM saved_workout_history")).scalar() is not None
+            assert current_version(conn) == HEAD
+        assert upgrade(engine) == []
+
+    def test_boot_check_is_one_query_when_current(self, tmp_path):
+        """Test an up-to-date database costs a single SELECT at boot."""
+        from sqlalchemy import create_engine, event
+        from migrations import upgrade, check_schema
+
+        engine = create_engine(f"sqlite:///{tmp_path / 'fresh.db'}")
+        upgrade(engine)
+        statements = []
+        event.listen(engine, "before_cursor_execute", lambda conn, cursor, statement, *args: statements.append(statement))
+        assert check_schema(engine) == []
+        assert statements == ["SELECT MAX(version) FROM schema_version"]
+
+
+class TestColdStart:
+    """Test that heavy optional dependencies stay out of the boot path."""
+
+    def test_import_app_defers_heavy_modules(self):
+        """Test importing app does not load requests, marshmallow, PIL or openai."""
+        import subprocess
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        probe = ("import sys, app; "
+                 "print(','.join(m for m in ('requests', 'marshmallow', 'PIL', 'openai') if m in sys.modules))")
+        env = dict(os.environ, LAZY_INIT="1")
+        out = subprocess.run([sys.executable, "-c", probe], cwd=root, env=env,
+                             capture_output=True, text=True, check=True).stdout
+        assert out.rstrip("\n").split("\n")[-1] == ""
+
+
+class TestKeysetPagination:
+    """Test cursor pagination on the list endpoints."""
+
+    def test_history_pages_cover_every_entry_once(self, client):
+        """Test walking next_cursor returns each entry once, newest first."""
+        from flask_jwt_extended import create_access_token
+
+        headers = {"Authorization": f"Bearer {create_access_token(identity='1')}"}
+        for i in range(5):
+            # Two entries per timestamp, so the id tiebreaker matters
+            client.post("/profile/history", headers=headers, json={
+                "workout_name": f"w{i}", "completed_at": f"2025-01-0{1 + i // 2}T10:00:00",
+            })
+
+        seen, cursor = [], None
+        while True:
+            url = "/profile/history?limit=2" + (f"&after={cursor}" if cursor else "")
+            page = client.get(url, headers=headers).get_json()
+            assert len(page["items"]) <= 2
+            seen += [item["workout_name"] for item in page["items"]]
+            cursor = page["next_cursor"]
+            if not cursor:
+                break
+
+        assert seen == ["w4", "w3", "w2", "w1", "w0"]
+        assert len(client.get("/profile/history", headers=headers).get_json()) == 5
+
+    def test_bad_cursor_is_rejected(self, client):
+        """Test a tampered cursor returns 400."""
+        from flask_jwt_extended import create_access_token
+
+        headers = {"Authorization": f"Bearer {create_access_token(identity='1')}"}
+        response = client.get("/workout/all?after=not-a-cursor", headers=headers)
+        assert response.status_code == 400
+
+
+class TestBlobStore:
+    """Test content-addressed storage of progress photos."""
+
+    PNG = b"\x89PNG\r\n\x1a\n" + b"0" * 200
+
+    @pytest.fixture
+    def headers(self, app, tmp_path, monkeypatch):
+        import blob_store
+        from flask_jwt_extended import create_access_token
+        monkeypatch.setattr(blob_store.blob_store, "root", str(tmp_path))
+        return {"Authorization": f"Bearer {create_access_token(identity='1')}"}
+
+    def data_url(self):
+        import base64
+        return "data:image/png;base64," + base64.b64encode(self.PNG).decode()
+
+    def test_photo_is_stored_once_and_streamed(self, client, headers, monkeypatch):
+        """Test uploads are deduplicated and served with ETag and Range support."""
+        import blob_store
+        from models import MediaBlob, SavedWorkoutHistory
+
+        monkeypatch.setattr(blob_store, "BLOB_STORE_CONFIGURED", True)
+        for _ in range(2):
+            client.post("/profile/history", headers=headers, json={
+                "workout_name": "Legs", "progress_photo": self.data_url(),
+            })
+        assert MediaBlob.query.count() == 1
+        assert SavedWorkoutHistory.query.filter(SavedWorkoutHistory.progress_photo.isnot(None)).count() == 0
+
+        url = client.get("/profile/history", headers=headers).get_json()[0]["progress_photo"]
+        response = client.get(url)  # signed URL, no Authorization header
+        assert response.status_code == 200
+        assert response.data == self.PNG
+        etag = response.headers["ETag"]
+
+        assert client.get(url, headers={"If-None-Match": etag}).status_code == 304
+        partial = client.get(url, headers={"Range": "bytes=0-7"})
+        assert partial.status_code == 206
+        assert partial.data == self.PNG[:8]
+
+        digest = MediaBlob.query.first().sha256
+        assert client.get(f"/media/{digest}").status_code == 403
+
+    def test_unconfigured_store_keeps_base64_but_lists_skip_it(self, client, headers):
+        """Test uploads keep their data URL on the default store, and history lists don't read it."""
+        from sqlalchemy import event
+        from models import db, SavedWorkoutHistory, UserProfile
+
+        client.get("/profile", headers=headers)
+        client.put("/profile", headers=headers, json={"profile_image_url": self.data_url()})
+        client.post("/profile/history", headers=headers, json={"workout_name": "Legs", "progress_photo": self.data_url()})
+        db.session.add(SavedWorkoutHistory(user_id=1, workout_name="Old", progress_photo=self.data_url()))
+        db.session.commit()
+        profile = UserProfile.query.filter_by(user_id=1).first()
+        assert profile.image_blob and profile.profile_image_url == self.data_url()
+        assert SavedWorkoutHistory.query.filter(SavedWorkoutHistory.photo_blob.isnot(None)).one().progress_photo
+
+        statements = []
+        event.listen(db.engine, "before_cursor_execute", lambda conn, cursor, statement, *args: statements.append(statement))
+        photos = {h["workout_name"]: h["progress_photo"] for h in client.get("/profile/history", headers=headers).get_json()}
+        assert photos["Legs"].startswith("/media/") and photos["Old"] == self.data_url()
+        # Only the blob-less row's Base64 is read, in one extra query
+        reads = [s for s in statements if "progress_photo" in s]
+        assert len(reads) == 1 and "IN" in reads[0]
+
+    def test_migration_keeps_base64_until_verified(self, client, headers, monkeypatch):
+        """Test migrate keeps the Base64 copy (restoring lost files) and --clear needs a configured store."""
+        import os
+        import blob_store
+        import migrate_blobs
+        from models import db, SavedWorkoutHistory
+
+        db.session.add(SavedWorkoutHistory(user_id=1, workout_name="Old", progress_photo=self.data_url()))
+        db.session.commit()
+
+        assert migrate_blobs.migrate() == 1
+        row = SavedWorkoutHistory.query.first()
+        assert row.progress_photo and row.photo_blob
+
+        # A wiped disk is repaired from the kept copy on the next request
+        os.remove(blob_store.blob_store.path(row.photo_blob))
+        url = client.get("/profile/history", headers=headers).get_json()[0]["progress_photo"]
+        assert client.get(url).data == self.PNG
+
+        with pytest.raises(RuntimeError):
+            migrate_blobs.migrate(clear=True)
+        monkeypatch.setattr(migrate_blobs, "BLOB_STORE_CONFIGURED", True)
+        migrate_blobs.migrate(clear=True)
+        row = SavedWorkoutHistory.query.first()
+        assert row.progress_photo is None and row.photo_blob
+
+    def test_racing_identical_uploads_share_one_row(self, client, headers):
+        """Test a MediaBlob primary-key clash is absorbed instead of failing the upload."""
+        from models import db, MediaBlob
+        from blob_store import add_blob_row, store_image
+
+        digest = store_image(self.PNG)
+        db.session.commit()
+        db.session.expunge_all()
+        # Another request's session does not see the row yet
+        db.session.get = lambda *args, **kwargs: None
+        try:
+            add_blob_row(digest, "image/png", len(self.PNG))
+            db.session.commit()
+        finally:
+            del db.session.get
+        assert MediaBlob.query.count() == 1
+
+
+class TestSparseFieldsets:
+    """Test ?fields= column projection on list endpoints."""
+
+    def test_only_requested_columns_are_loaded(self, client):
+        """Test unrequested JSON columns are neither selected nor returned."""
+        from sqlalchemy import event
+        from models import db
+        from flask_jwt_extended import create_access_token
+
+        headers = {"Authorization": f"Bearer {create_access_token(identity='1')}"}
+        client.post("/profile/history", headers=headers, json={
+            "workout_name": "Push", "exercises": [{"name": "Bench"}], "total_volume": 900,
+        })
+
+        statements = []
+        listener = lambda conn, cursor, statement, *args: statements.append(statement)
+        event.listen(db.engine, "before_cursor_execute", listener)
+        try:
+            response = client.get("/profile/history?fields=workout_name,total_volume", headers=headers)
+        finally:
+            event.remove(db.engine, "before_cursor_execute", listener)
+
+        assert response.get_json() == [{"workout_name": "Push", "total_volume": 900}]
+        history_sql = [s for s in statements if "saved_workout_history" in s]
+        assert history_sql and all("exercises" not in s for s in history_sql)
+
+    def test_unknown_field_is_rejected(self, client):
+        """Test an unknown field name returns 400."""
+        from flask_jwt_extended import create_access_token
+
+        headers = {"Authorization": f"Bearer {create_access_token(identity='1')}"}
+        assert client.get("/workout-plans?fields=id,secret", headers=headers).status_code == 400
+
+
+class TestTrainingStats:
+    """Test incrementally maintained training rollups and personal bests."""
+
+    def _save(self, client, headers, volume, reps, completed_at):
+        response = client.post("/profile/history", headers=headers, json={
+            "workout_name": "Legs", "duration_seconds": 1800, "total_volume": volume,
+            "total_sets": 3, "total_reps": reps, "completed_at": completed_at,
+            "exercises": [{"name": "Squat", "totalSets": 3, "totalReps": reps, "totalVolume": volume}],
+        })
+        return response.get_json()["id"]
+
+    def test_save_and_delete_update_rollups(self, client):
+        """Test saving adds to the rollups and deleting the record holder restores the runner-up."""
+        from flask_jwt_extended import create_access_token
+
+        headers = {"Authorization": f"Bearer {create_access_token(identity='1')}"}
+        self._save(client, headers, 1000, 30, "2026-03-02T10:00:00")
+        best_id = self._save(client, headers, 1500, 24, "2026-03-03T10:00:00")
+
+        stats = client.get("/profile/stats", headers=headers).get_json()
+        assert stats["all_time"]["workouts"] == 2
+        assert stats["all_time"]["total_volume"] == 2500
+        squat = stats["personal_bests"][0]
+        assert (squat["exercise"], squat["sessions"], squat["best_volume"], squat["best_reps"]) == ("Squat", 2, 1500, 30)
+
+        client.delete(f"/profile/history/{best_id}", headers=headers)
+        stats = client.get("/profile/stats", headers=headers).get_json()
+        assert stats["all_time"]["workouts"] == 1
+        assert stats["all_time"]["duration_seconds"] == 1800
+        assert stats["personal_bests"][0]["best_volume"] == 1000
+
+    def test_backfill_matches_incremental(self, client):
+        """Test rebuilding from history gives the same rollups as incremental updates."""
+        from datetime import date
+        from flask_jwt_extended import create_access_token
+        from training_stats import backfill, get_stats
+
+        headers = {"Authorization": f"Bearer {create_access_token(identity='1')}"}
+        self._save(client, headers, 800, 20, "2026-03-02T10:00:00")
+        self._save(client, headers, 900, 25, "2026-03-03T10:00:00")
+        self._save(client, headers, 700, 28, "2026-03-10T10:00:00")
+
+        incremental = get_stats(1, today=date(2026, 3, 10))
+        assert incremental["streak_days"] == 1
+        assert [w["workouts"] for w in incremental["weekly"]] == [1, 2]
+        assert backfill() == 3
+        assert get_stats(1, today=date(2026, 3, 10)) == incremental
+
+    def test_rollups_use_client_local_day(self, client):
+        """Test a late-evening workout counts on the client's day, not the UTC one."""
+        from flask_jwt_extended import create_access_token
+
+        headers = {"Authorization": f"Bearer {create_access_token(identity='1')}"}
+        client.post("/profile/history", headers=headers, json={
+            "workout_name": "Legs", "total_volume": 500,
+            "completed_at": "2026-03-03T02:30:00Z", "day": "2026-03-02",
+        })
+        stats = client.get("/profile/stats?day=2026-03-02", headers=headers).get_json()
+        assert (stats["today"]["workouts"], stats["streak_days"]) == (1, 1)
+        assert client.get("/profile/stats?day=soon", headers=headers).status_code == 400
+
+
+class TestHistoryBatchSync:
+    """Test batch history uploads with idempotency keys."""
+
+    def test_batch_is_idempotent(self, client):
+        """Test a retried sync reports duplicates instead of saving twice."""
+        from flask_jwt_extended import create_access_token
+
+        headers = {"Authorization": f"Bearer {create_access_token(identity='1')}"}
+        entries = [
+            {"client_id": "a", "workout_name": "Push", "total_volume": 500, "completed_at": "2026-03-02T10:00:00"},
+            {"client_id": "b", "workout_name": "Pull", "total_volume": 700, "completed_at": "2026-03-03T10:00:00"},
+            {"client_id": "a", "workout_name": "Push again"},
+            {"client_id": "c", "duration_seconds": "soon"},
+            {"client_id": "d", "total_volume": "Infinity"},
+            {"client_id": "e", "total_reps": float("inf")},
+        ]
+        first = client.post("/profile/history/batch", headers=headers, json={"entries": entries}).get_json()
+        assert [r["status"] for r in first["results"]] == ["created", "created", "duplicate"] + ["invalid"] * 3
+        assert first["results"][2]["id"] == first["results"][0]["id"]
+
+        retry = client.post("/profile/history/batch", headers=headers, json={"entries": entries[:2]}).get_json()
+        assert retry["created"] == 0
+        assert [r["id"] for r in retry["results"]] == [r["id"] for r in first["results"][:2]]
+
+        history = client.get("/profile/history", headers=headers).get_json()
+        assert len(history) == 2
+        stats = client.get("/profile/stats", headers=headers).get_json()
+        assert (stats["all_time"]["workouts"], stats["all_time"]["total_volume"]) == (2, 1200)
+
+    def test_single_save_honours_client_id(self, client):
+        """Test POST /profile/history with a known client_id returns the saved entry."""
+        from flask_jwt_extended import create_access_token
+
+        headers = {"Authorization": f"Bearer {create_access_token(identity='1')}"}
+        first = client.post("/profile/history", headers=headers, json={"client_id": "x", "workout_name": "Legs"})
+        again = client.post("/profile/history", headers=headers, json={"client_id": "x", "workout_name": "Legs"})
+        assert (first.status_code, again.status_code) == (201, 200)
+        assert first.get_json()["id"] == again.get_json()["id"]
+
+    def test_single_save_race_returns_existing(self, client, monkeypatch):
+        """Test a client_id saved concurrently after the check returns that entry, not a 500."""
+        from flask_jwt_extended import create_access_token
+        import profile
+        from models import db, SavedWorkoutHistory
+
+        build = profile.build_history_entry
+
+        def build_after_concurrent_save(user_id, data):
+            # Another request commits the same client_id between the check and our insert
+            db.session.add(SavedWorkoutHistory(user_id=user_id, client_id=data["client_id"], workout_name="Legs"))
+            db.session.commit()
+            return build(user_id, data)
+
+        monkeypatch.setattr(profile, "build_history_entry", build_after_concurrent_save)
+        headers = {"Authorization": f"Bearer {create_access_token(identity='1')}"}
+        response = client.post("/profile/history", headers=headers, json={"client_id": "y", "workout_name": "Legs"})
+        assert response.status_code == 200
+        assert SavedWorkoutHistory.query.filter_by(client_id="y").count() == 1
+
+
+class TestFoodLog:
+    """Test the server-side food log and its daily aggregates."""
+
+    def test_bulk_insert_updates_daily_totals(self, client):
+        """Test a bulk insert and a delete keep the day's totals in step."""
+        from flask_jwt_extended import create_access_token
+
+        headers = {"Authorization": f"Bearer {create_access_token(identity='1')}"}
+        response = client.post("/food-log", headers=headers, json={"day": "2026-03-02", "entries": [
+            {"name": "Oatmeal", "calories": 300, "protein": 10, "carbs": 54, "fat": 5},
+            {"name": "Banana", "calories": 105, "protein": 1.3, "carbs": 27, "fat": 0.4},
+            {"name": "Eggs", "calories": 155, "protein": 13, "carbs": 1.1, "fat": 11, "day": "2026-03-03"},
+        ]})
+        assert response.status_code == 201
+        ids = [e["id"] for e in response.get_json()["entries"]]
+
+        day = client.get("/food-log?day=2026-03-02", headers=headers).get_json()
+        assert [e["name"] for e in day["entries"]] == ["Oatmeal", "Banana"]
+        assert day["totals"] == {"entries": 2, "calories": 405, "protein": 11.3, "carbs": 81, "fat": 5.4}
+
+        client.delete(f"/food-log/{ids[1]}", headers=headers)
+        day = client.get("/food-log?day=2026-03-02", headers=headers).get_json()
+        assert day["totals"]["calories"] == 300
+
+    def test_weekly_summary(self, client):
+        """Test the summary groups daily aggregates into Monday-start weeks."""
+        from flask_jwt_extended import create_access_token
+
+        headers = {"Authorization": f"Bearer {create_access_token(identity='1')}"}
+        for day, calories in [("2026-03-02", 2000), ("2026-03-04", 1800), ("2026-03-09", 2200)]:
+            client.post("/food-log", headers=headers, json={"day": day, "name": "Meal", "calories": calories})
+        assert client.post("/food-log", headers=headers, json={"name": ""}).status_code == 400
+
+        summary = client.get("/food-log/summary?start=2026-03-01&end=2026-03-15&period=week",
+                             headers=headers).get_json()
+        assert [(w["week"], w["calories"]) for w in summary["weeks"]] == [("2026-03-02", 3800), ("2026-03-09", 2200)]
+        assert summary["totals"]["entries"] == 3
+        assert summary["daily_average"]["calories"] == 2000
+
+
+class TestResponseCache:
+    """Test the outbound lookup cache."""
+
+    def test_hit_after_first_call(self):
+        """Test normalized queries share one upstream call."""
+        from cache import ResponseCache
+        cache = ResponseCache()
+        calls = []
+
+        @cache.cached("usda")
+        def lookup(query, max_results=10):
+            calls.append(query)
+            return [{"food_name": query}]
+
+        lookup("Banana")
+        result = lookup("  banana ", max_results=10)
+        assert len(calls) == 1
+        assert result == [{"food_name": "Banana"}]
+        assert cache.stats()["sources"]["usda"] == {"hits": 1, "misses": 1, "negative_hits": 0, "coalesced": 0}
+
+    def test_hits_return_copies(self):
+        """Test callers can mutate results without corrupting the cache."""
+        from cache import ResponseCache
+        cache = ResponseCache()
+
+        @cache.cached("usda")
+        def lookup(query):
+            return [{"food_name": query}]
+
+        lookup("apple")[0]["source"] = "usda"
+        assert lookup("apple") == [{"food_name": "apple"}]
+
+    def test_negative_and_failed_results(self):
+        """Test empty results are cached but failures (None) are not."""
+        from cache import ResponseCache
+        cache = ResponseCache(negative_ttl=60)
+        calls = []
+
+        @cache.cached("calorieninjas")
+        def lookup(query):
+            calls.append(query)
+            return [] if query == "empty" else None
+
+        lookup("empty")
+        lookup("empty")
+        lookup("down")
+        lookup("down")
+        assert calls == ["empty", "down", "down"]
+        assert cache.stats()["sources"]["calorieninjas"]["negative_hits"] == 1
+
+    def test_shared_backend_across_instances(self, tmp_path):
+        """Test two workers pointing at the same SQLite file share entries."""
+        from cache import ResponseCache
+        path = str(tmp_path / "cache.db")
+        worker_a = ResponseCache(shared_path=path)
+        worker_b = ResponseCache(shared_path=path)
+
+        key = worker_a.make_key("fatsecret_barcode", "049000042566")
+        worker_a.set(key, {"food_name": "Coke"}, 60)
+        assert worker_b.get(key) == (True, {"food_name": "Coke"})
+
+
+class TestSingleFlight:
+    """Test coalescing of identical concurrent upstream lookups."""
+
+    @staticmethod
+    def _burst(func, n=8):
+        import threading
+        barrier = threading.Barrier(n)
+        results = []
+
+        def run():
+            barrier.wait()
+            results.append(func())
+
+        threads = [threading.Thread(target=run) for _ in range(n)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return results
+
+    def test_concurrent_misses_share_one_call(self):
+        """Test a burst of identical queries in one worker hits upstream once."""
+        import time
+        from cache import ResponseCache
+        cache = ResponseCache()
+        calls = []
+
+        @cache.cached("usda")
+        def lookup(query):
+            calls.append(query)
+            time.sleep(0.2)
+            return [{"food_name": query}]
+
+        results = self._burst(lambda: lookup("oatmeal"))
+        assert len(calls) == 1
+        assert results == [[{"food_name": "oatmeal"}]] * 8
+        assert cache.stats()["coalesced"] == 7
+
+    def test_workers_wait_on_shared_lock(self, tmp_path):
+        """Test two workers sharing a cache file make one upstream call."""
+        import time
+        import threading
+        from cache import ResponseCache
+        path = str(tmp_path / "cache.db")
+        workers = [ResponseCache(shared_path=path), ResponseCache(shared_path=path)]
+        calls = []
+        lookups = []
+        for worker in workers:
+            @worker.cached("usda")
+            def lookup(query):
+                calls.append(query)
+                time.sleep(0.3)
+                return [{"food_name": query}]
+            lookups.append(lookup)
+
+        counter = iter(range(100))
+        lock = threading.Lock()
+
+        def pick():
+            with lock:
+                lookup = lookups[next(counter) % 2]
+            return lookup("eggs")
+
+        results = self._burst(pick, n=4)
+        assert len(calls) == 1
+        assert all(r == [{"food_name": "eggs"}] for r in results)
+
+
+class TestMealSearchFanOut:
+    """Test the concurrent /api/food/ai-meal source lookups."""
+
+    def test_deadline_reports_slow_sources(self, monkeypatch):
+        """Test slow sources are reported instead of blocking the response."""
+        import time
+        import fatsecret
+
+        def fast(query, max_results=5):
+            return [{"food_name": query}]
+
+        def slow(query, max_results=5):
+            time.sleep(1)
+            return [{"food_name": "late"}]
+
+        monkeypatch.setattr(fatsecret, "AI_MEAL_SOURCES", [
+            ("calorieninjas", fast), ("usda", slow), ("fatsecret", fast),
+        ])
+        started = time.time()
+        results, timed_out = fatsecret.fan_out_meal_search("oatmeal", deadline=0.2)
+
+        assert time.time() - started < 0.9
+        assert timed_out == ["usda"]
+        assert list(results) == ["calorieninjas", "fatsecret"]
+
+
+class TestNutritionEstimateCache:
+    """Test the persistent AI nutrition estimate cache."""
+
+    def test_query_normalization(self):
+        """Test word order, plurals and bare units don't change the cache key, but amounts do."""
+        from nutrition_estimates import normalize_food_query
+
+        key, tokens = normalize_food_query("2 Bowls of Oatmeal with Blueberries")
+        assert key == normalize_food_query("oatmeal with blueberry, two bowls")[0] == "blueberry oatmeal with @ 2 bowl"
+        assert tokens == normalize_food_query("oatmeal with blueberry")[1]
+        assert normalize_food_query("oatmeal with blueberry")[0] == normalize_food_query("bowl of oatmeal with blueberries")[0]
+        assert key != normalize_food_query("oatmeal with blueberry")[0]
+        assert key != normalize_food_query("1 bowl oatmeal with blueberry")[0]
+        assert key != normalize_food_query("2 bowls oatmeal with banana")[0]
+
+    def test_repeat_and_near_duplicate_queries_skip_llm(self, app, monkeypatch):
+        """Test a fake LLM is only called once for similar queries."""
+        import fatsecret
+        from nutrition_estimates import FakeNutritionLLM
+
+        fake = FakeNutritionLLM(calories=420)
+        monkeypatch.setattr(fatsecret, "nutrition_llm", fake)
+        fatsecret.openai_breaker.reset()
+
+        first = fatsecret.estimate_nutrition_with_ai("Chicken Burrito Bowl with Rice")
+        again = fatsecret.estimate_nutrition_with_ai("chicken burrito bowls with rice")
+        similar = fatsecret.estimate_nutrition_with_ai("large chicken burrito with rice")
+
+        assert len(fake.calls) == 1
+        assert first[0]["calories"] == 420
+        assert again[0]["source"] == "ai_estimate" and again[0]["cached"] is True
+        assert similar[0]["calories"] == 420
+        assert again[0]["confidence"] == "medium"
+
+        # A two-serving estimate is never served for a plain query, even as a near duplicate
+        fatsecret.estimate_nutrition_with_ai("2 chicken burrito bowls with rice")
+        assert len(fake.calls) == 2 and '"2 chicken burrito bowls with rice"' in fake.calls[1]
+
+
+class TestHttpClient:
+    """Test the shared outbound HTTP client."""
+
+    def test_session_is_shared(self):
+        """Test every call reuses one pooled session."""
+        import http_client
+        assert http_client.get_session() is http_client.get_session()
+
+    def test_timeouts_per_host(self):
+        """Test per-host timeouts with a default for unknown hosts."""
+        import http_client
+        assert http_client.timeout_for("https://api.openai.com/v1/chat") == http_client.HOST_TIMEOUTS["api.openai.com"]
+        assert http_client.timeout_for("https://example.com/x") == http_client.DEFAULT_TIMEOUT
+
+    def test_only_idempotent_methods_retry(self):
+        """Test POSTs (OAuth-signed, billed) are never retried."""
+        import http_client
+        retry = http_client.get_session().get_adapter("https://api.nal.usda.gov").max_retries
+        assert retry.is_retry("GET", 503)
+        assert not retry.is_retry("POST", 503)
+
+
+class TestCircuitBreaker:
+    """Test the per-source circuit breakers."""
+
+    def test_trips_and_short_circuits(self):
+        """Test a failing source is skipped once the breaker opens."""
+        from circuit_breaker import CircuitBreaker, OPEN
+        breaker = CircuitBreaker("test-down", min_calls=3, cooldown=60)
+        calls = []
+
+        @breaker
+        def lookup(query):
+            calls.append(query)
+            return None
+
+        for _ in range(5):
+            assert lookup("eggs") is None
+        assert breaker.state == OPEN
+        assert len(calls) == 3
+        assert breaker.snapshot()["short_circuited"] == 2
+
+    def test_half_open_probe_closes(self):
+        """Test a successful probe after the cool-down closes the breaker."""
+        from circuit_breaker import CircuitBreaker, CLOSED, OPEN
+        breaker = CircuitBreaker("test-recovers", min_calls=2, cooldown=0)
+        healthy = []
+
+        @breaker
+        def lookup(query):
+            return [query] if healthy else None
+
+        lookup("a")
+        lookup("b")
+        assert breaker.state == OPEN
+        healthy.append(True)
+        assert lookup("c") == ["c"]
+        assert breaker.state == CLOSED
+
+
+    def test_failure_predicate_and_unconfigured_sources(self):
+        """Test API error bodies count as failures and missing credentials never do."""
+        from circuit_breaker import CircuitBreaker, CLOSED, OPEN
+        from fatsecret import fatsecret_failed
+
+        assert fatsecret_failed(None) and fatsecret_failed({"error": {"code": 21, "message": "Invalid IP"}})
+        assert not fatsecret_failed({"error": {"code": 211, "message": "No food item detected"}})
+        assert not fatsecret_failed({"foods": {}})
+
+        configured = []
+        breaker = CircuitBreaker("test-predicate", min_calls=2, cooldown=60,
+                                 is_failure=fatsecret_failed, configured=lambda: bool(configured))
+        reply = {"error": {"code": 8, "message": "Invalid consumer key"}}
+
+        for _ in range(3):
+            breaker.call(lambda: None)  # no credentials: skipped, not recorded
+        assert breaker.state == CLOSED and breaker.snapshot()["calls_in_window"] == 0
+        configured.append(True)
+        breaker.call(lambda: reply)
+        breaker.call(lambda: reply)
+        assert breaker.state == OPEN
+
+class TestLocalFoodStore:
+    """Test the indexed local food database."""
+
+    @pytest.fixture
+    def store(self, tmp_path):
+        from food_db import LocalFoodStore
+        from fatsecret import FALLBACK_FOODS
+        return LocalFoodStore(str(tmp_path / "foods.db"), seed=FALLBACK_FOODS)
+
+    def test_prefix_token_and_substring(self, store):
+        """Test prefix, out-of-order token and mid-word substring queries."""
+        assert store.search("chick")[0]["food_name"].startswith("Chicken")
+        assert store.search("breast chicken")[0]["food_name"] == "Chicken Breast (grilled)"
+        assert "Strawberries" in [f["food_name"] for f in store.search("berr")]
+        assert store.search("zzzz") == []
+
+    def test_common_prefix_keeps_best_name_match(self, tmp_path):
+        """Test a name starting with the query is ranked even past SEARCH_CANDIDATES other hits."""
+        from food_db import LocalFoodStore, SEARCH_CANDIDATES
+        seed = [{"food_id": f"p{i}", "food_name": f"Soup with chickpeas and kale, variety {i}", "calories": 90}
+                for i in range(SEARCH_CANDIDATES + 100)]
+        seed += [{"food_id": "c1", "food_name": "Chicken Breast", "calories": 165}]
+        store = LocalFoodStore(str(tmp_path / "foods.db"), seed=seed)
+        assert store.search("chick")[0]["food_name"] == "Chicken Breast"
+
+    def test_import_usda_json(self, store, tmp_path):
+        """Test a FoodData Central JSON dump becomes searchable and primary."""
+        import json
+        from food_db import import_usda
+        dump = tmp_path / "foundation.json"
+        dump.write_text(json.dumps({"FoundationFoods": [{
+            "fdcId": 321360,
+            "description": "Hummus, commercial",
+            "dataType": "Foundation",
+            "foodNutrients": [
+                {"nutrient": {"number": "208"}, "amount": 229},
+                {"nutrient": {"number": "203"}, "amount": 7.35},
+            ],
+        }]}))
+
+        assert not store.is_primary()
+        assert import_usda(store, str(dump)) == 1
+        assert store.is_primary()
+        food = store.search("humm")[0]
+        assert food["food_id"] == 321360
+        assert food["calories"] == 229
+
+
+class TestAutocompleteIndex:
+    """Test the local autocomplete engine."""
+
+    def test_prefix_ranked_by_popularity(self):
+        """Test popular queries outrank shorter unpopular names."""
+        from autocomplete import AutocompleteIndex
+        index = AutocompleteIndex(loader=lambda: ["Chicken Thigh", "Chicken Breast (grilled)", "Cheese"])
+        assert index.suggest("chi") == ["Chicken Thigh", "Chicken Breast (grilled)"]
+
+        index.record_query("chicken breast (GRILLED)")
+        assert index.suggest("chi")[0] == "Chicken Breast (grilled)"
+
+    def test_partial_queries_are_not_suggested(self):
+        """Test keystrokes and free-text searches neither become nor outrank food names."""
+        from autocomplete import AutocompleteIndex
+        index = AutocompleteIndex(loader=lambda: ["Chicken Thigh"])
+        for query in ("chic", "chick", "chicken thi"):
+            index.record_query(query)
+        assert index.suggest("chi") == ["Chicken Thigh"]
+
+    def test_incremental_add_invalidates_prefix_cache(self):
+        """Test names seen after a lookup show up on the next keystroke."""
+        from autocomplete import AutocompleteIndex
+        index = AutocompleteIndex()
+        assert index.suggest("oat") == []
+        index.add("Oatmeal (cooked)")
+        assert index.suggest("oat") == ["Oatmeal (cooked)"]
+
+
 if __name__ == '__main__':
     pytest.main([__file__, '-v'])
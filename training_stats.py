@@ -0,0 +1,283 @@
+"""
+Per-user training rollups.
+training_stats holds one row per user per day, per week (Monday start)
+and an all-time row; personal_bests holds one row per user per exercise.
+Both are adjusted incrementally whenever a history entry is saved or
+deleted, in the same transaction, so /profile/stats reads a handful of
+rows instead of scanning saved_workout_history and its JSON.
+Run `python training_stats.py backfill [--user ID]` to rebuild from history.
+"""
+import argparse
+from datetime import date, timedelta
+
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import load_only
+
+from models import db, SavedWorkoutHistory, TrainingStat, PersonalBest
+
+ALL_TIME = date(1970, 1, 1)
+COUNTERS = ("workouts", "duration_seconds", "total_volume", "total_sets", "total_reps")
+
+
+def period_starts(day):
+    """(period, period_start) rows a workout on `day` counts towards."""
+    return [("day", day), ("week", day - timedelta(days=day.weekday())), ("all", ALL_TIME)]
+
+
+def _number(value):
+    try:
+        return max(float(value or 0), 0.0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def entry_deltas(entry, sign=1):
+    return {
+        "workouts": sign,
+        "duration_seconds": sign * int(_number(entry.duration_seconds)),
+        "total_volume": sign * int(_number(entry.total_volume)),
+        "total_sets": sign * int(_number(entry.total_sets)),
+        "total_reps": sign * int(_number(entry.total_reps)),
+    }
+
+
+def _bump(user_id, period, period_start, deltas):
+    """Add deltas to one rollup row with a single UPDATE, inserting it if missing."""
+    key = {"user_id": user_id, "period": period, "period_start": period_start}
+    values = {getattr(TrainingStat, name): getattr(TrainingStat, name) + delta for name, delta in deltas.items()}
+    if TrainingStat.query.filter_by(**key).update(values, synchronize_session=False):
+        return
+    try:
+        with db.session.begin_nested():
+            db.session.add(TrainingStat(**key, **deltas))
+    except IntegrityError:
+        # A concurrent request created the row first
+        TrainingStat.query.filter_by(**key).update(values, synchronize_session=False)
+
+
+def exercise_totals(entry):
+    """{normalized name: (display name, volume, reps)} for a history entry's exercises."""
+    totals = {}
+    for ex in entry.exercises or []:
+        if isinstance(ex, str):
+            ex = {"name": ex}
+        if not isinstance(ex, dict) or not ex.get("name"):
+            continue
+        name = str(ex["name"]).strip()
+        key = name.lower()[:255]
+        volume = _number(ex.get("totalVolume") or ex.get("volume"))
+        reps = int(_number(ex.get("totalReps") or ex.get("reps")))
+        _, prev_volume, prev_reps = totals.get(key, (name, 0.0, 0))
+        totals[key] = (name, prev_volume + volume, prev_reps + reps)
+    return totals
+
+
+def entry_day(entry):
+    """The client's local date for an entry; the UTC date for rows saved without one."""
+    return entry.day or (entry.completed_at or entry.created_at).date()
+
+
+def _personal_best(user_id, key, display_name):
+    best = PersonalBest.query.filter_by(user_id=user_id, exercise=key).first()
+    if best is not None:
+        return best
+    try:
+        with db.session.begin_nested():
+            best = PersonalBest(user_id=user_id, exercise=key, display_name=display_name[:255],
+                                sessions=0, best_volume=0, best_reps=0)
+            db.session.add(best)
+    except IntegrityError:
+        best = PersonalBest.query.filter_by(user_id=user_id, exercise=key).first()
+    return best
+
+
+def _add_sessions(best, n):
+    """sessions += n as a single UPDATE, so concurrent saves never lose a count."""
+    PersonalBest.query.filter_by(id=best.id).update(
+        {PersonalBest.sessions: PersonalBest.sessions + n}, synchronize_session=False
+    )
+
+
+def record_workouts(entries):
+    """Count newly added history entries (call before committing; ids must be set).
+
+    Deltas are merged first, so a batch costs one UPDATE per rollup row touched
+    and one personal-best lookup per exercise, not per entry.
+    """
+    bumps = {}
+    exercises = {}
+    for entry in entries:
+        user_id = int(entry.user_id)
+        day = entry_day(entry)
+        for period, start in period_starts(day):
+            merged = bumps.setdefault((user_id, period, start), dict.fromkeys(COUNTERS, 0))
+            for name, delta in entry_deltas(entry).items():
+                merged[name] += delta
+        for key, totals in exercise_totals(entry).items():
+            exercises.setdefault((user_id, key), []).append((entry, totals))
+
+    for (user_id, period, start), deltas in bumps.items():
+        _bump(user_id, period, start, deltas)
+
+    for (user_id, key), sessions in exercises.items():
+        best = _personal_best(user_id, key, sessions[0][1][0])
+        _add_sessions(best, len(sessions))
+        for entry, (_, volume, reps) in sessions:
+            if volume > best.best_volume:
+                best.best_volume, best.best_volume_at, best.best_volume_history_id = volume, entry.completed_at, entry.id
+            if reps > best.best_reps:
+                best.best_reps, best.best_reps_at, best.best_reps_history_id = reps, entry.completed_at, entry.id
+
+
+def record_workout(entry):
+    """Count one newly added history entry."""
+    record_workouts([entry])
+
+
+def remove_workout(entry):
+    """Un-count a history entry that is being deleted (call before deleting it)."""
+    user_id = int(entry.user_id)
+    day = entry_day(entry)
+    deltas = entry_deltas(entry, sign=-1)
+    for period, start in period_starts(day):
+        _bump(user_id, period, start, deltas)
+
+    for key in exercise_totals(entry):
+        best = PersonalBest.query.filter_by(user_id=user_id, exercise=key).first()
+        if best is None:
+            continue
+        _add_sessions(best, -1)
+        gone = PersonalBest.query.filter(PersonalBest.id == best.id, PersonalBest.sessions <= 0)
+        if gone.delete(synchronize_session="fetch"):
+            continue
+        if entry.id in (best.best_volume_history_id, best.best_reps_history_id):
+            # The record itself is going away: rescan this user's history for the runner-up
+            _recompute_best(best, exclude_id=entry.id)
+
+
+def _recompute_best(best, exclude_id):
+    best.best_volume, best.best_volume_at, best.best_volume_history_id = 0, None, None
+    best.best_reps, best.best_reps_at, best.best_reps_history_id = 0, None, None
+    rows = (
+        SavedWorkoutHistory.query
+        .options(load_only(SavedWorkoutHistory.id, SavedWorkoutHistory.exercises, SavedWorkoutHistory.completed_at))
+        .filter(SavedWorkoutHistory.user_id == best.user_id, SavedWorkoutHistory.id != exclude_id)
+        .yield_per(200)
+    )
+    for row in rows:
+        found = exercise_totals(row).get(best.exercise)
+        if not found:
+            continue
+        _, volume, reps = found
+        if volume > best.best_volume:
+            best.best_volume, best.best_volume_at, best.best_volume_history_id = volume, row.completed_at, row.id
+        if reps > best.best_reps:
+            best.best_reps, best.best_reps_at, best.best_reps_history_id = reps, row.completed_at, row.id
+
+
+# ---------------------------------------------------------
+# READS
+# ---------------------------------------------------------
+def stat_to_dict(stat):
+    result = {name: getattr(stat, name, 0) if stat else 0 for name in COUNTERS}
+    if stat is not None and stat.period != "all":
+        result["period_start"] = stat.period_start.isoformat()
+    return result
+
+
+def current_streak(day_rows, today):
+    """Consecutive days with a workout ending today (or yesterday)."""
+    active = {row.period_start for row in day_rows if row.workouts > 0}
+    day = today if today in active else today - timedelta(days=1)
+    streak = 0
+    while day in active:
+        streak += 1
+        day -= timedelta(days=1)
+    return streak
+
+
+def get_stats(user_id, weeks=12, today=None):
+    """Summary for /profile/stats, read from the rollup tables only."""
+    today = today or date.today()
+    week_start = today - timedelta(days=today.weekday())
+    base = TrainingStat.query.filter_by(user_id=user_id)
+
+    all_time = base.filter_by(period="all").first()
+    weekly = (
+        base.filter(TrainingStat.period == "week", TrainingStat.period_start > week_start - timedelta(weeks=weeks))
+        .order_by(TrainingStat.period_start.desc())
+        .all()
+    )
+    days = (
+        base.filter(TrainingStat.period == "day", TrainingStat.period_start > today - timedelta(days=90))
+        .order_by(TrainingStat.period_start.desc())
+        .all()
+    )
+    bests = PersonalBest.query.filter_by(user_id=user_id).order_by(PersonalBest.best_volume.desc()).all()
+
+    return {
+        "all_time": stat_to_dict(all_time),
+        "today": stat_to_dict(next((d for d in days if d.period_start == today), None)),
+        "this_week": stat_to_dict(next((w for w in weekly if w.period_start == week_start), None)),
+        "weekly": [stat_to_dict(w) for w in weekly],
+        "streak_days": current_streak(days, today),
+        "personal_bests": [
+            {
+                "exercise": b.display_name or b.exercise,
+                "sessions": b.sessions,
+                "best_volume": b.best_volume,
+                "best_volume_at": b.best_volume_at.isoformat() if b.best_volume_at else None,
+                "best_reps": b.best_reps,
+                "best_reps_at": b.best_reps_at.isoformat() if b.best_reps_at else None,
+            }
+            for b in bests
+        ],
+    }
+
+
+# ---------------------------------------------------------
+# BACKFILL
+# ---------------------------------------------------------
+def backfill(user_id=None):
+    """Rebuild rollups and personal bests from saved history (all users, or one)."""
+    stats = TrainingStat.query
+    bests = PersonalBest.query
+    history = SavedWorkoutHistory.query.options(load_only(
+        SavedWorkoutHistory.id, SavedWorkoutHistory.user_id, SavedWorkoutHistory.exercises,
+        SavedWorkoutHistory.completed_at, SavedWorkoutHistory.created_at, SavedWorkoutHistory.day,
+        SavedWorkoutHistory.duration_seconds, SavedWorkoutHistory.total_volume,
+        SavedWorkoutHistory.total_sets, SavedWorkoutHistory.total_reps,
+    ))
+    if user_id is not None:
+        stats = stats.filter_by(user_id=user_id)
+        bests = bests.filter_by(user_id=user_id)
+        history = history.filter_by(user_id=user_id)
+    stats.delete(synchronize_session=False)
+    bests.delete(synchronize_session=False)
+
+    count = 0
+    batch = []
+    for entry in history.order_by(SavedWorkoutHistory.id).yield_per(500):
+        batch.append(entry)
+        if len(batch) == 500:
+            record_workouts(batch)
+            count += len(batch)
+            batch = []
+    record_workouts(batch)
+    count += len(batch)
+    db.session.commit()
+    print(f"Backfilled training stats from {count} history entries")
+    return count
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Training stats rollups")
+    sub = parser.add_subparsers(dest="command", required=True)
+    backfill_parser = sub.add_parser("backfill", help="Rebuild rollups from saved history")
+    backfill_parser.add_argument("--user", type=int, help="Only rebuild this user id")
+    args = parser.parse_args()
+
+    from app import app
+
+    with app.app_context():
+        backfill(args.user)
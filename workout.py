@@ -1,49 +1,107 @@
 from flask import jsonify, request, Blueprint, g
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from models import db, User, Workout, WorkoutPlan, Session
-from schemas import SessionSchema
-import requests
+from models import db, Workout, WorkoutPlan, Session
+import http_client
+from cache import SingleFlight
+from pagination import wants_page, parse_limit, keyset_page
+from fieldsets import parse_fields, load_only_for, serialize
+from identity import current_identity
+from exercise_catalog import EXERCISE_API_URL, catalog
+from exercise_media import proxy_url
 
-# External ExerciseDB API URLs
-EXERCISE_API_URL = "https://www.exercisedb.dev/api/v1/exercises"
+# Identical concurrent ExerciseDB requests share one upstream call
+exercise_flight = SingleFlight()
+
+SEARCH_LIMIT = 20
 
 # Blueprint setup
 workout_bp = Blueprint("workout", __name__, url_prefix="/workout")
-session_schema = SessionSchema()
 
 
 # ---------------------------------------------------------
 # Helper: Load current user
 # ---------------------------------------------------------
 def load_user():
-    user_id = get_jwt_identity()
-    g.current_user = User.query.get(int(user_id))
+    g.current_user = current_identity()
+
+
+# ---------------------------------------------------------
+# Helper: Fetch from ExerciseDB (coalesced)
+# ---------------------------------------------------------
+def fetch_exercises(path, params=None):
+    """GET an ExerciseDB endpoint and return (status_code, json or None).
+
+    Concurrent requests for the same path and params wait on a single
+    upstream call and share its parsed result, so callers must not mutate it.
+    """
+    key = path + "?" + "&".join(f"{k}={v}" for k, v in sorted((params or {}).items()))
+
+    def fetch():
+        response = http_client.get(f"{EXERCISE_API_URL}{path}", params=params)
+        if response.status_code != 200:
+            return response.status_code, None
+        return response.status_code, response.json()
+
+    result, _ = exercise_flight.do(key, fetch)
+    return result
 
 
 # ---------------------------------------------------------
 # Get all workouts (manual + AI)
 # ---------------------------------------------------------
+def _first_exercise(w, key):
+    exercises = (w.details or {}).get("exercises", [])
+    return exercises[0].get(key) if exercises else None
+
+
+# Response fields -> (columns they need, getter); see fieldsets.py
+WORKOUT_FIELDS = {
+    "id": ([Workout.id], lambda w: w.id),
+    "title": ([Workout.title], lambda w: w.title or "Workout"),
+    "category": ([Workout.category], lambda w: w.category or "General"),
+    "sets": ([Workout.sets, Workout.details], lambda w: w.sets or _first_exercise(w, "sets")),
+    "reps": ([Workout.reps, Workout.details], lambda w: w.reps or _first_exercise(w, "reps")),
+    "details": ([Workout.details], lambda w: w.details or {}),
+    "notes": ([Workout.notes], lambda w: w.notes or ""),
+}
+
+
 @workout_bp.route("/all", methods=["GET"])
 @jwt_required()
 def get_all_workouts():
-    """Return all workouts for this user — manual and AI-generated."""
+    """Return all workouts for this user — manual and AI-generated.
+
+    With ?limit= and/or ?after=<cursor> returns one page as {"items", "next_cursor"}.
+    ?fields=a,b,c returns (and loads) only those fields.
+    """
     user_id = get_jwt_identity()
-    workouts = Workout.query.filter_by(user_id=user_id).order_by(Workout.id.desc()).all()
-
-    output = []
-    for w in workouts:
-        details = w.details or {}
-        exercises = details.get("exercises", [])
-        output.append({
-            "id": w.id,
-            "title": w.title or "Workout",
-            "category": w.category or "General",
-            "sets": w.sets or (exercises[0].get("sets") if exercises else None),
-            "reps": w.reps or (exercises[0].get("reps") if exercises else None),
-            "details": details,
-            "notes": w.notes or "",
-        })
-    return jsonify(output), 200
+    try:
+        fields = parse_fields(request.args, WORKOUT_FIELDS)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    query = Workout.query.filter_by(user_id=user_id)
+    if fields:
+        query = query.options(load_only_for(WORKOUT_FIELDS, fields, Workout.id))
+
+    if wants_page(request.args):
+        try:
+            workouts, next_cursor = keyset_page(
+                query, [Workout.id], parse_limit(request.args), request.args.get("after")
+            )
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        return jsonify({
+            "items": [workout_summary(w, fields) for w in workouts],
+            "next_cursor": next_cursor,
+        }), 200
+
+    workouts = query.order_by(Workout.id.desc()).all()
+    return jsonify([workout_summary(w, fields) for w in workouts]), 200
+
+
+def workout_summary(w, fields=None):
+    return serialize(w, WORKOUT_FIELDS, fields)
 
 
 # ---------------------------------------------------------
@@ -137,7 +195,7 @@ def save_ai_workout_as_routine():
 @workout_bp.route("/search", methods=["GET"])
 @jwt_required()
 def search_workout():
-    """Search exercises from the external ExerciseDB API."""
+    """Search exercises in the local ExerciseDB mirror (live API until it is first synced)."""
     try:
         load_user()
     except Exception:
@@ -147,13 +205,17 @@ def search_workout():
     if not query:
         return jsonify({"error": "Missing search query ?q="}), 400
 
-    url = f"{EXERCISE_API_URL}/search?q={query}"
-    response = requests.get(url)
-
-    if response.status_code != 200:
-        return jsonify({"error": "Failed to fetch exercises"}), 500
+    exercises = catalog.search(query, limit=SEARCH_LIMIT)
+    if exercises is None:
+        try:
+            status_code, data = fetch_exercises("/search", {"q": query})
+        except Exception as e:
+            print(f"Exercise search error: {e}")
+            return jsonify({"error": "Failed to fetch exercises"}), 500
 
-    data = response.json()
+        if status_code != 200:
+            return jsonify({"error": "Failed to fetch exercises"}), 500
+        exercises = data.get("data", [])
 
     cleaned_data = [{
         "name": ex.get("name"),
@@ -161,8 +223,9 @@ def search_workout():
         "instructions": ex.get("instructions"),
         "targetMuscles": ex.get("targetMuscles"),
         "secondaryMuscles": ex.get("secondaryMuscles"),
-        "gifUrl": ex.get("gifUrl"),
-    } for ex in data.get("data", [])]
+        "gifUrl": proxy_url(ex.get("gifUrl")),
+        "posterUrl": proxy_url(ex.get("gifUrl"), poster=True),
+    } for ex in exercises]
 
     return jsonify(cleaned_data), 200
 